@@ -0,0 +1,224 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import logging
+import time
+from contextlib import asynccontextmanager
+from email.utils import parsedate_to_datetime
+
+import httpx
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+
+# --- Upstream Admission Control ---
+# Gemini and Murf enforce quotas, so every call to them passes a gate first:
+# a token bucket (requests per second, with a burst) and a cap on calls in
+# flight, per upstream. Calls that cannot start right away wait in a priority
+# queue: live interview turns (INTERACTIVE, the default) always go ahead of
+# assessments, compaction and result delivery (BACKGROUND), which mark
+# themselves with set_priority().
+# Every queued call has a deadline. When the bucket alone says it cannot
+# start in time, or the queue is full, it is shed immediately instead of
+# holding a place; a call still waiting at its deadline is shed then. Shed
+# calls raise UpstreamOverloaded, an httpx.RequestError, so callers handle it
+# like any other failed upstream call (apology text, retry with backoff).
+# A 429 answer pauses the gate until its Retry-After, so the queue does not
+# turn into a retry storm. Limits are per process.
+
+INTERACTIVE = 0
+BACKGROUND = 1
+PRIORITY_NAMES = {INTERACTIVE: "interactive", BACKGROUND: "background"}
+
+_priority = contextvars.ContextVar("upstream_priority", default=INTERACTIVE)
+
+
+def set_priority(priority):
+    # Applies to the current task and the tasks it starts afterwards
+    _priority.set(priority)
+
+
+class UpstreamOverloaded(httpx.RequestError):
+    def __init__(self, upstream, reason):
+        super().__init__(f"{upstream} is over its admission limit ({reason}), request shed")
+        self.upstream = upstream
+        self.reason = reason
+
+
+class _Waiter:
+    __slots__ = ("priority", "seq", "deadline", "future", "cancelled")
+
+    def __init__(self, priority, seq, deadline, future):
+        self.priority = priority
+        self.seq = seq
+        self.deadline = deadline
+        self.future = future
+        self.cancelled = False
+
+    def __lt__(self, other):
+        return (self.priority, self.seq) < (other.priority, other.seq)
+
+
+class UpstreamGate:
+    def __init__(self, name, max_concurrency=0, rate_per_second=0, burst=None, max_queue=256):
+        self.name = name
+        self.max_concurrency = max_concurrency # 0: no cap
+        self.rate = rate_per_second # 0: no rate limit
+        self.burst = burst or max(1, rate_per_second)
+        self.max_queue = max_queue
+        self.tokens = self.burst
+        self.refilled_at = time.monotonic()
+        self.paused_until = 0.0 # Set from Retry-After
+        self.in_flight = 0
+        self._queue = [] # heap of _Waiter, cancelled ones are skipped lazily
+        self._queued = {priority: 0 for priority in PRIORITY_NAMES}
+        self._seq = itertools.count()
+        self._timer = None
+
+    def _refill(self, now):
+        if self.rate:
+            self.tokens = min(self.burst, self.tokens + (now - self.refilled_at) * self.rate)
+        self.refilled_at = now
+
+    def _blocked_for(self, now):
+        # Seconds until a call could start if a slot were free; 0 if it can start now
+        wait = max(0.0, self.paused_until - now)
+        if self.rate and self.tokens < 1:
+            wait = max(wait, (1 - self.tokens) / self.rate)
+        return wait
+
+    def _has_slot(self):
+        return not self.max_concurrency or self.in_flight < self.max_concurrency
+
+    def _start(self):
+        if self.rate:
+            self.tokens -= 1
+        self.in_flight += 1
+
+    def _estimated_wait(self, priority, now):
+        # Token time for everyone ahead of this call; waiting for a free slot is not predictable
+        wait = max(0.0, self.paused_until - now)
+        if self.rate:
+            ahead = sum(count for level, count in self._queued.items() if level <= priority)
+            wait = max(wait, (ahead + 1 - self.tokens) / self.rate)
+        return wait
+
+    def _shed(self, priority, reason):
+        metrics.upstream_shed.inc(upstream=self.name, priority=PRIORITY_NAMES[priority], reason=reason)
+        raise UpstreamOverloaded(self.name, reason)
+
+    async def acquire(self, priority, timeout):
+        now = time.monotonic()
+        self._refill(now)
+        if not self._queue and self._has_slot() and not self._blocked_for(now):
+            self._start()
+            return 0.0
+        if sum(self._queued.values()) >= self.max_queue:
+            self._shed(priority, "queue_full")
+        if self._estimated_wait(priority, now) > timeout:
+            self._shed(priority, "deadline")
+
+        waiter = _Waiter(priority, next(self._seq), now + timeout, asyncio.get_running_loop().create_future())
+        heapq.heappush(self._queue, waiter)
+        self._queued[priority] += 1
+        self._dispatch()
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter.future), timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if not waiter.future.done():
+                waiter.cancelled = True
+                self._queued[priority] -= 1
+                waiter.future.cancel()
+            elif not waiter.future.cancelled():
+                self.release() # Granted just as we gave up
+            if isinstance(e, asyncio.TimeoutError):
+                self._shed(priority, "deadline")
+            raise
+        return time.monotonic() - now
+
+    def release(self):
+        self.in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        now = time.monotonic()
+        self._refill(now)
+        while self._queue and self._has_slot():
+            waiter = self._queue[0]
+            if waiter.cancelled:
+                heapq.heappop(self._queue)
+                continue
+            wait = self._blocked_for(now)
+            if wait:
+                if self._timer is None:
+                    self._timer = asyncio.get_running_loop().call_later(wait, self._wake)
+                return
+            heapq.heappop(self._queue)
+            self._queued[waiter.priority] -= 1
+            self._start()
+            waiter.future.set_result(True)
+
+    def _wake(self):
+        self._timer = None
+        self._dispatch()
+
+    def observe_response(self, response):
+        if response.status_code != 429:
+            return
+        retry_after = _retry_after_seconds(response.headers.get("Retry-After"))
+        self.paused_until = max(self.paused_until, time.monotonic() + retry_after)
+        log.warning("%s answered 429, holding its queue for %.1fs", self.name, retry_after)
+
+    def stats(self):
+        return {"in_flight": self.in_flight, "queued": {PRIORITY_NAMES[level]: count for level, count in self._queued.items()}}
+
+
+def _retry_after_seconds(value, default=1.0):
+    if not value:
+        return default
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return default
+
+
+class AdmissionControl:
+    def __init__(self, gates, deadlines):
+        self.gates = {gate.name: gate for gate in gates} # Upstreams without a gate are not limited
+        self.deadlines = deadlines # priority -> seconds a call may wait in the queue
+
+    @asynccontextmanager
+    async def admit(self, upstream):
+        gate = self.gates.get(upstream)
+        if gate is None:
+            yield
+            return
+        priority = _priority.get()
+        waited = await gate.acquire(priority, self.deadlines[priority])
+        metrics.upstream_queue_seconds.observe(waited, upstream=upstream, priority=PRIORITY_NAMES[priority])
+        if waited > 0:
+            metrics.record_stage(f"{upstream}_queue", waited)
+        try:
+            yield gate
+        finally:
+            gate.release()
+
+    def collect_metrics(self):
+        depth = {}
+        in_flight = {}
+        for name, gate in self.gates.items():
+            stats = gate.stats()
+            in_flight[(("upstream", name),)] = stats["in_flight"]
+            for priority, count in stats["queued"].items():
+                depth[(("priority", priority), ("upstream", name))] = count
+        return (
+            metrics.snapshot_lines("interview_upstream_queue_depth", "gauge", "Upstream calls waiting for admission, by upstream and priority.", depth)
+            + metrics.snapshot_lines("interview_upstream_in_flight", "gauge", "Upstream calls admitted and not finished, by upstream.", in_flight)
+        )
@@ -0,0 +1,147 @@
+import asyncio
+import logging
+
+log = logging.getLogger(__name__)
+
+
+# --- Interview Assessment Engine ---
+# Short transcripts are scored with a single structured-JSON prompt. Long ones
+# are split into question/answer segments, grouped into chunks that are scored
+# concurrently (map), and the chunk findings are merged by one final call
+# (reduce) into the usual {score, feedback, recommendation} shape. Wall time
+# then follows the slowest chunk instead of the total transcript length.
+#
+# generate_json(prompt, schema) is supplied by the caller; it returns the
+# parsed JSON object, raises ValueError for an unreadable reply, and lets
+# transport errors propagate so the job can be retried. An unreadable chunk
+# raises AssessmentIncomplete for the same reason: scoring the remaining parts
+# as if they were the whole interview would deliver a silently partial score.
+
+class AssessmentIncomplete(Exception):
+    def __init__(self, missing_parts, total):
+        super().__init__(f"Assessment of part(s) {', '.join(map(str, missing_parts))} of {total} could not be parsed")
+        self.missing_parts = missing_parts
+
+
+RECOMMENDATIONS = ["Hire", "Do Not Hire", "Further Interview", "Strong Hire", "Weak Hire", "N/A"]
+
+ASSESSMENT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "score": {"type": "INTEGER"},
+        "feedback": {"type": "STRING"},
+        "recommendation": {"type": "STRING", "enum": RECOMMENDATIONS}
+    },
+    "propertyOrdering": ["score", "feedback", "recommendation"]
+}
+
+SEGMENT_SCHEMA = {
+    "type": "OBJECT",
+    "properties": {
+        "score": {"type": "INTEGER"},
+        "strengths": {"type": "STRING"},
+        "weaknesses": {"type": "STRING"},
+        "skills_observed": {"type": "ARRAY", "items": {"type": "STRING"}}
+    },
+    "propertyOrdering": ["score", "strengths", "weaknesses", "skills_observed"]
+}
+
+
+def format_transcript(entries):
+    return "\n".join(f"{entry['role'].upper()}: {entry['text']}" for entry in entries)
+
+
+def _interview_description(context):
+    skills = context.get('key_skills') or ['general skills']
+    return (
+        f"a '{context.get('job_role') or 'general'}' position "
+        f"with difficulty '{context.get('difficulty') or 'medium'}', "
+        f"focusing on skills like {', '.join(skills)}"
+    )
+
+
+def split_into_chunks(transcript, max_chars):
+    # A segment is one interviewer turn plus the candidate's answer(s) to it;
+    # segments are never split, only grouped until a chunk reaches max_chars.
+    segments = []
+    for entry in transcript:
+        if entry["role"] == "ai" or not segments:
+            segments.append([])
+        segments[-1].append(entry)
+
+    chunks, current, current_chars = [], [], 0
+    for segment in segments:
+        size = sum(len(entry["text"]) for entry in segment)
+        if current and current_chars + size > max_chars:
+            chunks.append(current)
+            current, current_chars = [], 0
+        current.extend(segment)
+        current_chars += size
+    if current:
+        chunks.append(current)
+    return chunks
+
+
+def single_pass_prompt(context, transcript):
+    return (
+        f"Based on the following interview transcript for {_interview_description(context)}, "
+        f"please provide a comprehensive assessment. "
+        f"Your response should be a JSON object with the following structure:\n"
+        f'{{"score": <integer 0-100>, "feedback": "<string>", "recommendation": "<string: {"|".join(RECOMMENDATIONS)}>"}}\n'
+        f"Here is the transcript:\n\n{format_transcript(transcript)}"
+    )
+
+
+def segment_prompt(context, chunk, index, total):
+    return (
+        f"You are assessing part {index + 1} of {total} of an interview transcript for {_interview_description(context)}. "
+        f"Judge only the candidate's answers in this part. "
+        f'Respond with a JSON object: {{"score": <integer 0-100>, "strengths": "<string>", '
+        f'"weaknesses": "<string>", "skills_observed": [<skill names>]}}\n'
+        f"Transcript part:\n\n{format_transcript(chunk)}"
+    )
+
+
+def reduce_prompt(context, findings):
+    parts = "\n\n".join(
+        f"Part {n + 1}: score {f.get('score')}\nStrengths: {f.get('strengths')}\n"
+        f"Weaknesses: {f.get('weaknesses')}\nSkills observed: {', '.join(f.get('skills_observed') or [])}"
+        for n, f in enumerate(findings)
+    )
+    return (
+        f"An interview for {_interview_description(context)} was assessed in consecutive parts. "
+        f"Combine the findings below into one overall assessment of the candidate. "
+        f"Your response should be a JSON object with the following structure:\n"
+        f'{{"score": <integer 0-100>, "feedback": "<string>", "recommendation": "<string: {"|".join(RECOMMENDATIONS)}>"}}\n'
+        f"Findings per part:\n\n{parts}"
+    )
+
+
+async def assess_transcript(context, transcript, generate_json, chunk_chars, max_parallel):
+    chunks = split_into_chunks(transcript, chunk_chars)
+    try:
+        if len(chunks) <= 1:
+            return await generate_json(single_pass_prompt(context, transcript), ASSESSMENT_SCHEMA)
+
+        log.info("Assessing transcript in %d chunks (map-reduce)", len(chunks))
+        limit = asyncio.Semaphore(max_parallel)
+
+        async def assess_chunk(index, chunk):
+            async with limit:
+                return await generate_json(segment_prompt(context, chunk, index, len(chunks)), SEGMENT_SCHEMA)
+
+        # Every chunk runs to the end, so one failure does not leave the others' calls orphaned
+        findings = await asyncio.gather(*(assess_chunk(n, chunk) for n, chunk in enumerate(chunks)), return_exceptions=True)
+        missing = []
+        for n, finding in enumerate(findings):
+            if isinstance(finding, ValueError) or not finding:
+                log.warning("Unreadable assessment of chunk %d: %s", n + 1, finding)
+                missing.append(n + 1)
+            elif isinstance(finding, BaseException):
+                raise finding
+        if missing:
+            raise AssessmentIncomplete(missing, len(chunks))
+        return await generate_json(reduce_prompt(context, findings), ASSESSMENT_SCHEMA)
+    except ValueError as e:
+        log.error("Error decoding AI assessment JSON: %s", e)
+        return {"score": None, "feedback": "AI assessment could not be parsed.", "recommendation": "N/A"}
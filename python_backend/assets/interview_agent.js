@@ -0,0 +1,511 @@
+let mediaRecorder;
+let audioChunks = [];
+let audioPlayer = document.getElementById('audioPlayer');
+let statusDiv = document.getElementById('status');
+let startRecordingButton = document.getElementById('startRecordingButton');
+let stopRecordingButton = document.getElementById('stopRecordingButton');
+let leaveInterviewButton = document.getElementById('leaveInterviewButton');
+let userInputField = document.getElementById('userInput');
+
+// Per-page values come from the bootstrap block; this script itself is a cached static asset
+const bootstrap = JSON.parse(document.getElementById('interview-bootstrap').textContent);
+const dynamicUserId = bootstrap.userId;
+const sessionId = bootstrap.sessionId;
+const streamingTurns = bootstrap.streamingTurns; // Sentence-by-sentence replies via /turn_stream
+const streamingUploads = bootstrap.streamingUploads; // Upload the answer in chunks while recording
+let uploadStream = null;
+let sessionChannel = null; // Open /ws channel; null means every step goes over HTTP
+console.log("Dynamic User ID from URL:", dynamicUserId);
+
+// Every backend call carries the interview session issued by /select_interview
+function sessionFetch(url, options = {}) {
+    const headers = Object.assign({}, options.headers, { 'X-Session-Id': sessionId });
+    return fetch(url, Object.assign({}, options, { headers }));
+}
+
+
+// Event Listeners for the new buttons
+startRecordingButton.addEventListener('click', startRecording);
+stopRecordingButton.addEventListener('click', stopRecording);
+leaveInterviewButton.addEventListener('click', exitAgent); // Modified to call exitAgent
+
+function updateStatus(message, color = 'var(--text-medium)') {
+    statusDiv.textContent = message;
+    statusDiv.style.color = color;
+}
+
+async function startRecording() {
+    try {
+        // Set mimeType to 'audio/webm' for broader browser compatibility
+        // Most browsers record efficiently to webm by default.
+        const stream = await navigator.mediaDevices.getUserMedia({ audio: true });
+        mediaRecorder = new MediaRecorder(stream, { mimeType: 'audio/webm' }); 
+        audioChunks = [];
+        const channel = sessionChannel;
+        uploadStream = streamingUploads && !channel ? newUploadStream() : null;
+        if (channel) {
+            channel.uploadBroken = false;
+            channel.socket.send(JSON.stringify({ type: 'start_answer' }));
+        }
+
+        mediaRecorder.ondataavailable = (event) => {
+            audioChunks.push(event.data);
+            if (!event.data.size) return;
+            if (channel) {
+                if (sessionChannel === channel) channel.socket.send(event.data);
+            } else if (uploadStream) {
+                uploadChunk(uploadStream, event.data);
+            }
+        };
+
+        mediaRecorder.onstop = async () => {
+            stream.getTracks().forEach(track => track.stop()); // Stop microphone access
+            if (channel && sessionChannel === channel && !channel.uploadBroken) {
+                sendAnswerOverChannel(channel); // Server already has the audio
+                return;
+            }
+            const streamed = uploadStream;
+            uploadStream = null;
+            if (streamed) {
+                await streamed.chain;
+                if (!streamed.broken) {
+                    sendAudioToBackend(null, streamed.id); // Server already has the audio
+                    return;
+                }
+            }
+            const audioBlob = new Blob(audioChunks, { type: 'audio/webm' }); // Match Blob type to mimeType
+            sendAudioToBackend(audioBlob);
+        }
+        ;
+
+        // With a timeslice the recorder emits chunks every second instead of one blob at the end
+        mediaRecorder.start(uploadStream || channel ? bootstrap.uploadTimesliceMs : undefined);
+        updateStatus("Recording... Click 'Stop Replying' when done.");
+        startRecordingButton.style.display = 'none';
+        stopRecordingButton.style.display = 'inline-flex';
+        leaveInterviewButton.disabled = false;
+        userInputField.disabled = true;
+    } catch (error) {
+        console.error('Error accessing microphone:', error);
+        updateStatus('Error accessing microphone. Please allow microphone access.', 'var(--red-button)');
+        startRecordingButton.disabled = false; // Re-enable if error
+        stopRecordingButton.style.display = 'none';
+    }
+}
+
+function stopRecording() {
+    if (mediaRecorder && mediaRecorder.state === 'recording') {
+        mediaRecorder.stop();
+        updateStatus("Processing your response...");
+        startRecordingButton.style.display = 'inline-flex';
+        stopRecordingButton.style.display = 'none';
+        startRecordingButton.disabled = true; // Disable until AI responds
+    }
+}
+
+function newUploadStream() {
+    const id = window.crypto && crypto.randomUUID ? crypto.randomUUID() : Date.now() + '-' + Math.random().toString(16).slice(2);
+    return { id, seq: 0, chain: Promise.resolve(), broken: false };
+}
+
+// Chunks are sent strictly in order; any failure marks the stream broken and
+// the whole recording is uploaded as before when the candidate stops.
+function uploadChunk(stream, blob) {
+    const seq = stream.seq++;
+    stream.chain = stream.chain.then(async () => {
+        if (stream.broken) return;
+        try {
+            const response = await sessionFetch(`/audio_chunk?stream=${encodeURIComponent(stream.id)}&seq=${seq}`, {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/octet-stream' },
+                body: blob
+            });
+            if (!response.ok) {
+                stream.broken = true;
+                return;
+            }
+            const data = await response.json();
+            if (data.partial_text && uploadStream === stream) {
+                updateStatus("Recording... " + data.partial_text);
+            }
+        } catch (error) {
+            console.error("Error uploading audio chunk:", error);
+            stream.broken = true;
+        }
+    });
+}
+
+// --- Session socket ---
+// One WebSocket per interview carries the answer's audio up and status events,
+// the transcript, AI text and each sentence's audio down. If it cannot be opened
+// or drops, the page uses the HTTP endpoints instead.
+function openSessionChannel() {
+    return new Promise(resolve => {
+        const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
+        const socket = new WebSocket(`${protocol}//${window.location.host}/ws?sessionId=${encodeURIComponent(sessionId)}`);
+        socket.binaryType = 'arraybuffer';
+        const channel = { socket, turn: null, audio: null, uploadBroken: false };
+        socket.onopen = () => resolve(channel);
+        socket.onerror = () => resolve(null);
+        socket.onclose = () => {
+            if (sessionChannel === channel) sessionChannel = null;
+            if (channel.turn) channel.turn.finish("Connection to the interview server was lost.");
+            resolve(null);
+        };
+        socket.onmessage = (message) => handleChannelMessage(channel, message.data);
+    });
+}
+
+// Sends a turn message and resolves with { user_text, ai_response_text, error }
+// once the reply has been received and played.
+function runChannelTurn(channel, message) {
+    return new Promise(resolve => {
+        const result = { user_text: null, ai_response_text: null, error: null };
+        let playback = Promise.resolve();
+        channel.turn = {
+            result,
+            play(url) {
+                playback = playback.then(() => {
+                    updateStatus("Playing AI response...", "var(--accent-blue)");
+                    return playAudioUrl(url);
+                }).then(() => URL.revokeObjectURL(url));
+            },
+            finish(error = null) {
+                if (error && !result.error) result.error = error;
+                channel.turn = null;
+                playback.then(() => resolve(result));
+            }
+        };
+        channel.socket.send(JSON.stringify(message));
+    });
+}
+
+function handleChannelMessage(channel, data) {
+    if (data instanceof ArrayBuffer) {
+        // Audio frames belong to the most recent audio_start
+        if (channel.audio) channel.audio.parts.push(data);
+        return;
+    }
+    const event = JSON.parse(data);
+    const turn = channel.turn;
+    if (event.type === 'partial_text') {
+        if (mediaRecorder && mediaRecorder.state === 'recording') updateStatus("Recording... " + event.text);
+    } else if (event.type === 'audio_start') {
+        channel.audio = { mimetype: event.mimetype, parts: [] };
+    } else if (event.type === 'audio_end') {
+        if (channel.audio && turn) {
+            turn.play(URL.createObjectURL(new Blob(channel.audio.parts, { type: channel.audio.mimetype })));
+        }
+        channel.audio = null;
+    } else if (event.type === 'error' && event.code === 'upload_rejected') {
+        channel.uploadBroken = true; // The recording will be uploaded over HTTP when it stops
+    } else if (!turn) {
+        if (event.type === 'error') console.error("Session socket error:", event.message);
+    } else if (event.type === 'status') {
+        updateStatus(event.state === 'transcribing' ? "Processing your response..." : "AI is thinking...");
+    } else if (event.type === 'user_text') {
+        turn.result.user_text = event.text;
+        updateStatus("You said: " + event.text);
+    } else if (event.type === 'done') {
+        turn.result.ai_response_text = event.ai_response_text;
+        turn.finish();
+    } else if (event.type === 'error') {
+        turn.finish(event.message);
+    }
+}
+
+async function sendAnswerOverChannel(channel) {
+    try {
+        reportStreamingTurn(await runChannelTurn(channel, { type: 'end_answer' }));
+    } catch (error) {
+        console.error("Error in AI Agent:", error);
+        updateStatus("An error occurred: " + error.message, "var(--red-button)");
+    } finally {
+        startRecordingButton.disabled = false;
+        userInputField.disabled = false;
+    }
+}
+
+function playAudioUrl(url) {
+    return new Promise(resolve => {
+        audioPlayer.onended = resolve;
+        audioPlayer.onerror = () => {
+            console.error("Audio playback error:", url);
+            resolve();
+        };
+        audioPlayer.src = url;
+        audioPlayer.load();
+        audioPlayer.play().catch(e => {
+            console.error("Error playing audio:", e);
+            resolve();
+        });
+    });
+}
+
+// Reads the NDJSON events of /turn_stream and plays each sentence's audio in order
+// while later sentences are still being generated and synthesized.
+async function runStreamingTurn(requestOptions) {
+    const result = { user_text: null, ai_response_text: null, error: null };
+    const response = await sessionFetch('/turn_stream', Object.assign({ method: 'POST' }, requestOptions));
+    if (!response.ok || !response.body) {
+        const data = await response.json().catch(() => ({}));
+        result.error = data.error || data.message || null;
+        return result;
+    }
+
+    let playback = Promise.resolve();
+    const handleEvent = (event) => {
+        if (event.type === 'user_text') {
+            result.user_text = event.text;
+            updateStatus("You said: " + event.text);
+        } else if (event.type === 'sentence' && event.audio_url) {
+            playback = playback.then(() => {
+                updateStatus("Playing AI response...", "var(--accent-blue)");
+                return playAudioUrl(event.audio_url);
+            });
+        } else if (event.type === 'done') {
+            result.ai_response_text = event.ai_response_text;
+        } else if (event.type === 'error') {
+            result.error = event.message;
+        }
+    };
+
+    const reader = response.body.getReader();
+    const decoder = new TextDecoder();
+    let pending = '';
+    while (true) {
+        const { value, done } = await reader.read();
+        if (done) break;
+        pending += decoder.decode(value, { stream: true });
+        const lines = pending.split('\n');
+        pending = lines.pop();
+        lines.filter(line => line.trim()).forEach(line => handleEvent(JSON.parse(line)));
+    }
+    if (pending.trim()) handleEvent(JSON.parse(pending));
+    await playback;
+    return result;
+}
+
+async function sendAudioStreaming(requestOptions) {
+    updateStatus("Processing your response...");
+    reportStreamingTurn(await runStreamingTurn(requestOptions));
+}
+
+function reportStreamingTurn(result) {
+    if (!result.user_text) {
+        updateStatus("I didn't catch that. Please try speaking again. Click 'Start Replying'.", "var(--text-medium)");
+    } else if (!result.ai_response_text) {
+        updateStatus(result.error || "No AI response received.", "var(--red-button)");
+    } else {
+        updateStatus("Ready for your next response. Click 'Start Replying'.");
+    }
+}
+
+async function sendAudioToBackend(audioBlob, streamId = null) {
+    let requestOptions;
+    if (streamId) {
+        requestOptions = { headers: { 'Content-Type': 'application/json' }, body: JSON.stringify({ stream_id: streamId }) };
+    } else {
+        const formData = new FormData();
+        // Ensure the filename extension matches the actual Blob type (e.g., .webm)
+        formData.append('audio_file', audioBlob, 'user_input.webm'); 
+        requestOptions = { body: formData };
+    }
+
+    try {
+        if (streamingTurns) {
+            await sendAudioStreaming(requestOptions);
+            return;
+        }
+        // One round trip: transcription, transcript writes, AI reply and TTS
+        updateStatus("Processing your response...");
+        const response = await sessionFetch('/turn', Object.assign({ method: 'POST' }, requestOptions));
+        const data = await response.json();
+
+        if (data.user_text) {
+            if (data.ai_response_text) {
+                updateStatus("You said: " + data.user_text);
+
+                if (data.audio_url) {
+                    audioPlayer.src = data.audio_url + '?cache=' + new Date().getTime();
+                    audioPlayer.load();
+                    audioPlayer.play().catch(e => {
+                        console.error("Error playing audio:", e);
+                        updateStatus("Error playing audio. Check console.", "red");
+                    });
+                    updateStatus("Playing AI response...", "var(--accent-blue)");
+                    await new Promise(resolve => {
+                        audioPlayer.onended = resolve;
+                        audioPlayer.onerror = () => {
+                            console.error("Audio playback error.");
+                            updateStatus("Audio error. Please try again.", "red");
+                            resolve();
+                        };
+                    });
+                    updateStatus("Ready for your next response. Click 'Start Replying'.");
+                } else {
+                    updateStatus("Could not synthesize audio response.", "var(--red-button)");
+                }
+            } else {
+                updateStatus("No AI response received.", "var(--red-button)");
+            }
+        } else {
+            updateStatus("I didn't catch that. Please try speaking again. Click 'Start Replying'.", "var(--text-medium)");
+        }
+    } catch (error) {
+        console.error("Error in AI Agent:", error);
+        updateStatus("An error occurred: " + error.message, "var(--red-button)");
+    } finally {
+        startRecordingButton.disabled = false;
+        userInputField.disabled = false;
+    }
+}
+
+async function waitForAssessment(statusUrl, timeoutMs = 30000) {
+    const deadline = Date.now() + timeoutMs;
+    let job = null;
+    while (Date.now() < deadline) {
+        const response = await fetch(statusUrl);
+        job = await response.json();
+        if (!['queued', 'assessing', 'delivering'].includes(job.status)) break;
+        await new Promise(resolve => setTimeout(resolve, 1500));
+    }
+    return job;
+}
+
+async function exitAgent() {
+    if (mediaRecorder && mediaRecorder.state === 'recording') {
+        mediaRecorder.stop();
+    }
+    audioPlayer.pause();
+    audioPlayer.src = '';
+    updateStatus("Ending interview and generating results...", "var(--accent-purple)");
+    startRecordingButton.style.display = 'inline-flex';
+    stopRecordingButton.style.display = 'none';
+    startRecordingButton.disabled = true; // Disable until results are processed
+    leaveInterviewButton.disabled = true;
+    userInputField.disabled = true;
+
+    try {
+        const response = await sessionFetch('/end_interview', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ userId: dynamicUserId, session_id: sessionId }) // Pass the dynamic user ID
+        });
+        const data = await response.json();
+
+        if (response.ok) {
+            // The assessment runs in the background; wait briefly for it, but the result
+            // is saved either way once the job is queued
+            const job = await waitForAssessment(data.status_url);
+            if (job && job.status === 'completed') {
+                updateStatus("Interview ended. Results saved!", "green");
+            } else if (job && (job.status === 'failed' || job.status === 'delivery_failed')) {
+                updateStatus("Failed to save interview results: " + (job.error || "Unknown error"), "red");
+                console.error("Error saving interview results:", job);
+                return;
+            } else {
+                updateStatus("Interview ended. Your results will appear shortly.", "green");
+            }
+            console.log("Interview Result:", job || data);
+            if (sessionChannel) sessionChannel.socket.close();
+            // Optionally redirect to a results page or home
+            window.location.href = "http://localhost:5173/";
+        } else {
+            updateStatus("Failed to save interview results: " + (data.message || "Unknown error"), "red");
+            console.error("Error saving interview results:", data);
+        }
+    } catch (error) {
+        console.error("Network error while ending interview:", error);
+        updateStatus("Network error during result saving. Check console.", "red");
+    } finally {
+        startRecordingButton.disabled = false;
+        leaveInterviewButton.disabled = false;
+        userInputField.disabled = false;
+    }
+}
+
+window.onload = async () => {
+    updateStatus("Click 'Start Replying' to begin your response.");
+    stopRecordingButton.style.display = 'none'; // Ensure stop button is hidden initially
+    leaveInterviewButton.disabled = false; // Enable Leave Interview button by default
+    userInputField.disabled = true;
+
+    if (bootstrap.sessionSocket && window.WebSocket) {
+        sessionChannel = await openSessionChannel();
+    }
+    // Make the initial greeting from AI
+    await sendInitialGreeting();
+};
+
+async function sendInitialGreeting() {
+    updateStatus("AI is preparing the first question...");
+    try {
+        // The server may already be generating the reply to this exact prompt (see /select_interview)
+        const initialPrompt = bootstrap.greetingPrompt;
+        if (sessionChannel || streamingTurns) {
+            // The server records the greeting in the transcript itself
+            const result = sessionChannel
+                ? await runChannelTurn(sessionChannel, { type: 'prompt', text: initialPrompt })
+                : await runStreamingTurn({
+                    headers: { 'Content-Type': 'application/json' },
+                    body: JSON.stringify({ prompt: initialPrompt })
+                });
+            if (result.ai_response_text) {
+                updateStatus("AI has spoken. Click 'Start Replying' to respond.");
+            } else {
+                updateStatus(result.error || "No AI greeting received.", "var(--red-button)");
+            }
+            return;
+        }
+        const aiResponse = await sessionFetch('/get_ai_response', {
+            method: 'POST',
+            headers: { 'Content-Type': 'application/json' },
+            body: JSON.stringify({ prompt: initialPrompt })
+        });
+        const aiData = await aiResponse.json();
+
+        if (aiData.ai_response_text) {
+            // Add AI greeting to transcript
+            await sessionFetch('/add_to_transcript', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ role: 'ai', text: aiData.ai_response_text })
+            });
+
+            updateStatus("Synthesizing AI greeting...");
+            const audioPlayResponse = await sessionFetch('/play_audio', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body: JSON.stringify({ text: aiData.ai_response_text })
+            });
+            const audioPlayData = await audioPlayResponse.json();
+
+            if (audioPlayData.audio_url) {
+                audioPlayer.src = audioPlayData.audio_url + '?cache=' + new Date().getTime();
+                audioPlayer.load();
+                audioPlayer.play().catch(e => {
+                    console.error("Error playing AI greeting audio:", e);
+                    updateStatus("Error playing AI greeting. Check console.", "red");
+                });
+                updateStatus("Playing AI response...", "var(--accent-blue)");
+                await new Promise(resolve => {
+                    audioPlayer.onended = resolve;
+                    audioPlayer.onerror = () => {
+                        console.error("AI greeting audio playback error.");
+                        updateStatus("AI greeting audio error. Please try again.", "red");
+                        resolve();
+                    };
+                });
+                updateStatus("AI has spoken. Click 'Start Replying' to respond.");
+            } else {
+                updateStatus("Could not synthesize AI greeting audio.", "var(--red-button)");
+            }
+        } else {
+            updateStatus("No AI greeting received.", "var(--red-button)");
+        }
+    } catch (error) {
+        console.error("Error fetching initial AI greeting:", error);
+        updateStatus("Error getting initial AI greeting: " + error.message, "var(--red-button)");
+    }
+}
@@ -0,0 +1,254 @@
+import asyncio
+import audioop
+import logging
+import subprocess
+
+import speech_recognition as sr
+from pydub import AudioSegment
+
+log = logging.getLogger(__name__)
+
+
+# --- Recognizer Input Decoding ---
+# Uploads are routed by their magic bytes instead of trial and error:
+#   * WAV / AIFF / FLAC are read natively by speech_recognition, and
+#   * everything else (the browser's WebM/Opus, Ogg, MP4, MP3) goes through a
+#     single ffmpeg process with the container named up front, so no probe runs.
+# Both paths end in 16 kHz mono 16-bit PCM. The recognizer needs nothing more,
+# and a 48 kHz stereo capture would otherwise make the FLAC body sent to
+# Google several times larger.
+
+TARGET_SAMPLE_RATE = 16000
+TARGET_SAMPLE_WIDTH = 2 # bytes, i.e. 16-bit
+SNIFF_BYTES = 12
+
+NATIVE_FORMATS = {"wav", "aiff", "flac"}
+FFMPEG_FORMATS = {"webm": "webm", "ogg": "ogg", "mp4": "mp4", "mp3": "mp3"} # sniffed name -> ffmpeg demuxer
+
+
+def sniff_audio_format(head):
+    """Name the container from its first bytes, or None if unrecognised."""
+    if head[:4] == b"RIFF" and head[8:12] == b"WAVE":
+        return "wav"
+    if head[:4] == b"FORM" and head[8:12] in (b"AIFF", b"AIFC"):
+        return "aiff"
+    if head[:4] == b"fLaC":
+        return "flac"
+    if head[:4] == b"\x1a\x45\xdf\xa3": # EBML header: WebM / Matroska
+        return "webm"
+    if head[:4] == b"OggS":
+        return "ogg"
+    if head[4:8] == b"ftyp":
+        return "mp4"
+    if head[:3] == b"ID3" or (len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0):
+        return "mp3"
+    return None
+
+
+def _read_head(audio_source):
+    if hasattr(audio_source, "read"):
+        audio_source.seek(0)
+        head = audio_source.read(SNIFF_BYTES)
+        audio_source.seek(0)
+        return head
+    with open(audio_source, "rb") as f:
+        return f.read(SNIFF_BYTES)
+
+
+def _decode_native(audio_source):
+    # speech_recognition already downmixes to mono; only rate and width are converted
+    with sr.AudioFile(audio_source) as source:
+        audio = sr.Recognizer().record(source)
+    raw = audio.get_raw_data(convert_rate=TARGET_SAMPLE_RATE, convert_width=TARGET_SAMPLE_WIDTH)
+    return sr.AudioData(raw, TARGET_SAMPLE_RATE, TARGET_SAMPLE_WIDTH)
+
+
+def _decode_ffmpeg(audio_source, fmt):
+    command = [AudioSegment.converter, "-hide_banner", "-loglevel", "error"]
+    if fmt:
+        command += ["-f", FFMPEG_FORMATS[fmt]] # Skip container probing
+    if hasattr(audio_source, "read"):
+        command += ["-i", "pipe:0"]
+        audio_source.seek(0)
+        stdin_data = audio_source.read()
+    else:
+        command += ["-i", audio_source]
+        stdin_data = None
+    command += ["-vn", "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE), "-f", "s16le", "pipe:1"]
+    result = subprocess.run(command, input=stdin_data, capture_output=True)
+    if result.returncode != 0:
+        raise RuntimeError(f"ffmpeg could not decode {fmt or 'audio'}: {result.stderr.decode(errors='replace').strip()}")
+    return sr.AudioData(result.stdout, TARGET_SAMPLE_RATE, TARGET_SAMPLE_WIDTH)
+
+
+def decode_for_recognition(audio_source):
+    """Decode a file-like object or path to 16 kHz mono 16-bit sr.AudioData.
+
+    Returns (audio_data, sniffed_format).
+    """
+    fmt = sniff_audio_format(_read_head(audio_source))
+    if fmt in NATIVE_FORMATS:
+        try:
+            return _decode_native(audio_source), fmt
+        except ValueError as e:
+            # e.g. a float or compressed WAV codec the wave module cannot read; let ffmpeg probe it
+            log.warning("Native %s decode failed (%s), retrying with ffmpeg", fmt, e)
+            return _decode_ffmpeg(audio_source, None), fmt
+    return _decode_ffmpeg(audio_source, fmt), fmt
+
+
+# --- Incremental Decoding ---
+# A recording uploaded while it is being made is decoded by one ffmpeg process
+# that lives as long as the upload. Chunks go to its stdin as they arrive and
+# the 16 kHz PCM it writes out is appended to `pcm`. Each byte is decoded once,
+# instead of the whole recording being decoded again on every partial pass (a
+# WebM chunk on its own lacks the container header, so it cannot be decoded
+# alone).
+
+class StreamDecoder:
+    READ_SIZE = 64 * 1024
+
+    def __init__(self):
+        self.pcm = bytearray() # 16 kHz mono 16-bit, grows while the upload is running
+        self.error = None
+        self._pending = [] # Chunks written before ffmpeg was running
+        self._process = None
+        self._reader = None
+        self._stderr = b""
+        self._closed = False
+        self._started = asyncio.Event()
+
+    async def start(self, fmt):
+        """Start ffmpeg for a recording whose first bytes sniffed as `fmt`."""
+        command = [AudioSegment.converter, "-hide_banner", "-loglevel", "error"]
+        if fmt:
+            command += ["-f", FFMPEG_FORMATS.get(fmt, fmt)] # Native formats share their ffmpeg demuxer name
+        command += ["-i", "pipe:0", "-vn", "-ac", "1", "-ar", str(TARGET_SAMPLE_RATE), "-f", "s16le", "pipe:1"]
+        try:
+            process = await asyncio.create_subprocess_exec(
+                *command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+            )
+        except OSError as e:
+            self.error = f"could not start ffmpeg: {e}"
+            self._started.set()
+            return
+        self._process = process
+        if self._closed: # Discarded while ffmpeg was starting
+            process.kill()
+        else:
+            self._reader = asyncio.create_task(self._read())
+            for chunk in self._pending:
+                process.stdin.write(chunk)
+            self._pending = []
+        self._started.set()
+
+    async def _read(self):
+        stderr = asyncio.create_task(self._process.stderr.read())
+        while True:
+            data = await self._process.stdout.read(self.READ_SIZE)
+            if not data:
+                break
+            self.pcm += data
+        self._stderr = await stderr
+
+    def write(self, chunk):
+        # Chunks must be written in upload order; drain() applies backpressure
+        if self.error is not None or self._closed:
+            return
+        if self._process is None:
+            self._pending.append(chunk)
+        else:
+            self._process.stdin.write(chunk)
+
+    async def drain(self):
+        if self._process is None or self._closed:
+            return
+        try:
+            await self._process.stdin.drain()
+        except (BrokenPipeError, ConnectionResetError):
+            pass # ffmpeg gave up on the input; finish() reports why
+
+    async def finish(self):
+        """Close the input and wait for the rest of the PCM. Returns False (see `error`) if decoding failed."""
+        await self._started.wait()
+        if self._reader is None: # ffmpeg did not start, or the stream was discarded
+            return False
+        self._process.stdin.close()
+        await self._reader
+        if await self._process.wait() != 0 and self.error is None:
+            self.error = f"ffmpeg could not decode the stream: {self._stderr.decode(errors='replace').strip()}"
+        return self.error is None
+
+    def close(self):
+        self._closed = True
+        self._pending = []
+        if self._process is not None and self._process.returncode is None:
+            self._process.kill()
+
+
+# --- Silence Trimming ---
+# Energy-based voice activity detection over 10 ms frames of the decoded PCM.
+# Leading and trailing silence is cut down to a short padding and pauses longer
+# than max_pause_ms are shortened to max_pause_ms, so the recognizer receives
+# (and uploads) only the part of the recording that holds speech.
+
+class SilenceTrimmer:
+    FRAME_MS = 10
+
+    def __init__(self, threshold_dbfs=-45, max_pause_ms=600, padding_ms=200):
+        self.threshold = int(32768 * 10 ** (threshold_dbfs / 20)) # dBFS -> RMS amplitude of 16-bit samples
+        self.max_pause_frames = max(2, max_pause_ms // self.FRAME_MS)
+        self.padding_frames = padding_ms // self.FRAME_MS
+
+    def _analyse(self, audio):
+        frame_bytes = audio.sample_rate * audio.sample_width * self.FRAME_MS // 1000
+        data = audio.frame_data
+        frames = [data[i:i + frame_bytes] for i in range(0, len(data), frame_bytes)]
+        return frames, [audioop.rms(frame, audio.sample_width) >= self.threshold for frame in frames]
+
+    def segment_end(self, audio, tail_guard_ms=500):
+        """Byte offset in the middle of the last pause that follows speech, or None.
+
+        Used to cut finished segments off a recording that is still growing; the
+        last tail_guard_ms are ignored because they may still change.
+        """
+        frames, voiced = self._analyse(audio)
+        limit = len(frames) - tail_guard_ms // self.FRAME_MS
+        end, pause, heard_speech = None, 0, False
+        for i in range(max(0, limit)):
+            if voiced[i]:
+                heard_speech, pause = True, 0
+                continue
+            pause += 1
+            if heard_speech and pause == self.max_pause_frames:
+                end = i + 1 - self.max_pause_frames // 2
+        return end * len(frames[0]) if end is not None else None
+
+    def trim(self, audio):
+        """Return (trimmed sr.AudioData, seconds removed). Audio without any voiced frame is left as is."""
+        data = audio.frame_data
+        frames, voiced = self._analyse(audio)
+        if not any(voiced):
+            return audio, 0.0
+
+        first = voiced.index(True)
+        last = len(voiced) - 1 - voiced[::-1].index(True)
+        start = max(0, first - self.padding_frames)
+        end = min(len(frames), last + 1 + self.padding_frames)
+
+        kept, pause = [], []
+        half = self.max_pause_frames // 2
+        for frame, is_voiced in zip(frames[start:end], voiced[start:end]):
+            if not is_voiced:
+                pause.append(frame)
+                continue
+            if len(pause) > self.max_pause_frames:
+                pause = pause[:half] + pause[-half:]
+            kept.extend(pause)
+            pause = []
+            kept.append(frame)
+        kept.extend(pause) # Trailing padding
+
+        trimmed = b"".join(kept)
+        removed_seconds = (len(data) - len(trimmed)) / (audio.sample_rate * audio.sample_width)
+        return sr.AudioData(trimmed, audio.sample_rate, audio.sample_width), removed_seconds
@@ -0,0 +1,90 @@
+import asyncio
+import secrets
+import threading
+from collections import OrderedDict
+
+
+# --- Per-turn Audio Ring Buffer ---
+# Synthesized replies are kept in memory under unique, unguessable audio ids
+# instead of one shared ai_response.wav. An entry is either
+#   * pending  - only the text is known; the first GET streams it from Murf, or
+#   * complete - the full audio bytes are buffered and can be served directly, or
+#   * failed   - done without data; synthesis did not succeed.
+# The oldest entries are dropped once the item or byte budget is exceeded.
+# Ids are only known to the process that issued them, so the backend is served
+# by a single worker (see the README).
+# Waiting for an entry is loop-native (an asyncio.Event), so a pending GET holds
+# no thread; complete(), fail() and eviction must run on the event loop.
+
+class AudioEntry:
+    def __init__(self, text=None, data=None, mimetype="audio/wav"):
+        self.text = text
+        self.data = data
+        self.mimetype = mimetype
+        self.claimed = False # Set once a request has started streaming a pending entry
+        self.done = asyncio.Event()
+        if data is not None:
+            self.done.set()
+
+    async def wait(self):
+        await self.done.wait()
+
+    @property
+    def size(self):
+        return len(self.data) if self.data else 0
+
+
+class AudioRingBuffer:
+    def __init__(self, max_items, max_bytes):
+        self.max_items = max_items
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._total_bytes = 0
+        self._lock = threading.Lock()
+
+    def _evict(self):
+        while self._entries and (len(self._entries) > self.max_items or self._total_bytes > self.max_bytes):
+            _, entry = self._entries.popitem(last=False)
+            self._total_bytes -= entry.size
+            entry.done.set() # Wake anyone still waiting on an evicted entry
+
+    def _insert(self, entry):
+        audio_id = secrets.token_urlsafe(12)
+        with self._lock:
+            self._entries[audio_id] = entry
+            self._total_bytes += entry.size
+            self._evict()
+        return audio_id
+
+    def put(self, data, mimetype="audio/wav"):
+        return self._insert(AudioEntry(data=data, mimetype=mimetype))
+
+    def reserve(self, text):
+        """Register text whose audio will be streamed on first request."""
+        return self._insert(AudioEntry(text=text))
+
+    def get(self, audio_id):
+        with self._lock:
+            return self._entries.get(audio_id)
+
+    def claim(self, audio_id):
+        """Return the pending entry if the caller is the first to stream it, else None."""
+        with self._lock:
+            entry = self._entries.get(audio_id)
+            if entry is None or entry.claimed or entry.done.is_set():
+                return None
+            entry.claimed = True
+            return entry
+
+    def complete(self, audio_id, entry, data):
+        with self._lock:
+            entry.data = data
+            entry.done.set()
+            if self._entries.get(audio_id) is entry:
+                self._total_bytes += entry.size
+                self._evict()
+
+    def fail(self, entry):
+        # Synthesis failed: the entry stays without data and waiters are released
+        with self._lock:
+            entry.done.set()
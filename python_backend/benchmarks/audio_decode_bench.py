@@ -0,0 +1,117 @@
+"""Decode time and recognizer payload size per upload format.
+
+Compares the previous decode path (recognizer at the source rate, mono) with
+decode_for_recognition (sniffed container, 16 kHz mono 16-bit). The payload is
+the FLAC body speech_recognition would send to Google.
+
+    python benchmarks/audio_decode_bench.py                 # synthetic 48 kHz stereo clip
+    python benchmarks/audio_decode_bench.py rec1.webm a.wav # your own recordings
+
+Without ffmpeg only WAV/AIFF/FLAC inputs can be measured.
+"""
+import argparse
+import io
+import math
+import os
+import shutil
+import statistics
+import struct
+import subprocess
+import sys
+import time
+import wave
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import speech_recognition as sr
+from pydub import AudioSegment
+
+from audio_decode import decode_for_recognition, sniff_audio_format
+
+
+def synthetic_wav(seconds=5, rate=48000):
+    # Speech-like test signal: a few harmonics with a slow amplitude envelope, stereo like a browser capture
+    frames = bytearray()
+    for i in range(seconds * rate):
+        t = i / rate
+        envelope = 0.5 + 0.5 * math.sin(2 * math.pi * 3 * t)
+        sample = envelope * sum(math.sin(2 * math.pi * f * t) / n for n, f in enumerate((180, 360, 720, 1440), 1))
+        value = int(6000 * sample)
+        frames += struct.pack("<hh", value, value)
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(2)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(bytes(frames))
+    return buf.getvalue()
+
+
+def encode_with_ffmpeg(wav_bytes, fmt, codec_args):
+    result = subprocess.run(
+        [AudioSegment.converter, "-hide_banner", "-loglevel", "error", "-f", "wav", "-i", "pipe:0", *codec_args, "-f", fmt, "pipe:1"],
+        input=wav_bytes, capture_output=True, check=True,
+    )
+    return result.stdout
+
+
+def sample_inputs(paths):
+    if paths:
+        for path in paths:
+            with open(path, "rb") as f:
+                yield os.path.basename(path), f.read()
+        return
+    has_ffmpeg = shutil.which(AudioSegment.converter) is not None
+    if not has_ffmpeg:
+        print("ffmpeg not found: only the WAV sample is measured\n")
+    wav_bytes = synthetic_wav()
+    yield "synthetic.wav (48 kHz stereo)", wav_bytes
+    if has_ffmpeg:
+        yield "synthetic.webm (opus)", encode_with_ffmpeg(wav_bytes, "webm", ["-c:a", "libopus"])
+        yield "synthetic.ogg (vorbis)", encode_with_ffmpeg(wav_bytes, "ogg", ["-c:a", "libvorbis"])
+        yield "synthetic.mp3", encode_with_ffmpeg(wav_bytes, "mp3", [])
+
+
+def legacy_decode(data):
+    # What transcribe_audio_file did before: sr.AudioFile first, pydub fallback at the source rate
+    try:
+        with sr.AudioFile(io.BytesIO(data)) as source:
+            return sr.Recognizer().record(source)
+    except ValueError:
+        segment = AudioSegment.from_file(io.BytesIO(data)).set_channels(1)
+        return sr.AudioData(segment.raw_data, segment.frame_rate, segment.sample_width)
+
+
+def direct_decode(data):
+    return decode_for_recognition(io.BytesIO(data))[0]
+
+
+def measure(decode, data, repeat):
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        audio = decode(data)
+        timings.append(time.perf_counter() - start)
+    return statistics.median(timings), audio.sample_rate, len(audio.get_flac_data())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("files", nargs="*", help="audio files to measure (default: generated samples)")
+    parser.add_argument("--repeat", type=int, default=5, help="decodes per measurement, the median is reported")
+    args = parser.parse_args()
+
+    print(f"{'input':32} {'format':6} {'path':7} {'decode ms':>10} {'rate':>6} {'FLAC bytes':>11}")
+    for name, data in sample_inputs(args.files):
+        fmt = sniff_audio_format(data[:12]) or "?"
+        for label, decode in (("legacy", legacy_decode), ("direct", direct_decode)):
+            try:
+                seconds, rate, payload = measure(decode, data, args.repeat)
+            except Exception as e:
+                print(f"{name:32} {fmt:6} {label:7} failed: {e}")
+                continue
+            print(f"{name:32} {fmt:6} {label:7} {seconds * 1000:10.1f} {rate:6d} {payload:11d}")
+
+
+if __name__ == "__main__":
+    main()
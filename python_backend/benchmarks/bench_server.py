@@ -0,0 +1,71 @@
+"""Run main.py against the upstream stubs, with a stand-in speech recognizer.
+
+    python benchmarks/bench_server.py --port 5104 --upstream http://127.0.0.1:5105 --stt-latency-ms 300
+
+Decoding, silence trimming, sessions, TTS caching and the assessment jobs are
+the real code paths; only recognize_google is replaced, since it cannot be
+pointed at a local server. Runtime state (sessions.db, jobs.db) goes to
+--state-dir so benchmark runs never touch a development database.
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class BenchSTTEngine:
+    # Online engine stand-in: runs on the audio thread pool like GoogleWebEngine
+    name = "bench"
+    offline = False
+
+    def __init__(self, latency_ms, text="I would use React hooks to keep the state close to where it is used."):
+        self.latency_ms = latency_ms
+        self.text = text
+
+    def load(self):
+        pass
+
+    def recognize(self, audio):
+        time.sleep(self.latency_ms / 1000 * random.uniform(0.9, 1.1))
+        return self.text
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5104)
+    parser.add_argument("--upstream", default="http://127.0.0.1:5105", help="base URL of stub_upstreams.py")
+    parser.add_argument("--stt-latency-ms", type=float, default=300, help="time the stand-in recognizer takes")
+    parser.add_argument("--state-dir", default=None, help="directory for sessions.db/jobs.db (default: a temp dir)")
+    args = parser.parse_args()
+
+    state_dir = args.state_dir or tempfile.mkdtemp(prefix="bench_state_")
+    os.makedirs(state_dir, exist_ok=True)
+    # Set before main is imported; main's .env loading does not override these
+    os.environ.update({
+        "GEMINI_API_KEY": "bench",
+        "MERF_AI_API_KEY": "bench",
+        "GEMINI_API_BASE_URL": args.upstream,
+        "MURF_API_BASE_URL": args.upstream,
+        "NODE_BACKEND_URL": f"{args.upstream}/api/ai-results",
+        "SESSION_DB_PATH": os.path.join(state_dir, "sessions.db"),
+        "JOBS_DB_PATH": os.path.join(state_dir, "jobs.db"),
+        "TTS_CACHE_DIR": os.environ.get("TTS_CACHE_DIR", ""),
+    })
+    sys.path.insert(0, BACKEND_DIR)
+    import main as backend
+
+    backend.create_services()
+    backend.speech_to_text.engine = BenchSTTEngine(args.stt_latency_ms)
+
+    import uvicorn
+    uvicorn.run(backend.app, host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    # STT workers are spawned and re-import this module, so nothing may run at import time
+    main()
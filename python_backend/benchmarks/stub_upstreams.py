@@ -0,0 +1,209 @@
+"""Local stand-ins for Gemini, Murf and the Node.js results backend.
+
+One server answers all three on a single port with configurable latency and
+payload sizes, so main.py can be measured without API keys or network:
+
+    python benchmarks/stub_upstreams.py --port 5105 --gemini-latency-ms 400 --audio-bytes 200000
+
+  POST /v1beta/models/<model>:generateContent        text reply, or JSON when a responseSchema is sent
+  POST /v1beta/models/<model>:streamGenerateContent   SSE, --stream-chunks events --gemini-chunk-ms apart
+  POST /v1beta/cachedContents, DELETE /v1beta/cachedContents/<id>
+  POST /v1/speech/generate                            {"audioFile": <this server>/murf-audio/<n>.wav}
+  GET  /murf-audio/<n>.wav                            --audio-bytes of WAV spread over --murf-download-ms
+  POST /api/ai-results                                the Node.js results endpoint
+  GET  /stub_stats                                    request counts per endpoint
+
+--gemini-quota / --murf-quota emulate provider quotas: calls beyond that many
+in flight are answered 429 with Retry-After, counted as "<provider>:429".
+
+turn_bench.py starts this automatically; run it by hand to point a real
+server at it (GEMINI_API_BASE_URL, MURF_API_BASE_URL, NODE_BACKEND_URL).
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import struct
+from collections import Counter
+
+from quart import Quart, Response, jsonify, request
+
+WORDS = ("the", "candidate", "should", "explain", "how", "react", "state", "flows", "through", "components",
+         "and", "why", "that", "matters", "for", "rendering", "performance", "in", "large", "applications")
+
+
+def add_stub_arguments(parser):
+    group = parser.add_argument_group("upstream stubs")
+    group.add_argument("--gemini-latency-ms", type=float, default=400, help="until the reply (streaming: the first chunk)")
+    group.add_argument("--gemini-chunk-ms", type=float, default=60, help="between streamed chunks")
+    group.add_argument("--stream-chunks", type=int, default=6)
+    group.add_argument("--reply-chars", type=int, default=240, help="length of each interviewer reply")
+    group.add_argument("--murf-latency-ms", type=float, default=300, help="speech/generate")
+    group.add_argument("--murf-download-ms", type=float, default=150, help="time to send the whole audio file")
+    group.add_argument("--audio-bytes", type=int, default=160_000, help="size of each synthesized file")
+    group.add_argument("--node-latency-ms", type=float, default=50)
+    group.add_argument("--jitter", type=float, default=0.1, help="random +/- fraction applied to every latency")
+    group.add_argument("--gemini-quota", type=int, default=0, help="Gemini calls allowed in flight, more get 429 (0: no quota)")
+    group.add_argument("--murf-quota", type=int, default=0, help="speech/generate calls allowed in flight, more get 429 (0: no quota)")
+    return parser
+
+
+def stub_arguments(args):
+    # The stub options of a parsed namespace, as command line arguments again
+    return [
+        f"--gemini-latency-ms={args.gemini_latency_ms}", f"--gemini-chunk-ms={args.gemini_chunk_ms}",
+        f"--stream-chunks={args.stream_chunks}", f"--reply-chars={args.reply_chars}",
+        f"--murf-latency-ms={args.murf_latency_ms}", f"--murf-download-ms={args.murf_download_ms}",
+        f"--audio-bytes={args.audio_bytes}", f"--node-latency-ms={args.node_latency_ms}", f"--jitter={args.jitter}",
+        f"--gemini-quota={args.gemini_quota}", f"--murf-quota={args.murf_quota}",
+    ]
+
+
+def wav_bytes(size, rate=44100):
+    # A silent 16-bit mono WAV of about `size` bytes
+    frames = max(0, size - 44) // 2 * 2
+    header = b"RIFF" + struct.pack("<I", 36 + frames) + b"WAVEfmt " + struct.pack("<IHHIIHH", 16, 1, 1, rate, rate * 2, 2, 16)
+    return header + b"data" + struct.pack("<I", frames) + bytes(frames)
+
+
+def create_stub_app(args):
+    app = Quart(__name__)
+    counts = Counter()
+    replies = itertools.count(1)
+    audio = wav_bytes(args.audio_bytes)
+    in_flight = Counter()
+
+    class QuotaExceeded(Exception):
+        pass
+
+    def take_quota(provider, limit):
+        # Calls beyond the quota are refused, like the real APIs do; release with in_flight[provider] -= 1
+        if limit and in_flight[provider] >= limit:
+            counts[f"{provider}:429"] += 1
+            raise QuotaExceeded()
+        in_flight[provider] += 1
+
+    @app.errorhandler(QuotaExceeded)
+    async def quota_exceeded(error):
+        return jsonify({"error": {"code": 429, "status": "RESOURCE_EXHAUSTED"}}), 429, {"Retry-After": "1"}
+
+    async def delay(ms):
+        if ms > 0:
+            await asyncio.sleep(ms / 1000 * random.uniform(1 - args.jitter, 1 + args.jitter))
+
+    def reply_text():
+        # Every reply differs, so the TTS cache does not hide Murf's latency
+        n = next(replies)
+        words = []
+        while sum(len(w) + 1 for w in words) < args.reply_chars:
+            words.append(random.choice(WORDS))
+            if len(words) % 12 == 0:
+                words[-1] += "."
+        return f"Question {n}: " + " ".join(words).capitalize() + "?"
+
+    def candidate(text=None, json_body=None):
+        return {"candidates": [{"content": {"role": "model", "parts": [{"text": json.dumps(json_body) if json_body else text}]}}]}
+
+    @app.route("/", methods=["GET", "HEAD"])
+    async def root():
+        # Connection warm-up target
+        return "ok"
+
+    @app.route("/v1beta/models/<path:target>", methods=["POST"])
+    async def gemini(target):
+        method = target.rsplit(":", 1)[-1]
+        counts[f"gemini:{method}"] += 1
+        payload = await request.get_json()
+        if method == "streamGenerateContent":
+            text = reply_text()
+            size = -(-len(text) // args.stream_chunks)
+            take_quota("gemini", args.gemini_quota)
+
+            async def events():
+                try:
+                    await delay(args.gemini_latency_ms)
+                    for n, start in enumerate(range(0, len(text), size)):
+                        if n:
+                            await delay(args.gemini_chunk_ms)
+                        yield f"data: {json.dumps(candidate(text[start:start + size]))}\r\n\r\n".encode()
+                finally:
+                    in_flight["gemini"] -= 1 # The quota slot is held until the stream ends
+
+            return Response(events(), mimetype="text/event-stream")
+
+        take_quota("gemini", args.gemini_quota)
+        try:
+            await delay(args.gemini_latency_ms)
+        finally:
+            in_flight["gemini"] -= 1
+        config = payload.get("generationConfig") or {}
+        if config.get("responseMimeType") == "application/json":
+            properties = (config.get("responseSchema") or {}).get("properties", {})
+            if "strengths" in properties:
+                body = {"score": 70, "strengths": "Clear answers", "weaknesses": "Little depth", "skills_observed": ["React"]}
+            else:
+                body = {"score": 72, "feedback": "Solid fundamentals, needs more depth.", "recommendation": "Further Interview"}
+            return jsonify(candidate(json_body=body))
+        return jsonify(candidate(reply_text()))
+
+    @app.route("/v1beta/cachedContents", methods=["POST"])
+    async def create_cached_content():
+        counts["gemini:cachedContents"] += 1
+        await delay(args.gemini_latency_ms)
+        return jsonify({"name": f"cachedContents/stub-{next(replies)}"})
+
+    @app.route("/v1beta/cachedContents/<cache_id>", methods=["DELETE"])
+    async def delete_cached_content(cache_id):
+        counts["gemini:deleteCachedContent"] += 1
+        return jsonify({})
+
+    @app.route("/v1/speech/generate", methods=["POST"])
+    async def murf_generate():
+        counts["murf:generate"] += 1
+        await request.get_json()
+        take_quota("murf", args.murf_quota)
+        try:
+            await delay(args.murf_latency_ms)
+        finally:
+            in_flight["murf"] -= 1
+        return jsonify({"audioFile": f"{request.host_url.rstrip('/')}/murf-audio/{next(replies)}.wav"})
+
+    @app.route("/murf-audio/<name>")
+    async def murf_audio(name):
+        counts["murf:audio"] += 1
+        frames = [audio[start:start + 16384] for start in range(0, len(audio), 16384)]
+
+        async def body():
+            for frame in frames:
+                await delay(args.murf_download_ms / len(frames))
+                yield frame
+
+        return Response(body(), mimetype="audio/wav", headers={"Content-Length": str(len(audio))})
+
+    @app.route("/api/ai-results", methods=["POST"])
+    async def node_results():
+        counts["node:results"] += 1
+        await request.get_json()
+        await delay(args.node_latency_ms)
+        return jsonify({"message": "Result saved", "id": next(replies)}), 201
+
+    @app.route("/stub_stats")
+    async def stub_stats():
+        return jsonify(dict(counts))
+
+    return app
+
+
+def main():
+    parser = add_stub_arguments(argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter))
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5105)
+    args = parser.parse_args()
+
+    import uvicorn
+    uvicorn.run(create_stub_app(args), host=args.host, port=args.port, log_level="warning")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,372 @@
+"""End-to-end latency benchmark for full interview sessions.
+
+Starts stub_upstreams.py and bench_server.py on free local ports, then runs
+--sessions interviews with --concurrency of them in flight. Each session
+selects an interview, loads the interview page, plays the greeting, answers --turns times with an
+uploaded recording and ends the interview, waiting until the assessment has
+been delivered to the (stub) Node.js backend. Latency is reported per stage
+as p50/p95/p99, plus turn and session throughput.
+
+    python benchmarks/turn_bench.py --concurrency 8 --sessions 32
+    python benchmarks/turn_bench.py --mode turn --gemini-latency-ms 800
+    python benchmarks/turn_bench.py --save-baseline benchmarks/baseline.json
+    python benchmarks/turn_bench.py --baseline benchmarks/baseline.json   # exit 1 on regression
+
+--app-url benchmarks an already running server instead (its upstreams are
+then whatever it is configured with). Server output goes to --log-dir.
+
+Stages:
+  select_interview     POST /select_interview
+  interview_page       GET /interview_agent; --page-load-ms more pass before the greeting
+  greeting_first_audio greeting requested -> first byte of its first sentence's audio
+  greeting_total       greeting requested -> all of its audio downloaded
+  turn_first_audio     answer uploaded -> first byte of the reply's audio
+  turn_total           answer uploaded -> all of the reply's audio downloaded
+  audio_download       one GET /audio/<id>, request -> last byte
+  end_interview        POST /end_interview (queues the assessment)
+  assessment           end_interview sent -> job completed (result delivered)
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+
+import httpx
+
+from audio_decode_bench import synthetic_wav
+from stub_upstreams import add_stub_arguments, stub_arguments
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+
+INTERVIEW = {
+    "userId": "bench-user",
+    "interview_id": "1",
+    "interview_title": "Frontend Developer Interview",
+    "interview_type": "Technical",
+    "job_role": "Junior Frontend Developer",
+    "difficulty": "Medium",
+    "key_skills": ["React", "JavaScript", "HTML", "CSS"],
+    "duration": "45 mins",
+    "description": "Assess basic React concepts and fundamental web technologies.",
+}
+GREETING_PROMPT = "Start the interview with a greeting and your first question based on the selected interview context."
+TERMINAL_JOB_STATES = ("completed", "failed", "delivery_failed")
+# Percentiles checked against the baseline; p99 is reported only (too few samples to be stable)
+COMPARED_PERCENTILES = ("p50", "p95")
+
+
+class StageError(Exception):
+    def __init__(self, stage, message):
+        super().__init__(f"{stage}: {message}")
+        self.stage = stage
+
+
+class Recorder:
+    def __init__(self):
+        self.samples = defaultdict(list)
+        self.errors = Counter()
+        self.turns = 0
+        self.sessions = 0
+
+    def add(self, stage, seconds):
+        self.samples[stage].append(seconds * 1000)
+
+    def summary(self, wall_seconds):
+        stages = {}
+        for stage, values in self.samples.items():
+            values = sorted(values)
+            cuts = statistics.quantiles(values, n=100, method="inclusive") if len(values) > 1 else values * 99
+            stages[stage] = {
+                "count": len(values),
+                "p50": round(cuts[49], 1),
+                "p95": round(cuts[94], 1),
+                "p99": round(cuts[98], 1),
+            }
+        return {
+            "stages": stages,
+            "throughput": {
+                "turns_per_second": round(self.turns / wall_seconds, 3),
+                "sessions_per_second": round(self.sessions / wall_seconds, 3),
+            },
+            "errors": dict(self.errors),
+            "wall_seconds": round(wall_seconds, 2),
+        }
+
+
+def checked(response, stage):
+    if response.status_code >= 400:
+        try:
+            body = response.text[:200]
+        except httpx.ResponseNotRead: # A streamed response; the status has to do
+            body = ""
+        raise StageError(stage, f"HTTP {response.status_code} {body}")
+    return response
+
+
+async def fetch_audio(client, url, recorder, started, first_audio):
+    # Downloads one sentence's audio; `first_audio` collects the first byte time of the turn
+    requested = time.perf_counter()
+    async with client.stream("GET", url) as response:
+        checked(response, "audio_download")
+        async for _ in response.aiter_bytes():
+            first_audio.setdefault("at", time.perf_counter() - started)
+    recorder.add("audio_download", time.perf_counter() - requested)
+
+
+async def streaming_turn(client, headers, recorder, stage, **request_kwargs):
+    # /turn_stream: audio of each sentence is fetched as soon as its event arrives, like the page does
+    started = time.perf_counter()
+    first_audio = {}
+    downloads = []
+    async with client.stream("POST", "/turn_stream", headers=headers, **request_kwargs) as response:
+        checked(response, stage)
+        async for line in response.aiter_lines():
+            if not line.strip():
+                continue
+            event = json.loads(line)
+            if event["type"] == "sentence" and event.get("audio_url"):
+                downloads.append(asyncio.create_task(fetch_audio(client, event["audio_url"], recorder, started, first_audio)))
+            elif event["type"] == "error":
+                raise StageError(stage, event.get("message"))
+    await asyncio.gather(*downloads)
+    if "at" not in first_audio:
+        raise StageError(stage, "reply had no audio")
+    recorder.add(f"{stage}_first_audio", first_audio["at"])
+    recorder.add(f"{stage}_total", time.perf_counter() - started)
+
+
+async def fused_turn(client, headers, recorder, stage, **request_kwargs):
+    # /turn: one JSON response, then a single audio GET
+    started = time.perf_counter()
+    data = checked(await client.post("/turn", headers=headers, **request_kwargs), stage).json()
+    if not data.get("audio_url"):
+        raise StageError(stage, "reply had no audio")
+    first_audio = {}
+    await fetch_audio(client, data["audio_url"], recorder, started, first_audio)
+    recorder.add(f"{stage}_first_audio", first_audio["at"])
+    recorder.add(f"{stage}_total", time.perf_counter() - started)
+
+
+async def run_session(client, args, recording, recorder):
+    started = time.perf_counter()
+    data = checked(await client.post("/select_interview", json=INTERVIEW), "select_interview").json()
+    recorder.add("select_interview", time.perf_counter() - started)
+    headers = {"X-Session-Id": data["session_id"]}
+
+    # The browser navigates, fetches the page and its assets and opens the socket before it asks for the greeting
+    started = time.perf_counter()
+    checked(await client.get(data["redirect_url"]), "interview_page")
+    recorder.add("interview_page", time.perf_counter() - started)
+    await asyncio.sleep(args.page_load_ms / 1000)
+
+    await streaming_turn(client, headers, recorder, "greeting", json={"prompt": GREETING_PROMPT})
+    answer = fused_turn if args.mode == "turn" else streaming_turn
+    for _ in range(args.turns):
+        await answer(client, headers, recorder, "turn", files={"audio_file": ("answer.wav", recording, "audio/wav")})
+        recorder.turns += 1
+
+    started = time.perf_counter()
+    data = checked(await client.post("/end_interview", headers=headers, json={"userId": INTERVIEW["userId"]}), "end_interview").json()
+    recorder.add("end_interview", time.perf_counter() - started)
+    deadline = started + args.assessment_timeout
+    while True:
+        job = checked(await client.get(data["status_url"]), "assessment").json()
+        if job["status"] in TERMINAL_JOB_STATES:
+            break
+        if time.perf_counter() > deadline:
+            raise StageError("assessment", f"still {job['status']} after {args.assessment_timeout}s")
+        await asyncio.sleep(0.05)
+    if job["status"] != "completed":
+        raise StageError("assessment", f"job {job['status']}: {job.get('error')}")
+    recorder.add("assessment", time.perf_counter() - started)
+    recorder.sessions += 1
+
+
+async def run_load(app_url, args, recording, sessions):
+    recorder = Recorder()
+    slots = asyncio.Semaphore(args.concurrency)
+    limits = httpx.Limits(max_connections=args.concurrency * 8, max_keepalive_connections=args.concurrency * 8)
+
+    async def one_session(client):
+        async with slots:
+            try:
+                await run_session(client, args, recording, recorder)
+            except StageError as e:
+                recorder.errors[e.stage] += 1
+                print(f"[bench] session failed at {e}")
+            except httpx.HTTPError as e:
+                recorder.errors["http"] += 1
+                print(f"[bench] session failed: {e!r}")
+
+    async with httpx.AsyncClient(base_url=app_url, limits=limits, timeout=args.request_timeout) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(one_session(client) for _ in range(sessions)))
+        return recorder, time.perf_counter() - started
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+async def wait_until_ready(url, process, timeout=60):
+    deadline = time.monotonic() + timeout
+    async with httpx.AsyncClient() as client:
+        while time.monotonic() < deadline:
+            if process is not None and process.poll() is not None:
+                raise RuntimeError(f"{url} exited with code {process.returncode}")
+            try:
+                if (await client.get(url)).status_code < 500:
+                    return
+            except httpx.HTTPError:
+                pass
+            await asyncio.sleep(0.2)
+    raise RuntimeError(f"{url} did not come up within {timeout}s")
+
+
+def start_servers(args):
+    log_dir = args.log_dir or tempfile.mkdtemp(prefix="turn_bench_")
+    os.makedirs(log_dir, exist_ok=True) # Also the server's --state-dir
+    stub_port, app_port = free_port(), free_port()
+    upstream = f"http://127.0.0.1:{stub_port}"
+    processes = []
+    for name, command in (
+        ("stubs", [os.path.join(BENCH_DIR, "stub_upstreams.py"), f"--port={stub_port}", *stub_arguments(args)]),
+        ("server", [os.path.join(BENCH_DIR, "bench_server.py"), f"--port={app_port}", f"--upstream={upstream}",
+                    f"--stt-latency-ms={args.stt_latency_ms}", f"--state-dir={log_dir}"]),
+    ):
+        log = open(os.path.join(log_dir, f"{name}.log"), "w")
+        processes.append(subprocess.Popen([sys.executable, *command], stdout=log, stderr=subprocess.STDOUT, cwd=os.path.dirname(BENCH_DIR)))
+    print(f"[bench] server logs in {log_dir}")
+    return upstream, f"http://127.0.0.1:{app_port}", processes
+
+
+def print_report(summary):
+    print(f"\n{'stage':22} {'count':>6} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+    for stage in sorted(summary["stages"]):
+        s = summary["stages"][stage]
+        print(f"{stage:22} {s['count']:6d} {s['p50']:9.1f} {s['p95']:9.1f} {s['p99']:9.1f}")
+    throughput = summary["throughput"]
+    print(f"\nturns/s {throughput['turns_per_second']:.2f}   sessions/s {throughput['sessions_per_second']:.2f}   "
+          f"wall {summary['wall_seconds']:.1f}s   errors {sum(summary['errors'].values())} {summary['errors'] or ''}")
+    refused = {call: count for call, count in summary.get("upstream_calls", {}).items() if call.endswith(":429")}
+    if refused:
+        print(f"upstream 429s {refused}")
+
+
+def compare_to_baseline(summary, baseline, tolerance, slack_ms):
+    """Return the list of regressions against a stored baseline summary."""
+    regressions = []
+    for stage, base in baseline["stages"].items():
+        current = summary["stages"].get(stage)
+        if current is None:
+            regressions.append(f"{stage}: no samples (baseline had {base['count']})")
+            continue
+        for percentile in COMPARED_PERCENTILES:
+            limit = base[percentile] * (1 + tolerance) + slack_ms
+            if current[percentile] > limit:
+                regressions.append(f"{stage} {percentile}: {current[percentile]:.1f} ms > {limit:.1f} ms (baseline {base[percentile]:.1f})")
+    for metric, base in baseline["throughput"].items():
+        limit = base * (1 - tolerance)
+        if summary["throughput"][metric] < limit:
+            regressions.append(f"{metric}: {summary['throughput'][metric]:.3f} < {limit:.3f} (baseline {base:.3f})")
+    if summary["errors"]:
+        regressions.append(f"errors: {summary['errors']}")
+    return regressions
+
+
+def scenario(args):
+    keys = ("mode", "concurrency", "sessions", "turns", "page_load_ms", "stt_latency_ms", "gemini_latency_ms", "gemini_chunk_ms",
+            "stream_chunks", "reply_chars", "murf_latency_ms", "murf_download_ms", "audio_bytes", "node_latency_ms", "jitter",
+            "gemini_quota", "murf_quota")
+    return {key: getattr(args, key) for key in keys}
+
+
+async def bench(args):
+    processes = []
+    try:
+        if args.app_url:
+            app_url = args.app_url.rstrip("/")
+        else:
+            upstream, app_url, processes = start_servers(args)
+            await wait_until_ready(f"{upstream}/stub_stats", processes[0])
+        await wait_until_ready(f"{app_url}/stt_stats", processes[1] if processes else None)
+
+        recording = synthetic_wav(seconds=args.answer_seconds, rate=16000)
+        if args.warmup_sessions:
+            # Fills connection pools and starts the STT workers; not measured
+            await run_load(app_url, args, recording, args.warmup_sessions)
+        recorder, wall_seconds = await run_load(app_url, args, recording, args.sessions)
+        summary = recorder.summary(wall_seconds)
+        if not args.app_url:
+            async with httpx.AsyncClient() as client:
+                summary["upstream_calls"] = (await client.get(f"{upstream}/stub_stats")).json()
+        return summary
+    finally:
+        for process in processes:
+            process.terminate()
+        for process in processes:
+            try:
+                process.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                process.kill()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--concurrency", type=int, default=4, help="sessions in flight")
+    parser.add_argument("--sessions", type=int, default=None, help="sessions to run (default: 4 x concurrency)")
+    parser.add_argument("--turns", type=int, default=3, help="answers per session")
+    parser.add_argument("--mode", choices=("turn_stream", "turn"), default="turn_stream", help="endpoint used for answers")
+    parser.add_argument("--answer-seconds", type=int, default=4, help="length of the uploaded recording")
+    parser.add_argument("--page-load-ms", type=float, default=500, help="browser time between the page response and the greeting request")
+    parser.add_argument("--stt-latency-ms", type=float, default=300, help="stand-in recognizer time per answer")
+    parser.add_argument("--warmup-sessions", type=int, default=1)
+    parser.add_argument("--request-timeout", type=float, default=60)
+    parser.add_argument("--assessment-timeout", type=float, default=60)
+    parser.add_argument("--app-url", help="benchmark this running server instead of starting one")
+    parser.add_argument("--log-dir", help="where server logs and state go (default: a temp dir)")
+    parser.add_argument("--json", dest="json_path", help="also write the results here")
+    parser.add_argument("--save-baseline", help="write the results as the new baseline")
+    parser.add_argument("--baseline", help="compare against this baseline and exit 1 on regression")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed relative slowdown against the baseline")
+    parser.add_argument("--slack-ms", type=float, default=20, help="allowed absolute slowdown, keeps fast stages from flapping")
+    add_stub_arguments(parser)
+    args = parser.parse_args()
+    if args.sessions is None:
+        args.sessions = args.concurrency * 4
+
+    summary = asyncio.run(bench(args))
+    summary["scenario"] = scenario(args)
+    print_report(summary)
+
+    for path in filter(None, (args.json_path, args.save_baseline)):
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2, sort_keys=True)
+            f.write("\n")
+        print(f"[bench] results written to {path}")
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+        if baseline.get("scenario") != summary["scenario"]:
+            print("[bench] warning: scenario differs from the baseline's; the comparison may not be meaningful")
+        regressions = compare_to_baseline(summary, baseline, args.tolerance, args.slack_ms)
+        if regressions:
+            print("\nREGRESSED against " + args.baseline)
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions against {args.baseline}")
+
+
+if __name__ == "__main__":
+    main()
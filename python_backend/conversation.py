@@ -0,0 +1,77 @@
+from collections import namedtuple
+
+
+# --- Rolling Conversation Memory ---
+# Gemini gets the recent turns of the session transcript as multi-turn
+# `contents`, newest first until a token budget is used up. Turns that fall
+# out of that window are folded into a running summary by a background
+# compaction call, so prompt size stays flat however long the interview runs.
+# Session state keeps "summary" (text) and "summarized_upto" (how many
+# transcript entries the summary covers); the transcript itself is never cut.
+
+GEMINI_ROLES = {"user": "user", "ai": "model"}
+
+HistoryWindow = namedtuple("HistoryWindow", ["contents", "compact_upto"])
+
+
+def estimate_tokens(text):
+    # Rough heuristic (~4 characters per token for English), good enough for budgeting
+    return max(1, len(text or "") // 4)
+
+
+def _append(contents, role, text):
+    # Gemini expects alternating roles, so consecutive entries of one role are merged
+    if contents and contents[-1]["role"] == role:
+        contents[-1]["parts"][0]["text"] += "\n" + text
+    else:
+        contents.append({"role": role, "parts": [{"text": text}]})
+
+
+def build_history(session, prompt_text, token_budget, min_compaction_turns):
+    transcript = session.get("transcript", [])
+    end = len(transcript)
+    # Routes usually record the user's words before asking for a reply; that
+    # entry is the prompt itself and is sent separately.
+    if end and transcript[end - 1]["role"] == "user" and transcript[end - 1]["text"] == prompt_text:
+        end -= 1
+
+    summary = session.get("summary")
+    summarized_upto = min(session.get("summarized_upto", 0), end)
+    used = estimate_tokens(prompt_text) + (estimate_tokens(summary) if summary else 0)
+    start = end
+    while start > summarized_upto:
+        cost = estimate_tokens(transcript[start - 1]["text"])
+        if used + cost > token_budget:
+            break
+        used += cost
+        start -= 1
+
+    contents = []
+    if summary:
+        _append(contents, "user", f"(Summary of the interview so far: {summary})")
+    for entry in transcript[start:end]:
+        _append(contents, GEMINI_ROLES.get(entry["role"], "user"), entry["text"])
+
+    needs_compaction = start - summarized_upto >= min_compaction_turns
+    return HistoryWindow(contents, start if needs_compaction else None)
+
+
+def finalize_contents(history_contents, user_text):
+    contents = [{"role": c["role"], "parts": [dict(p) for p in c["parts"]]} for c in history_contents]
+    # A conversation must open with a user turn; the transcript opens with the AI greeting
+    if contents and contents[0]["role"] == "model":
+        contents.insert(0, {"role": "user", "parts": [{"text": "(The interview has started.)"}]})
+    _append(contents, "user", user_text)
+    return contents
+
+
+def summary_prompt(previous_summary, entries):
+    lines = "\n".join(f"{entry['role'].upper()}: {entry['text']}" for entry in entries)
+    prompt = (
+        "You maintain a running summary of a job interview for the interviewer. "
+        "Update the summary with the new turns below. Keep the questions asked, the candidate's key answers, "
+        "strengths and weaknesses observed, and topics still to cover. Reply with the summary only, under 200 words.\n\n"
+    )
+    if previous_summary:
+        prompt += f"Current summary:\n{previous_summary}\n\n"
+    return prompt + f"New turns:\n{lines}"
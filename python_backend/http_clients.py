@@ -0,0 +1,129 @@
+import asyncio
+import logging
+import time
+from contextlib import asynccontextmanager, nullcontext
+from urllib.parse import urlsplit
+
+import httpx
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+try:
+    import h2 # noqa: F401 - only needed so httpx can negotiate HTTP/2
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+
+# --- Pooled Upstream HTTP Clients ---
+# One httpx.AsyncClient per upstream (Gemini, Murf, Murf audio downloads, the
+# Node results backend) so TCP/TLS connections are kept alive and reused
+# between turns instead of handshaking on every call, and HTTP/2 is used when
+# the h2 package is installed. Pools are separate so a burst of audio downloads
+# can't starve Gemini of connections.
+# Clients are bound to the event loop they are created on, so start() runs from
+# the app's before_serving hook; anything called earlier creates them lazily.
+# Every call is timed (until the response headers) and failures are counted per
+# upstream in the metrics module. With an AdmissionControl (admission.py) each
+# call first waits for its upstream's gate; streams hold their slot until closed.
+
+def _observe(name, started, response=None, error=None):
+    metrics.upstream_request_seconds.observe(time.perf_counter() - started, upstream=name)
+    if error is not None:
+        metrics.upstream_errors.inc(upstream=name, kind="transport")
+    elif response.status_code >= 400:
+        metrics.upstream_errors.inc(upstream=name, kind=f"{response.status_code // 100}xx")
+
+
+class UpstreamClients:
+    def __init__(self, upstreams, pool_maxsize=20, timeout=(5, 60), http2=True, admission=None):
+        # upstreams: name -> base URL (None if the upstream isn't configured)
+        self.upstreams = upstreams
+        self.admission = admission
+        self.pool_maxsize = pool_maxsize
+        self.timeout = timeout
+        self.http2 = http2 and HTTP2_AVAILABLE
+        self._clients = {}
+
+    def _client(self, name):
+        client = self._clients.get(name)
+        if client is None:
+            if name not in self.upstreams:
+                raise KeyError(f"Unknown upstream '{name}'")
+            connect_timeout, read_timeout = self.timeout
+            client = httpx.AsyncClient(
+                http2=self.http2,
+                limits=httpx.Limits(max_connections=self.pool_maxsize, max_keepalive_connections=self.pool_maxsize),
+                timeout=httpx.Timeout(read_timeout, connect=connect_timeout),
+            )
+            self._clients[name] = client
+        return client
+
+    async def start(self):
+        for name in self.upstreams:
+            self._client(name)
+
+    def _admit(self, name):
+        return self.admission.admit(name) if self.admission is not None else nullcontext()
+
+    async def request(self, name, method, url, **kwargs):
+        async with self._admit(name) as gate:
+            started = time.perf_counter()
+            try:
+                response = await self._client(name).request(method, url, **kwargs)
+            except httpx.RequestError as e:
+                _observe(name, started, error=e)
+                raise
+            _observe(name, started, response)
+            if gate is not None:
+                gate.observe_response(response)
+            return response
+
+    async def post(self, name, url, **kwargs):
+        return await self.request(name, "POST", url, **kwargs)
+
+    async def get(self, name, url, **kwargs):
+        return await self.request(name, "GET", url, **kwargs)
+
+    @asynccontextmanager
+    async def stream(self, name, method, url, **kwargs):
+        # async with upstream_clients.stream(...) as response: async for chunk in response.aiter_bytes()
+        async with self._admit(name) as gate:
+            started = time.perf_counter()
+            opened = False
+            try:
+                async with self._client(name).stream(method, url, **kwargs) as response:
+                    opened = True
+                    _observe(name, started, response)
+                    if gate is not None:
+                        gate.observe_response(response)
+                    yield response
+            except httpx.RequestError as e:
+                # Also counts connections that broke while the body was being read
+                if opened:
+                    metrics.upstream_errors.inc(upstream=name, kind="transport")
+                else:
+                    _observe(name, started, error=e)
+                raise
+
+    async def _warm_up_one(self, name, base_url):
+        parts = urlsplit(base_url)
+        origin = f"{parts.scheme}://{parts.netloc}/"
+        try:
+            await self._client(name).head(origin, timeout=self.timeout[0])
+            log.info("Warmed up connection pool for %s (%s)", name, origin)
+        except httpx.HTTPError as e:
+            log.warning("Could not warm up connection pool for %s: %s", name, e)
+
+    async def warm_up(self):
+        # Open one connection per upstream so the first interview turn skips the handshakes
+        await asyncio.gather(*(
+            self._warm_up_one(name, base_url) for name, base_url in self.upstreams.items() if base_url
+        ))
+
+    async def aclose(self):
+        clients, self._clients = self._clients, {}
+        for client in clients.values():
+            await client.aclose()
@@ -0,0 +1,236 @@
+import asyncio
+import hashlib
+import json
+import logging
+import sqlite3
+import time
+from collections import OrderedDict
+
+from log_setup import fields
+
+log = logging.getLogger(__name__)
+
+
+# --- Interview Catalog ---
+# Interviews come from a source (a JSON file, a SQLite table or the Node.js
+# backend's public interviews) and are kept as an immutable snapshot that is
+# reloaded in the background once it is older than the TTL; requests keep
+# using the previous snapshot meanwhile, and a failed reload keeps it too.
+# Every snapshot is indexed when it is built: by id for /select_interview, by
+# role and difficulty, and by skill (an inverted index over key_skills), so a
+# filtered query only walks the shortest matching posting list and an
+# unfiltered page is a plain slice, however large the catalog grows.
+
+def _key(value):
+    return (value or "").strip().lower()
+
+
+def _parse_skills(raw):
+    if isinstance(raw, list):
+        return [str(skill).strip() for skill in raw if str(skill).strip()]
+    if isinstance(raw, str):
+        try:
+            parsed = json.loads(raw)
+            if isinstance(parsed, list):
+                return _parse_skills(parsed)
+        except json.JSONDecodeError:
+            pass
+        return [skill.strip() for skill in raw.split(",") if skill.strip()]
+    return []
+
+
+def normalize_interview(raw):
+    """One catalog record from the flat form used here or the Node Interview model ({_id, details: {...}})."""
+    details = raw.get("details") or {}
+    interview_id = raw.get("_id") or raw.get("id") or raw.get("interview_id")
+    if not interview_id:
+        return None
+    return {
+        "_id": str(interview_id),
+        "interview_title": raw.get("interview_title") or details.get("interviewTitle"),
+        "interview_type": raw.get("interview_type") or details.get("interviewType"),
+        "job_role": raw.get("job_role") or details.get("jobRole"),
+        "difficulty": raw.get("difficulty") or details.get("difficulty"),
+        "key_skills": _parse_skills(raw.get("key_skills") if "key_skills" in raw else details.get("keySkills")),
+        "duration": raw.get("duration") or details.get("interviewDuration"),
+        "description": raw.get("description") or details.get("description"),
+    }
+
+
+class CatalogPage:
+    def __init__(self, items, total, page, per_page):
+        self.items = items
+        self.total = total
+        self.page = page
+        self.per_page = per_page
+
+    @property
+    def pages(self):
+        return max(1, -(-self.total // self.per_page))
+
+    def to_dict(self):
+        return {"interviews": self.items, "total": self.total, "page": self.page, "per_page": self.per_page, "pages": self.pages}
+
+
+class CatalogSnapshot:
+    FACETS = ("role", "difficulty", "skill")
+    MATCH_CACHE_MAX = 256
+
+    def __init__(self, interviews, loaded_at=0.0):
+        self.interviews = interviews # In source order; indexes hold positions into this list
+        self.loaded_at = loaded_at
+        self.version = hashlib.sha256(json.dumps(interviews, sort_keys=True).encode("utf-8")).hexdigest()[:16]
+        self.by_id = {}
+        self.indexes = {facet: {} for facet in self.FACETS} # facet -> key -> ascending positions
+        self.labels = {facet: {} for facet in self.FACETS} # facet -> key -> display spelling, for the filter menus
+        for position, interview in enumerate(interviews):
+            self.by_id[interview["_id"]] = position
+            self._add("role", interview.get("job_role"), position)
+            self._add("difficulty", interview.get("difficulty"), position)
+            for skill in interview["key_skills"]:
+                self._add("skill", skill, position)
+        # Membership tests while intersecting posting lists
+        self._sets = {facet: {key: frozenset(postings) for key, postings in index.items()} for facet, index in self.indexes.items()}
+        self._matches = OrderedDict() # filters -> matching positions, so paging through one filter intersects once
+
+    def _add(self, facet, value, position):
+        key = _key(value)
+        if not key:
+            return
+        postings = self.indexes[facet].setdefault(key, [])
+        if not postings or postings[-1] != position: # A skill listed twice on one interview
+            postings.append(position)
+        self.labels[facet].setdefault(key, value.strip())
+
+    def __len__(self):
+        return len(self.interviews)
+
+    def get(self, interview_id):
+        position = self.by_id.get(str(interview_id)) if interview_id else None
+        return self.interviews[position] if position is not None else None
+
+    def facet(self, name):
+        # Sorted display values of a filter (role, difficulty or skill)
+        return sorted(self.labels[name].values(), key=str.lower)
+
+    def query(self, role=None, difficulty=None, skills=(), page=1, per_page=24):
+        """Interviews matching every given filter (all of `skills`), one page of them in catalog order."""
+        filters = [("role", role), ("difficulty", difficulty)] + [("skill", skill) for skill in skills]
+        filters = [(facet, _key(value)) for facet, value in filters if _key(value)]
+
+        page = max(1, page)
+        start = (page - 1) * per_page
+        if not filters:
+            total = len(self.interviews)
+            positions = range(start, min(start + per_page, total))
+        else:
+            matches = self._match(tuple(sorted(set(filters))))
+            total = len(matches)
+            positions = matches[start:start + per_page]
+        return CatalogPage([self.interviews[position] for position in positions], total, page, per_page)
+
+    def _match(self, filters):
+        matches = self._matches.get(filters)
+        if matches is not None:
+            self._matches.move_to_end(filters)
+            return matches
+        # Walk the shortest posting list, checking membership in the others
+        ordered = sorted(filters, key=lambda item: len(self.indexes[item[0]].get(item[1], ())))
+        facet, key = ordered[0]
+        others = [self._sets[facet].get(key, frozenset()) for facet, key in ordered[1:]]
+        matches = self._matches[filters] = [position for position in self.indexes[facet].get(key, ()) if all(position in other for other in others)]
+        if len(self._matches) > self.MATCH_CACHE_MAX:
+            self._matches.popitem(last=False)
+        return matches
+
+
+class JsonCatalogSource:
+    name = "json"
+
+    def __init__(self, path):
+        self.path = path
+
+    def _read(self):
+        with open(self.path, encoding="utf-8") as f:
+            return json.load(f)
+
+    async def load(self):
+        return await asyncio.to_thread(self._read)
+
+
+class SQLiteCatalogSource:
+    """Rows of an `interviews` table with the catalog's column names; key_skills as a JSON array or comma list."""
+    name = "sqlite"
+    COLUMNS = ("id", "interview_title", "interview_type", "job_role", "difficulty", "key_skills", "duration", "description")
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+
+    def _read(self):
+        conn = sqlite3.connect(f"file:{self.db_path}?mode=ro", uri=True)
+        try:
+            rows = conn.execute(f"SELECT {', '.join(self.COLUMNS)} FROM interviews ORDER BY rowid").fetchall()
+        finally:
+            conn.close()
+        return [dict(zip(self.COLUMNS, row)) for row in rows]
+
+    async def load(self):
+        return await asyncio.to_thread(self._read)
+
+
+class NodeCatalogSource:
+    # The Node.js backend's Interview documents, e.g. GET /api/interviews/public
+    name = "node"
+
+    def __init__(self, upstream_clients, url, token=None):
+        self.upstream_clients = upstream_clients
+        self.url = url
+        self.token = token
+
+    async def load(self):
+        headers = {"Authorization": f"Bearer {self.token}"} if self.token else {}
+        response = await self.upstream_clients.get("node", self.url, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+
+class InterviewCatalog:
+    def __init__(self, source, ttl_seconds):
+        self.source = source
+        self.ttl_seconds = ttl_seconds
+        self.snapshot = CatalogSnapshot([])
+        self._refresh_task = None
+
+    async def refresh(self):
+        """Reload from the source; on failure the current snapshot stays in use."""
+        try:
+            raw = await self.source.load()
+            interviews = [interview for interview in map(normalize_interview, raw) if interview is not None]
+        except Exception:
+            log.exception("Could not load the interview catalog from %s", self.source.name)
+            # Retry after another TTL rather than on every request
+            self.snapshot.loaded_at = time.time()
+            return self.snapshot
+        snapshot = CatalogSnapshot(interviews, time.time())
+        if snapshot.version != self.snapshot.version:
+            log.info("Interview catalog loaded from %s", self.source.name, extra=fields(interviews=len(snapshot)))
+        self.snapshot = snapshot
+        return snapshot
+
+    def current(self):
+        # Stale snapshots are served while a single background reload runs
+        if time.time() - self.snapshot.loaded_at > self.ttl_seconds and (self._refresh_task is None or self._refresh_task.done()):
+            self._refresh_task = asyncio.create_task(self.refresh())
+        return self.snapshot
+
+
+def create_interview_catalog(backend_name, ttl_seconds, path=None, upstream_clients=None, node_url=None, node_token=None):
+    if backend_name == "node":
+        if node_url:
+            return InterviewCatalog(NodeCatalogSource(upstream_clients, node_url, node_token), ttl_seconds)
+        log.warning("CATALOG_BACKEND is 'node' but CATALOG_NODE_URL is not set, using the JSON catalog")
+    elif backend_name == "sqlite":
+        return InterviewCatalog(SQLiteCatalogSource(path), ttl_seconds)
+    elif backend_name != "json":
+        log.warning("Unknown CATALOG_BACKEND '%s', using the JSON catalog", backend_name)
+    return InterviewCatalog(JsonCatalogSource(path), ttl_seconds)
@@ -0,0 +1,333 @@
+import asyncio
+import json
+import logging
+import random
+import secrets
+import sqlite3
+import threading
+import time
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+
+# --- Durable Assessment Jobs and Results Outbox ---
+# /end_interview only records a job and returns its id. Worker tasks pick jobs
+# up, run the Gemini assessment, and write the result payload for the Node
+# backend into an outbox table in the same transaction. A dispatcher task
+# delivers outbox rows with exponential backoff, so a slow or failing
+# upstream never holds a request open and results survive restarts. Failed
+# assessments are retried with the same backoff (next_attempt_at), so a short
+# Gemini outage or a 429 does not use up a job's attempts within seconds.
+#
+# Job status: queued -> assessing -> delivering -> completed
+#                              \-> failed           \-> delivery_failed
+# Everything lives in one SQLite file so several worker processes can share it;
+# rows are claimed with conditional UPDATEs so each job runs once.
+
+class JobStore:
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._local = threading.local()
+        conn = self._connect()
+        conn.execute("PRAGMA journal_mode=WAL")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " status TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " result TEXT,"
+            " error TEXT,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL DEFAULT 0,"
+            " created_at REAL NOT NULL,"
+            " updated_at REAL NOT NULL)"
+        )
+        if "next_attempt_at" not in {row["name"] for row in conn.execute("PRAGMA table_info(jobs)")}:
+            # jobs.db from before job retries were backed off
+            conn.execute("ALTER TABLE jobs ADD COLUMN next_attempt_at REAL NOT NULL DEFAULT 0")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_status ON jobs(status, created_at)")
+        conn.execute(
+            "CREATE TABLE IF NOT EXISTS outbox ("
+            " id INTEGER PRIMARY KEY AUTOINCREMENT,"
+            " job_id TEXT NOT NULL,"
+            " payload TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " attempts INTEGER NOT NULL DEFAULT 0,"
+            " next_attempt_at REAL NOT NULL,"
+            " last_error TEXT,"
+            " updated_at REAL NOT NULL)"
+        )
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_outbox_due ON outbox(status, next_attempt_at)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            conn.row_factory = sqlite3.Row
+            self._local.conn = conn
+        return conn
+
+    def _write(self, func):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            result = func(conn)
+            conn.execute("COMMIT")
+            return result
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    # --- jobs ---
+    def enqueue(self, payload):
+        job_id = secrets.token_urlsafe(12)
+        now = time.time()
+        self._connect().execute(
+            "INSERT INTO jobs (id, status, payload, next_attempt_at, created_at, updated_at) VALUES (?, 'queued', ?, ?, ?, ?)",
+            (job_id, json.dumps(payload), now, now, now),
+        )
+        return job_id
+
+    def claim_next_job(self):
+        def claim(conn):
+            row = conn.execute(
+                "SELECT id, payload, attempts FROM jobs"
+                " WHERE status = 'queued' AND next_attempt_at <= ? ORDER BY created_at LIMIT 1",
+                (time.time(),),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE jobs SET status = 'assessing', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (time.time(), row["id"]),
+            )
+            return row["id"], json.loads(row["payload"]), row["attempts"] + 1
+        return self._write(claim)
+
+    def requeue_job(self, job_id, error, next_attempt_at=None):
+        now = time.time()
+        self._connect().execute(
+            "UPDATE jobs SET status = 'queued', error = ?, next_attempt_at = ?, updated_at = ? WHERE id = ?",
+            (error, next_attempt_at or now, now, job_id),
+        )
+
+    def fail_job(self, job_id, error, status="failed"):
+        self._connect().execute(
+            "UPDATE jobs SET status = ?, error = ?, updated_at = ? WHERE id = ?",
+            (status, error, time.time(), job_id),
+        )
+
+    def complete_assessment(self, job_id, result, delivery_payload):
+        # Result and outbox row are written together: an assessed job is never lost before delivery
+        def complete(conn):
+            now = time.time()
+            conn.execute(
+                "UPDATE jobs SET status = 'delivering', result = ?, error = NULL, updated_at = ? WHERE id = ?",
+                (json.dumps(result), now, job_id),
+            )
+            conn.execute(
+                "INSERT INTO outbox (job_id, payload, status, next_attempt_at, updated_at) VALUES (?, ?, 'pending', ?, ?)",
+                (job_id, json.dumps(delivery_payload), now, now),
+            )
+        self._write(complete)
+
+    def get_job(self, job_id):
+        row = self._connect().execute(
+            "SELECT id, status, result, error, attempts, created_at, updated_at FROM jobs WHERE id = ?", (job_id,)
+        ).fetchone()
+        if row is None:
+            return None
+        job = dict(row)
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    # --- outbox ---
+    def claim_due_delivery(self):
+        def claim(conn):
+            row = conn.execute(
+                "SELECT id, job_id, payload, attempts FROM outbox"
+                " WHERE status = 'pending' AND next_attempt_at <= ? ORDER BY next_attempt_at LIMIT 1",
+                (time.time(),),
+            ).fetchone()
+            if row is None:
+                return None
+            conn.execute(
+                "UPDATE outbox SET status = 'sending', attempts = attempts + 1, updated_at = ? WHERE id = ?",
+                (time.time(), row["id"]),
+            )
+            return row["id"], row["job_id"], json.loads(row["payload"]), row["attempts"] + 1
+        return self._write(claim)
+
+    def mark_delivered(self, outbox_id, job_id, response_data):
+        def delivered(conn):
+            now = time.time()
+            conn.execute("UPDATE outbox SET status = 'delivered', last_error = NULL, updated_at = ? WHERE id = ?", (now, outbox_id))
+            row = conn.execute("SELECT result FROM jobs WHERE id = ?", (job_id,)).fetchone()
+            result = json.loads(row["result"]) if row and row["result"] else {}
+            result["node_response"] = response_data
+            conn.execute(
+                "UPDATE jobs SET status = 'completed', result = ?, updated_at = ? WHERE id = ?",
+                (json.dumps(result), now, job_id),
+            )
+        self._write(delivered)
+
+    def retry_delivery(self, outbox_id, error, next_attempt_at):
+        self._connect().execute(
+            "UPDATE outbox SET status = 'pending', last_error = ?, next_attempt_at = ?, updated_at = ? WHERE id = ?",
+            (error, next_attempt_at, time.time(), outbox_id),
+        )
+
+    def dead_letter_delivery(self, outbox_id, job_id, error):
+        def dead(conn):
+            now = time.time()
+            conn.execute("UPDATE outbox SET status = 'dead', last_error = ?, updated_at = ? WHERE id = ?", (error, now, outbox_id))
+            conn.execute(
+                "UPDATE jobs SET status = 'delivery_failed', error = ?, updated_at = ? WHERE id = ?",
+                (error, now, job_id),
+            )
+        self._write(dead)
+
+    def recover_stale(self, older_than_seconds):
+        # Work claimed by a process that died mid-way goes back to the queue
+        cutoff = time.time() - older_than_seconds
+        def recover(conn):
+            jobs = conn.execute(
+                "UPDATE jobs SET status = 'queued', updated_at = ? WHERE status = 'assessing' AND updated_at < ?",
+                (time.time(), cutoff),
+            ).rowcount
+            deliveries = conn.execute(
+                "UPDATE outbox SET status = 'pending', updated_at = ? WHERE status = 'sending' AND updated_at < ?",
+                (time.time(), cutoff),
+            ).rowcount
+            return jobs, deliveries
+        return self._write(recover)
+
+    def counts(self):
+        conn = self._connect()
+        return {
+            "jobs": {row[0]: row[1] for row in conn.execute("SELECT status, COUNT(*) FROM jobs GROUP BY status")},
+            "outbox": {row[0]: row[1] for row in conn.execute("SELECT status, COUNT(*) FROM outbox GROUP BY status")},
+        }
+
+
+class AssessmentWorkers:
+    """Runs assess(payload) -> (result, delivery_payload) jobs and delivers the outbox via deliver(payload)."""
+
+    def __init__(self, store, assess, deliver, workers=4, max_job_attempts=3,
+                 max_delivery_attempts=8, backoff_base=2.0, backoff_max=300.0,
+                 poll_seconds=2.0, stale_after_seconds=600):
+        self.store = store
+        self.assess = assess
+        self.deliver = deliver
+        self.workers = workers
+        self.max_job_attempts = max_job_attempts
+        self.max_delivery_attempts = max_delivery_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.poll_seconds = poll_seconds
+        self.stale_after_seconds = stale_after_seconds
+        self._jobs_ready = None
+        self._outbox_ready = None
+        self._tasks = []
+
+    async def start(self):
+        self._jobs_ready = asyncio.Event()
+        self._outbox_ready = asyncio.Event()
+        jobs, deliveries = await asyncio.to_thread(self.store.recover_stale, self.stale_after_seconds)
+        if jobs or deliveries:
+            log.info("Recovered %d assessment jobs and %d pending deliveries", jobs, deliveries)
+        self._tasks = [asyncio.create_task(self._job_worker(n)) for n in range(self.workers)]
+        self._tasks.append(asyncio.create_task(self._outbox_dispatcher()))
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, payload):
+        job_id = await asyncio.to_thread(self.store.enqueue, payload)
+        if self._jobs_ready is not None:
+            self._jobs_ready.set()
+        return job_id
+
+    async def get(self, job_id):
+        return await asyncio.to_thread(self.store.get_job, job_id)
+
+    async def _wait(self, event):
+        # Woken early by local enqueues; the timeout picks up work from other processes
+        try:
+            await asyncio.wait_for(event.wait(), timeout=self.poll_seconds)
+        except asyncio.TimeoutError:
+            pass
+        event.clear()
+
+    def _backoff(self, attempts):
+        delay = min(self.backoff_max, self.backoff_base * (2 ** (attempts - 1)))
+        return delay * random.uniform(0.5, 1.0) # Jitter keeps retries from many jobs apart
+
+    async def _store_call(self, fn, *args):
+        # A store error (e.g. the database is locked) must not end a worker loop:
+        # log it and retry the same call with backoff until it goes through
+        attempts = 0
+        while True:
+            try:
+                return await asyncio.to_thread(fn, *args)
+            except sqlite3.Error as e:
+                attempts += 1
+                delay = self._backoff(attempts)
+                log.error("Job store call %s failed (attempt %d), retrying in %.1fs: %s", fn.__name__, attempts, delay, e)
+                await asyncio.sleep(delay)
+
+    async def _job_worker(self, n):
+        while True:
+            claimed = await self._store_call(self.store.claim_next_job)
+            if claimed is None:
+                await self._wait(self._jobs_ready)
+                continue
+            job_id, payload, attempts = claimed
+            try:
+                result, delivery_payload = await self.assess(payload)
+            except asyncio.CancelledError:
+                await asyncio.to_thread(self.store.requeue_job, job_id, "Worker stopped")
+                raise
+            except Exception as e:
+                if attempts >= self.max_job_attempts:
+                    log.error("Assessment job %s failed (attempt %d), giving up: %s", job_id, attempts, e)
+                    await self._store_call(self.store.fail_job, job_id, str(e))
+                else:
+                    delay = self._backoff(attempts)
+                    metrics.retries.inc(operation="assessment_job")
+                    log.warning("Assessment job %s failed (attempt %d), retrying in %.1fs: %s", job_id, attempts, delay, e)
+                    await self._store_call(self.store.requeue_job, job_id, str(e), time.time() + delay)
+                continue
+            await self._store_call(self.store.complete_assessment, job_id, result, delivery_payload)
+            log.info("Assessment job %s done, queued for delivery", job_id)
+            self._outbox_ready.set()
+
+    async def _outbox_dispatcher(self):
+        while True:
+            claimed = await self._store_call(self.store.claim_due_delivery)
+            if claimed is None:
+                await self._wait(self._outbox_ready)
+                continue
+            outbox_id, job_id, payload, attempts = claimed
+            try:
+                response_data = await self.deliver(payload)
+            except asyncio.CancelledError:
+                await asyncio.to_thread(self.store.retry_delivery, outbox_id, "Dispatcher stopped", time.time())
+                raise
+            except Exception as e:
+                if attempts >= self.max_delivery_attempts:
+                    log.error("Giving up delivering result of job %s after %d attempts: %s", job_id, attempts, e)
+                    await self._store_call(self.store.dead_letter_delivery, outbox_id, job_id, str(e))
+                else:
+                    delay = self._backoff(attempts)
+                    metrics.retries.inc(operation="result_delivery")
+                    log.warning("Delivery of job %s failed (attempt %d), retrying in %.1fs: %s", job_id, attempts, delay, e)
+                    await self._store_call(self.store.retry_delivery, outbox_id, str(e), time.time() + delay)
+                continue
+            await self._store_call(self.store.mark_delivered, outbox_id, job_id, response_data)
+            log.info("Delivered interview result of job %s to the Node.js backend", job_id)
@@ -0,0 +1,141 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+import time
+
+import metrics
+
+
+# --- Structured, Non-blocking Logging ---
+# Request handlers only put records on a bounded in-memory queue; a listener
+# thread formats them and writes to stdout, so a slow terminal or log pipe
+# never adds latency to a turn. If the queue is full the record is dropped and
+# counted instead of blocking.
+# Records carry the current trace (trace id, route, session) from the metrics
+# module and optional structured fields:
+#     log.info("Transcribed answer", extra=fields(chars=len(text)))
+# Long strings (prompts, replies, upstream error bodies) are cut to
+# LOG_MAX_FIELD_CHARS, and DEBUG records can be sampled with
+# LOG_DEBUG_SAMPLE_RATE so DEBUG can stay on in busy deployments.
+
+def fields(**values):
+    return {"fields": values}
+
+
+def truncate(value, limit):
+    if isinstance(value, str) and limit and len(value) > limit:
+        return f"{value[:limit]}... [{len(value) - limit} more chars]"
+    return value
+
+
+class _ContextFilter(logging.Filter):
+    def filter(self, record):
+        trace = metrics.current_trace()
+        record.trace_id = trace.trace_id if trace else None
+        record.route = trace.route if trace else None
+        record.session_id = trace.session_id if trace else None
+        return True
+
+
+class _DebugSampler(logging.Filter):
+    def __init__(self, rate):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record):
+        return record.levelno > logging.DEBUG or self.rate >= 1 or random.random() < self.rate
+
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    def __init__(self, log_queue, max_field_chars):
+        super().__init__(log_queue)
+        self.max_field_chars = max_field_chars
+        self.dropped = 0
+
+    def prepare(self, record):
+        # Runs on the caller's thread: resolve and cut the message here, leave the formatting to the listener
+        record = logging.makeLogRecord(record.__dict__)
+        record.msg = truncate(record.getMessage(), self.max_field_chars)
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        if getattr(record, "fields", None):
+            record.fields = {key: truncate(value, self.max_field_chars) for key, value in record.fields.items()}
+        return record
+
+    def enqueue(self, record):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record):
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key in ("trace_id", "route", "session_id"):
+            if getattr(record, key, None):
+                entry[key] = getattr(record, key)
+        entry.update(getattr(record, "fields", None) or {})
+        if record.exc_text:
+            entry["exc"] = record.exc_text
+        return json.dumps(entry, default=str, ensure_ascii=False)
+
+    def formatTime(self, record, datefmt=None):
+        return time.strftime("%Y-%m-%dT%H:%M:%S", time.gmtime(record.created)) + f".{int(record.msecs):03d}Z"
+
+
+class TextFormatter(JsonFormatter):
+    # 2026-10-17T09:12:03.120Z INFO  main [trace=ab12 session=xyz] Transcribed answer chars=42
+    def format(self, record):
+        context = " ".join(f"{key.split('_')[0]}={getattr(record, key)}" for key in ("trace_id", "session_id") if getattr(record, key, None))
+        extra = " ".join(f"{key}={value}" for key, value in (getattr(record, "fields", None) or {}).items())
+        line = f"{self.formatTime(record)} {record.levelname:<5} {record.name}"
+        if context:
+            line += f" [{context}]"
+        line += f" {record.getMessage()}"
+        if extra:
+            line += f" {extra}"
+        if record.exc_text:
+            line += f"\n{record.exc_text}"
+        return line
+
+
+_listener = None
+
+
+def configure_logging(level="INFO", log_format="text", max_field_chars=500, debug_sample_rate=1.0, queue_size=10000):
+    """Route all logging through a bounded queue to a stdout writer thread. Safe to call once per process."""
+    global _listener
+    if _listener is not None:
+        return
+    writer = logging.StreamHandler(sys.stdout)
+    writer.setFormatter(JsonFormatter() if log_format == "json" else TextFormatter())
+    log_queue = queue.Queue(maxsize=queue_size)
+    handler = _NonBlockingQueueHandler(log_queue, max_field_chars)
+    handler.addFilter(_DebugSampler(debug_sample_rate))
+    handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(level.upper() if isinstance(level, str) else level)
+    # Chatty client libraries stay at WARNING unless asked for explicitly
+    for name in ("httpx", "httpcore", "hpack"):
+        logging.getLogger(name).setLevel(max(root.level, logging.WARNING))
+
+    _listener = logging.handlers.QueueListener(log_queue, writer, respect_handler_level=True)
+    _listener.start()
+    atexit.register(_listener.stop) # Flush what is still queued on shutdown
+    metrics.add_collector(lambda: metrics.snapshot_lines(
+        "interview_log_records_dropped_total", "counter", "Log records dropped because the log queue was full.", handler.dropped,
+    ))
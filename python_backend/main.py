@@ -1,14 +1,36 @@
-import speech_recognition as sr
-import requests
+import httpx
 import json
+import logging
 import os
 import time
 import asyncio
-from flask import Flask, render_template_string, send_file, request, jsonify, redirect, url_for
-from flask_cors import CORS # Import CORS
+import shutil
+import tempfile
+import re
+import secrets
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from quart import Quart, Response, render_template, render_template_string, request, websocket, jsonify, redirect, url_for
+from quart_cors import cors # Import CORS
 import io # Import io for handling in-memory audio
-from pydub import AudioSegment # Import pydub
 from dotenv import load_dotenv
+from session_store import create_session_store
+from audio_store import AudioRingBuffer
+from audio_decode import SilenceTrimmer
+from stt import create_speech_to_text
+from upload_streams import UploadStreams, UploadStreamError
+from session_channel import SessionChannel
+from reply_prefetch import ReplyPrefetches
+from interview_catalog import create_interview_catalog
+from tts_cache import TTSAudioCache, tts_cache_key
+from http_clients import UpstreamClients
+from admission import AdmissionControl, UpstreamGate, INTERACTIVE, BACKGROUND, set_priority
+from jobs import JobStore, AssessmentWorkers
+from precompressed import PrecompressedAsset, VersionedAssets
+import conversation
+import assessment
+import metrics
+from log_setup import configure_logging, fields
 
 load_dotenv(dotenv_path="./.env")
 
@@ -16,83 +38,267 @@ load_dotenv(dotenv_path="./.env")
 # --- Configuration ---
 MERF_AI_API_KEY = os.getenv("MERF_AI_API_KEY")
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
-AUDIO_FILE_PATH = "ai_response.wav"
-USER_AUDIO_FILE_PATH_RAW = "user_input_raw.webm" # Store raw incoming audio (often webm)
-USER_AUDIO_FILE_PATH_WAV = "user_input_processed.wav" # Path for WAV converted audio
+AUDIO_SPILL_THRESHOLD_BYTES = int(os.getenv("AUDIO_SPILL_THRESHOLD_BYTES", str(16 * 1024 * 1024))) # Larger uploads go to a unique temp file
 PORT = 5004 # Changed to 5004, ensure no conflict
 NODE_BACKEND_URL = os.getenv("NODE_BACKEND_URL")
 FRONTEND_URL = os.getenv("FRONTEND_URL", "http://localhost:5173/")
 HOST = os.getenv("PYTHON_BACKEND_HOST", "0.0.0.0")
+GEMINI_API_BASE_URL = os.getenv("GEMINI_API_BASE_URL", "https://generativelanguage.googleapis.com") # Overridden by the benchmark stubs
+GEMINI_MODEL = "gemini-2.0-flash"
+GEMINI_HISTORY_TOKEN_BUDGET = int(os.getenv("GEMINI_HISTORY_TOKEN_BUDGET", "4000")) # Transcript tokens sent with each turn
+GEMINI_COMPACTION_MIN_TURNS = int(os.getenv("GEMINI_COMPACTION_MIN_TURNS", "6")) # Summarize once this many turns fall out of the window
+GEMINI_CONTEXT_CACHING = os.getenv("GEMINI_CONTEXT_CACHING", "false").lower() == "true" # Register long preambles as Gemini cached content
+STREAM_MIN_SENTENCE_CHARS = 24 # Shorter sentences are merged with the next before TTS
+TURN_STREAMING = os.getenv("TURN_STREAMING", "true").lower() == "true" # Interview page uses /turn_stream (sentence-level audio)
+GEMINI_CONTEXT_CACHE_MIN_TOKENS = int(os.getenv("GEMINI_CONTEXT_CACHE_MIN_TOKENS", "4096")) # Gemini rejects caches below its model minimum
+MURF_API_BASE_URL = os.getenv("MURF_API_BASE_URL", "https://api.murf.ai")
+HTTP_POOL_MAXSIZE = int(os.getenv("HTTP_POOL_MAXSIZE", "20")) # Keep-alive connections kept per upstream
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "5"))
+HTTP_READ_TIMEOUT = float(os.getenv("HTTP_READ_TIMEOUT", "60"))
+GEMINI_MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "16")) # Gemini calls in flight (streams count until closed); 0 = no cap
+GEMINI_RATE_PER_SECOND = float(os.getenv("GEMINI_RATE_PER_SECOND", "0")) # Gemini calls started per second; 0 = no limit, set it to your quota
+MURF_MAX_CONCURRENCY = int(os.getenv("MURF_MAX_CONCURRENCY", "16")) # speech/generate calls in flight; audio downloads are not limited
+MURF_RATE_PER_SECOND = float(os.getenv("MURF_RATE_PER_SECOND", "0"))
+UPSTREAM_QUEUE_MAX = int(os.getenv("UPSTREAM_QUEUE_MAX", "256")) # Calls waiting per upstream; more are shed
+INTERACTIVE_QUEUE_DEADLINE_SECONDS = float(os.getenv("INTERACTIVE_QUEUE_DEADLINE_SECONDS", "5")) # Live turns fail fast rather than wait longer
+BACKGROUND_QUEUE_DEADLINE_SECONDS = float(os.getenv("BACKGROUND_QUEUE_DEADLINE_SECONDS", "300")) # Assessments, compaction, deliveries
+AUDIO_WORKERS = int(os.getenv("AUDIO_WORKERS", str(min(8, (os.cpu_count() or 1) + 2)))) # Threads for upload buffering and online recognition
+STT_ENGINE = os.getenv("STT_ENGINE", "google") # "google" (web API) or "vosk" (offline, needs VOSK_MODEL_PATH)
+VOSK_MODEL_PATH = os.getenv("VOSK_MODEL_PATH")
+STT_PROCESS_WORKERS = int(os.getenv("STT_PROCESS_WORKERS", str(os.cpu_count() or 1))) # Processes for decoding (and offline recognition)
+STT_MAX_CONCURRENCY = int(os.getenv("STT_MAX_CONCURRENCY", str(AUDIO_WORKERS))) # Transcriptions in flight; the rest wait in line
+VAD_ENABLED = os.getenv("VAD_ENABLED", "true").lower() == "true" # Trim silence between decoding and recognition
+VAD_THRESHOLD_DBFS = float(os.getenv("VAD_THRESHOLD_DBFS", "-45")) # Frames quieter than this count as silence
+VAD_MAX_PAUSE_MS = int(os.getenv("VAD_MAX_PAUSE_MS", "600")) # Longer pauses inside an answer are shortened to this
+VAD_PADDING_MS = 200 # Silence kept before the first and after the last voiced frame
+STREAM_UPLOADS = os.getenv("STREAM_UPLOADS", "true").lower() == "true" # Interview page uploads the answer while it is recorded
+STREAM_UPLOAD_TIMESLICE_MS = 1000 # MediaRecorder chunk length
+STREAM_PARTIAL_EVERY_CHUNKS = 3 # Run partial recognition after this many new chunks
+STREAM_UPLOAD_MAX_BYTES = int(os.getenv("STREAM_UPLOAD_MAX_BYTES", str(25 * 1024 * 1024)))
+STREAM_UPLOAD_IDLE_SECONDS = 600 # Abandoned streams are dropped after this
+SESSION_SOCKETS = os.getenv("SESSION_SOCKETS", "true").lower() == "true" # Interview page talks to /ws instead of per-step fetches
+GREETING_PREFETCH = os.getenv("GREETING_PREFETCH", "true").lower() == "true" # Generate the opening question and its audio at /select_interview
+GREETING_PREFETCH_TTL_SECONDS = int(os.getenv("GREETING_PREFETCH_TTL_SECONDS", "120")) # Unclaimed greetings are dropped after this
+GREETING_PROMPT = "Start the interview with a greeting and your first question based on the selected interview context."
+TTS_STREAMING = os.getenv("TTS_STREAMING", "true").lower() == "true" # Pipe Murf audio to the browser as it downloads
+TTS_STREAM_CHUNK_SIZE = 8192
+TTS_STREAM_WAIT_SECONDS = 60 # How long a second request waits for an in-flight stream to finish
+AUDIO_RING_MAX_ITEMS = int(os.getenv("AUDIO_RING_MAX_ITEMS", "256"))
+AUDIO_RING_MAX_BYTES = int(os.getenv("AUDIO_RING_MAX_BYTES", str(64 * 1024 * 1024)))
+TTS_CACHE_MEMORY_MAX_BYTES = int(os.getenv("TTS_CACHE_MEMORY_MAX_BYTES", str(32 * 1024 * 1024)))
+TTS_CACHE_DIR = os.getenv("TTS_CACHE_DIR", "tts_cache") # Set to an empty string to disable the disk tier
+TTS_CACHE_DISK_MAX_BYTES = int(os.getenv("TTS_CACHE_DISK_MAX_BYTES", str(512 * 1024 * 1024)))
+# Everything besides the text that changes Murf's output; all of it is part of the TTS cache key
+MURF_VOICE_SETTINGS = {
+    "voiceId": "en-US-natalie",
+    "format": "WAV",
+    "sampleRate": 44100,
+    "modelVersion": "GEN2"
+}
+JOBS_DB_PATH = os.getenv("JOBS_DB_PATH", "jobs.db") # Assessment jobs and the outbox for the Node.js backend
+ASSESSMENT_WORKERS = int(os.getenv("ASSESSMENT_WORKERS", "4"))
+ASSESSMENT_CHUNK_CHARS = int(os.getenv("ASSESSMENT_CHUNK_CHARS", "6000")) # Longer transcripts are assessed map-reduce style
+ASSESSMENT_MAX_PARALLEL = int(os.getenv("ASSESSMENT_MAX_PARALLEL", "4")) # Concurrent chunk calls per assessment
+OUTBOX_MAX_ATTEMPTS = int(os.getenv("OUTBOX_MAX_ATTEMPTS", "8")) # Delivery attempts before a result is dead-lettered
+SESSION_BACKEND = os.getenv("SESSION_BACKEND", "memory") # "memory" (per process) or "sqlite" (shared across workers)
+SESSION_DB_PATH = os.getenv("SESSION_DB_PATH", "sessions.db")
+SESSION_TTL_SECONDS = int(os.getenv("SESSION_TTL_SECONDS", "7200")) # Idle interviews expire after 2 hours
+SESSION_MAX = int(os.getenv("SESSION_MAX", "1000")) # Least recently used sessions are evicted beyond this
+CATALOG_BACKEND = os.getenv("CATALOG_BACKEND", "json") # "json", "sqlite" or "node" (the Node.js backend's interviews)
+CATALOG_PATH = os.getenv("CATALOG_PATH", os.path.join(os.path.dirname(os.path.abspath(__file__)), "interviews.json")) # JSON file or SQLite database
+CATALOG_NODE_URL = os.getenv("CATALOG_NODE_URL") # e.g. http://localhost:5000/api/interviews/public
+CATALOG_NODE_TOKEN = os.getenv("CATALOG_NODE_TOKEN") # Bearer token; the Node.js interview routes require one
+CATALOG_TTL_SECONDS = int(os.getenv("CATALOG_TTL_SECONDS", "300")) # Reload the catalog in the background after this
+CATALOG_PAGE_SIZE = int(os.getenv("CATALOG_PAGE_SIZE", "24")) # Interview cards per index page
+INDEX_PAGE_CACHE_MAX = 64 # Rendered index pages kept per catalog version and filter
+TRACE_HEADERS = os.getenv("TRACE_HEADERS", "true").lower() == "true" # X-Trace-Id and Server-Timing on every response
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO") # DEBUG adds prompts, replies and payloads (truncated)
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text") # "text" or "json" (one object per line)
+LOG_MAX_FIELD_CHARS = int(os.getenv("LOG_MAX_FIELD_CHARS", "500")) # Longer messages and fields are cut
+LOG_DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "1.0")) # Fraction of DEBUG records kept
+
+log = logging.getLogger(__name__)
+
+app = Quart(__name__)
+app = cors(app, allow_origin="*", expose_headers=["X-Trace-Id", "Server-Timing"]) # Enable CORS for the app!
+
+# Per-process admission gates for the quota'd upstreams; live turns go first
+upstream_admission = AdmissionControl(
+    [
+        UpstreamGate("gemini", GEMINI_MAX_CONCURRENCY, GEMINI_RATE_PER_SECOND, max_queue=UPSTREAM_QUEUE_MAX),
+        UpstreamGate("murf", MURF_MAX_CONCURRENCY, MURF_RATE_PER_SECOND, max_queue=UPSTREAM_QUEUE_MAX),
+    ],
+    deadlines={INTERACTIVE: INTERACTIVE_QUEUE_DEADLINE_SECONDS, BACKGROUND: BACKGROUND_QUEUE_DEADLINE_SECONDS},
+)
+
+# Keep-alive connection pools, one per upstream. Murf's audio files live on a
+# separate storage host, so that pool has nothing to warm up.
+upstream_clients = UpstreamClients(
+    {
+        "gemini": GEMINI_API_BASE_URL,
+        "murf": MURF_API_BASE_URL,
+        "murf_audio": None,
+        "node": NODE_BACKEND_URL,
+    },
+    pool_maxsize=HTTP_POOL_MAXSIZE,
+    timeout=(HTTP_CONNECT_TIMEOUT, HTTP_READ_TIMEOUT),
+    admission=upstream_admission,
+)
+
+# Bounded pool for blocking audio I/O (upload buffering, recognize_google) so it never runs on the event loop
+audio_executor = ThreadPoolExecutor(max_workers=AUDIO_WORKERS, thread_name_prefix="audio")
+
+async def run_audio_task(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(audio_executor, func, *args)
+
+# --- Services ---
+# Anything that touches the disk, a database or a thread of its own is built by
+# start_services() when the app starts serving, never at import: the STT pool's
+# spawned workers re-import the __main__ module (this file under
+# `python main.py`) and must not start a log listener, open sessions.db and
+# jobs.db, scan the TTS cache or load the catalog of their own.
+speech_to_text = None # Decoding and offline recognition run in warm worker processes
+# Interview context and transcript live in a per-session store keyed by the
+# session id issued at /select_interview, so concurrent interviews stay isolated.
+session_store = None
+tts_cache = None # Previously synthesized audio, keyed by text + Murf voice settings
+page_assets = None # Interview page CSS/JS under content-hashed URLs
+assessment_workers = None
+interview_catalog = None
+
+def create_services():
+    global speech_to_text, session_store, tts_cache, page_assets, assessment_workers, interview_catalog
+    if speech_to_text is not None:
+        return # Already built, e.g. by the __main__ block
+    configure_logging(LOG_LEVEL, LOG_FORMAT, LOG_MAX_FIELD_CHARS, LOG_DEBUG_SAMPLE_RATE)
+    if not MERF_AI_API_KEY:
+        log.warning("MERF_AI_API_KEY is not set in environment variables.")
+    if not GEMINI_API_KEY:
+        log.warning("GEMINI_API_KEY is not set in environment variables.")
+    if not NODE_BACKEND_URL:
+        log.warning("NODE_BACKEND_URL is not set in environment variables.")
+    speech_to_text = create_speech_to_text(
+        STT_ENGINE, STT_PROCESS_WORKERS, STT_MAX_CONCURRENCY, audio_executor, VOSK_MODEL_PATH,
+        trimmer=SilenceTrimmer(VAD_THRESHOLD_DBFS, VAD_MAX_PAUSE_MS, VAD_PADDING_MS) if VAD_ENABLED else None,
+    )
+    session_store = create_session_store(SESSION_BACKEND, SESSION_TTL_SECONDS, SESSION_MAX, SESSION_DB_PATH)
+    tts_cache = TTSAudioCache(TTS_CACHE_MEMORY_MAX_BYTES, TTS_CACHE_DIR, TTS_CACHE_DISK_MAX_BYTES)
+    page_assets = VersionedAssets(os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets"), "/assets")
+    assessment_workers = AssessmentWorkers(
+        JobStore(JOBS_DB_PATH),
+        run_interview_assessment,
+        deliver_interview_result,
+        workers=ASSESSMENT_WORKERS,
+        max_delivery_attempts=OUTBOX_MAX_ATTEMPTS,
+    )
+    # Loaded at startup and reloaded in the background every CATALOG_TTL_SECONDS;
+    # see interview_catalog.py for the sources and indexes.
+    interview_catalog = create_interview_catalog(
+        CATALOG_BACKEND, CATALOG_TTL_SECONDS, CATALOG_PATH,
+        upstream_clients=upstream_clients, node_url=CATALOG_NODE_URL, node_token=CATALOG_NODE_TOKEN,
+    )
+
+@app.before_serving
+async def start_services():
+    create_services()
+    await upstream_clients.start()
+    app.add_background_task(upstream_clients.warm_up)
+    app.add_background_task(speech_to_text.warm_up)
+    await assessment_workers.start()
+    await interview_catalog.refresh()
+
+@app.after_serving
+async def stop_services():
+    await assessment_workers.stop()
+    await upstream_clients.aclose()
+    speech_to_text.shutdown()
+    audio_executor.shutdown(wait=False)
+
+# Synthesized replies, addressed by per-turn audio ids (this process only)
+audio_ring = AudioRingBuffer(AUDIO_RING_MAX_ITEMS, AUDIO_RING_MAX_BYTES)
+# Answers being uploaded while they are recorded, per session (this process only)
+upload_streams = UploadStreams(STREAM_UPLOAD_MAX_BYTES, STREAM_UPLOAD_IDLE_SECONDS)
+# Opening questions generated while the interview page loads (this process only)
+reply_prefetches = ReplyPrefetches(GREETING_PREFETCH_TTL_SECONDS, lambda session_id, text: app.add_background_task(session_store.append_transcript, session_id, 'ai', text))
+
+async def get_request_session_id():
+    # The interview page sends X-Session-Id on fetches; plain GETs (page load, <audio>) use ?sessionId=
+    session_id = request.headers.get('X-Session-Id') or request.args.get('sessionId')
+    if not session_id and request.is_json:
+        session_id = ((await request.get_json(silent=True)) or {}).get('session_id')
+    if not session_id and request.method == 'POST':
+        session_id = (await request.form).get('session_id')
+    trace = metrics.current_trace()
+    if trace is not None and session_id:
+        trace.session_id = session_id
+    return session_id
+
+# --- Request tracing ---
+# Every request gets a trace (the client's X-Trace-Id if it sent one). Stage
+# spans recorded while handling it are returned as Server-Timing, so browser
+# devtools show them next to the client-side timings, and logged in one line.
+@app.before_request
+async def start_request_trace():
+    metrics.start_trace(
+        request.url_rule.rule if request.url_rule else "unmatched",
+        request.headers.get('X-Session-Id') or request.args.get('sessionId'),
+        request.headers.get('X-Trace-Id'),
+    )
+
+@app.after_request
+async def finish_request_trace(response):
+    trace = metrics.current_trace()
+    if trace is None:
+        return response
+    metrics.http_request_seconds.observe(time.perf_counter() - trace.started, route=trace.route, method=request.method, status=response.status_code)
+    if TRACE_HEADERS:
+        response.headers["X-Trace-Id"] = trace.trace_id
+        if trace.spans:
+            # Streamed responses only carry the stages finished before the body started
+            response.headers["Server-Timing"] = trace.server_timing()
+    if trace.spans:
+        log.info("Stage timings", extra=fields(stages=trace.summary()))
+    return response
+
+@app.before_websocket
+async def start_websocket_trace():
+    metrics.start_trace("/ws", websocket.args.get('sessionId'), websocket.headers.get('X-Trace-Id'))
+
+def session_not_found_response():
+    return jsonify({"error": "session_not_found", "message": "Unknown or expired interview session. Please select an interview again."}), 404
 
-if not MERF_AI_API_KEY:
-    print("[WARNING] MERF_AI_API_KEY is not set in environment variables.")
-if not GEMINI_API_KEY:
-    print("[WARNING] GEMINI_API_KEY is not set in environment variables.")
-if not NODE_BACKEND_URL:
-    print("[WARNING] NODE_BACKEND_URL is not set in environment variables.")
-
-app = Flask(__name__)
-CORS(app) # Enable CORS for your Flask app!
-
-# Global variable to store current interview details
-current_interview_context = {}
-# Global variable to store the full interview transcript
-interview_transcript = []
-# USER_ID global variable is now removed and will be passed dynamically
-
-# --- Speech-to-Text (STT) Function - Adapted to read from file and handle conversion ---
-def transcribe_audio_file(audio_file_path):
-    r = sr.Recognizer()
-    
-    # Try to load the audio directly first (if it's already a valid WAV/etc.)
-    # If it's not, we'll try to convert it.
+# --- Large Language Model (LLM) Function ---
+def gemini_url(method, api_key):
+    return f"{GEMINI_API_BASE_URL}/v1beta/models/{GEMINI_MODEL}:{method}?key={api_key}"
+
+def extract_gemini_text(result):
+    if result.get("candidates") and result["candidates"][0].get("content") and \
+       result["candidates"][0]["content"].get("parts") and \
+       result["candidates"][0]["content"]["parts"][0].get("text"):
+        return result["candidates"][0]["content"]["parts"][0]["text"]
+    return None
+
+async def gemini_generate_text(payload):
+    # Plain generateContent call for internal jobs; returns the reply text or None
     try:
-        with sr.AudioFile(audio_file_path) as source:
-            print(f"Transcribing audio file: {audio_file_path} (direct attempt)")
-            audio = r.record(source) # Read the entire audio file
-            text = r.recognize_google(audio)
-            print(f"You said: {text}")
-            return text
-    except ValueError as e:
-        print(f"Direct transcription failed ({e}). Attempting conversion to WAV...")
-        try:
-            # Load the potentially problematic audio file
-            # pydub can automatically detect format based on content
-            audio_segment = AudioSegment.from_file(audio_file_path)
-            
-            # Export to a WAV file that speech_recognition expects (PCM 16-bit, 44.1kHz typically)
-            audio_segment.export(USER_AUDIO_FILE_PATH_WAV, format="wav")
-            
-            print(f"Successfully converted {audio_file_path} to {USER_AUDIO_FILE_PATH_WAV}")
-            
-            # Now transcribe the converted WAV file
-            with sr.AudioFile(USER_AUDIO_FILE_PATH_WAV) as source:
-                print(f"Transcribing audio file: {USER_AUDIO_FILE_PATH_WAV} (after conversion)")
-                audio = r.record(source)
-                text = r.recognize_google(audio)
-                print(f"You said: {text}")
-                return text
-        except Exception as e_convert:
-            print(f"Error during audio conversion or re-transcription: {e_convert}")
-            return None
-    except Exception as e:
-        print(f"An unexpected error occurred during transcription: {e}")
+        response = await upstream_clients.post("gemini", gemini_url("generateContent", GEMINI_API_KEY), json=payload)
+        response.raise_for_status()
+        return extract_gemini_text(response.json())
+    except (httpx.HTTPError, json.JSONDecodeError) as e:
+        log.error("Gemini request failed: %s", e)
         return None
 
-# --- Large Language Model (LLM) Function ---
-async def get_gemini_response(prompt_text):
-    print("Getting response from AI...")
-
-    context_prompt = ""
-    if current_interview_context:
-        context_prompt += f"You are an AI interviewer conducting an interview. "
-        context_prompt += f"The interview is for a '{current_interview_context.get('job_role', 'general')}' position. "
-        context_prompt += f"The interview type is '{current_interview_context.get('interview_type', 'general')}' "
-        context_prompt += f"with a difficulty level of '{current_interview_context.get('difficulty', 'medium')}'. "
+def build_interview_system_prompt(interview_context):
+    # Compiled once per interview at /select_interview and sent as Gemini's system_instruction
+    context_prompt = "You are an AI interviewer conducting an interview. "
+    if interview_context:
+        context_prompt += f"The interview is for a '{interview_context.get('job_role') or 'general'}' position. "
+        context_prompt += f"The interview type is '{interview_context.get('interview_type') or 'general'}' "
+        context_prompt += f"with a difficulty level of '{interview_context.get('difficulty') or 'medium'}'. "
         
         # Safely handle key_skills, which might be a list or a JSON string from the form
-        if current_interview_context.get('key_skills'):
-            skills = current_interview_context['key_skills']
+        if interview_context.get('key_skills'):
+            skills = interview_context['key_skills']
             if isinstance(skills, str):
                 try:
                     skills = json.loads(skills) # Try to parse if it's a JSON string
@@ -102,216 +308,432 @@ async def get_gemini_response(prompt_text):
             if isinstance(skills, list) and skills:
                 context_prompt += f"Key skills to focus on are: {', '.join(skills)}. "
         
-        context_prompt += f"The interview title is: '{current_interview_context.get('interview_title', 'Untitled Interview')}'. "
-        context_prompt += f"Here is a description: '{current_interview_context.get('description', 'No specific description provided.')}'. "
+        context_prompt += f"The interview title is: '{interview_context.get('interview_title') or 'Untitled Interview'}'. "
+        context_prompt += f"Here is a description: '{interview_context.get('description') or 'No specific description provided.'}'. "
         context_prompt += "Your questions should be relevant to these details. "
+    return context_prompt
 
-    full_prompt = context_prompt + "\nUser says: " + prompt_text
-    print(f"Full prompt sent to Gemini:\n---\n{full_prompt}\n---")
-
-    chat_history = []
-    chat_history.append({"role": "user", "parts": [{"text": full_prompt}]})
+async def get_gemini_response(prompt_text, system_prompt, history_contents=None, cached_content=None):
+    # Earlier turns (and the running summary) go first so the model remembers the conversation
+    chat_history = conversation.finalize_contents(history_contents or [], prompt_text)
+    log.debug("Prompt sent to Gemini", extra=fields(prompt=prompt_text, turns=len(chat_history), cached=bool(cached_content)))
 
     payload = {"contents": chat_history}
+    if cached_content:
+        # The interviewer preamble is already stored server-side; reference it instead of resending it
+        payload["cachedContent"] = cached_content
+    else:
+        payload["systemInstruction"] = {"parts": [{"text": system_prompt}]}
     apiKey = GEMINI_API_KEY
-    apiUrl = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={apiKey}"
+    apiUrl = gemini_url("generateContent", apiKey)
 
     try:
-        response = await asyncio.to_thread(
-            requests.post,
-            apiUrl,
-            headers={'Content-Type': 'application/json'},
-            data=json.dumps(payload)
-        )
+        with metrics.span("gemini"):
+            response = await upstream_clients.post("gemini", apiUrl, json=payload)
         response.raise_for_status()
         result = response.json()
 
-        if result.get("candidates") and result["candidates"][0].get("content") and \
-           result["candidates"][0]["content"].get("parts") and \
-           result["candidates"][0]["content"]["parts"][0].get("text"):
-            ai_response = result["candidates"][0]["content"]["parts"][0]["text"]
-            print(f"AI says: {ai_response}")
+        ai_response = extract_gemini_text(result)
+        if ai_response:
+            log.debug("Gemini reply", extra=fields(reply=ai_response))
             return ai_response
         else:
-            print("AI response structure is unexpected or content is missing.")
-            print(f"Full Gemini response (unexpected structure): {result}")
+            log.error("Gemini response structure is unexpected or content is missing", extra=fields(response=json.dumps(result)))
             return "I'm sorry, I couldn't generate a response."
-    except requests.exceptions.RequestException as e:
-        print(f"Error communicating with Gemini API: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-            print(f"Gemini API error response text: {e.response.text}")
-        print("Please ensure your Gemini API key is correct and linked to a project with billing enabled.")
+    except httpx.HTTPStatusError as e:
+        if cached_content and e.response.status_code in (400, 403, 404):
+            # Cached content expired or was deleted; answer this turn with the inline system instruction
+            log.warning("Gemini rejected cached content %s, retrying without it", cached_content)
+            metrics.retries.inc(operation="gemini_cached_content")
+            return await get_gemini_response(prompt_text, system_prompt, history_contents)
+        # Usually a wrong API key or a project without billing enabled
+        log.error("Gemini API returned HTTP %s", e.response.status_code, extra=fields(body=e.response.text))
+        return "I'm sorry, I'm having trouble connecting to the AI."
+    except httpx.HTTPError as e:
+        log.error("Error communicating with Gemini API: %s", e)
         return "I'm sorry, I'm having trouble connecting to the AI."
     except json.JSONDecodeError:
-        print("Error decoding JSON response from Gemini API.")
-        if 'response' in locals():
-            print(f"Raw Gemini response (if available): {response.text}")
+        log.error("Error decoding JSON response from Gemini API", extra=fields(body=response.text))
         return "I'm sorry, I received an unreadable response from the AI."
 
+async def stream_gemini_response(prompt_text, system_prompt, history_contents=None, cached_content=None):
+    # Async generator over the reply text as Gemini produces it (streamGenerateContent, SSE)
+    payload = {"contents": conversation.finalize_contents(history_contents or [], prompt_text)}
+    log.debug("Prompt streamed to Gemini", extra=fields(prompt=prompt_text, turns=len(payload["contents"]), cached=bool(cached_content)))
+    if cached_content:
+        payload["cachedContent"] = cached_content
+    else:
+        payload["systemInstruction"] = {"parts": [{"text": system_prompt}]}
+    apiUrl = gemini_url("streamGenerateContent", GEMINI_API_KEY) + "&alt=sse"
+
+    started = time.perf_counter()
+    first_token = True
+    async with upstream_clients.stream("gemini", "POST", apiUrl, json=payload) as response:
+        if response.status_code >= 400:
+            await response.aread()
+            if cached_content and response.status_code in (400, 403, 404):
+                log.warning("Gemini rejected cached content %s, retrying without it", cached_content)
+                metrics.retries.inc(operation="gemini_cached_content")
+                async for text in stream_gemini_response(prompt_text, system_prompt, history_contents):
+                    yield text
+                return
+            log.error("Gemini API returned HTTP %s", response.status_code, extra=fields(body=response.text))
+            response.raise_for_status()
+        try:
+            async for line in response.aiter_lines():
+                if not line.startswith("data:"):
+                    continue
+                try:
+                    text = extract_gemini_text(json.loads(line[len("data:"):]))
+                except json.JSONDecodeError:
+                    log.warning("Skipping unreadable Gemini stream event", extra=fields(event=line))
+                    continue
+                if text:
+                    if first_token:
+                        first_token = False
+                        metrics.record_stage("gemini_first_token", time.perf_counter() - started)
+                    yield text
+        finally:
+            metrics.record_stage("gemini_stream", time.perf_counter() - started)
+
+class SentenceBuffer:
+    # Collects streamed text and hands back complete sentences. Very short
+    # sentences are held back and joined with the next so TTS calls stay worthwhile.
+    SENTENCE_END = re.compile(r'[.!?]+["\')\]]*\s+')
+
+    def __init__(self, min_chars=STREAM_MIN_SENTENCE_CHARS):
+        self.min_chars = min_chars
+        self.buffer = ""
+
+    def feed(self, text):
+        self.buffer += text
+        sentences = []
+        start = 0
+        for match in self.SENTENCE_END.finditer(self.buffer):
+            candidate = self.buffer[start:match.end()].strip()
+            if len(candidate) >= self.min_chars:
+                sentences.append(candidate)
+                start = match.end()
+        self.buffer = self.buffer[start:]
+        return sentences
+
+    def flush(self):
+        rest, self.buffer = self.buffer.strip(), ""
+        return [rest] if rest else []
+
+# --- Conversation memory ---
+# Sessions whose summary is being rebuilt right now (per process)
+compactions_in_flight = set()
+
+def plan_interview_reply(session_id, session, prompt_text):
+    # Returns (system_prompt, history_contents, cached_content) for the next Gemini call
+    history = conversation.build_history(session, prompt_text, GEMINI_HISTORY_TOKEN_BUDGET, GEMINI_COMPACTION_MIN_TURNS)
+    system_prompt = session.get("system_prompt") or build_interview_system_prompt(session["context"])
+    cached_content = None
+    if session.get("cached_content"):
+        if session.get("cached_content_expires_at", 0) > time.time() + 60:
+            cached_content = session["cached_content"]
+        metrics.cache_requests.inc(cache="gemini_context", result="hit" if cached_content else "miss")
+    if history.compact_upto is not None and session_id not in compactions_in_flight:
+        # Fold the turns that fell out of the window into the summary in the background
+        compactions_in_flight.add(session_id)
+        app.add_background_task(compact_conversation, session_id, history.compact_upto)
+    return system_prompt, history.contents, cached_content
+
+async def get_interview_reply(session_id, session, prompt_text):
+    return await get_gemini_response(prompt_text, *plan_interview_reply(session_id, session, prompt_text))
+
+async def compact_conversation(session_id, compact_upto):
+    set_priority(BACKGROUND)
+    try:
+        session = await session_store.get(session_id)
+        if session is None:
+            return
+        summarized_upto = session.get("summarized_upto", 0)
+        if compact_upto <= summarized_upto:
+            return
+        prompt = conversation.summary_prompt(session.get("summary"), session["transcript"][summarized_upto:compact_upto])
+        summary = await gemini_generate_text({"contents": [{"role": "user", "parts": [{"text": prompt}]}]})
+        if not summary:
+            return
+        def store_summary(state):
+            # Skip if another worker already moved the summary on
+            if state is not None and state.get("summarized_upto", 0) == summarized_upto:
+                state["summary"] = summary.strip()
+                state["summarized_upto"] = compact_upto
+        await session_store.update(session_id, store_summary)
+        log.info("Compacted conversation up to turn %d", compact_upto)
+    finally:
+        compactions_in_flight.discard(session_id)
+
+# --- Gemini context caching ---
+# Long interviewer preambles (big descriptions/rubrics) are registered once as
+# Gemini cached content and referenced by name on every turn.
+async def register_context_cache(session_id, system_prompt):
+    set_priority(BACKGROUND)
+    payload = {
+        "model": f"models/{GEMINI_MODEL}",
+        "systemInstruction": {"parts": [{"text": system_prompt}]},
+        "ttl": f"{SESSION_TTL_SECONDS}s",
+    }
+    try:
+        response = await upstream_clients.post("gemini", f"{GEMINI_API_BASE_URL}/v1beta/cachedContents?key={GEMINI_API_KEY}", json=payload)
+        response.raise_for_status()
+        cached_content = response.json().get("name")
+    except (httpx.HTTPError, json.JSONDecodeError) as e:
+        log.warning("Could not register Gemini cached content, using inline system instruction: %s", e)
+        return
+    if not cached_content:
+        return
+    def store_cached_content(state):
+        if state is None:
+            return False
+        state["cached_content"] = cached_content
+        state["cached_content_expires_at"] = time.time() + SESSION_TTL_SECONDS
+        return True
+    if not await session_store.update(session_id, store_cached_content):
+        # Interview already ended; don't leave the cache around until its TTL runs out
+        await delete_context_cache(cached_content)
+        return
+    log.info("Registered Gemini cached content %s", cached_content)
+
+async def delete_context_cache(cached_content):
+    set_priority(BACKGROUND)
+    try:
+        response = await upstream_clients.request("gemini", "DELETE", f"{GEMINI_API_BASE_URL}/v1beta/{cached_content}?key={GEMINI_API_KEY}")
+        response.raise_for_status()
+    except httpx.HTTPError as e:
+        log.warning("Could not delete Gemini cached content %s: %s", cached_content, e)
+
 # --- Text-to-Speech (TTS) Function using Murf.ai ---
-def synthesize_merf_ai(text_to_synthesize, murf_api_key):
+def murf_api_key_is_valid(murf_api_key):
     if not murf_api_key or murf_api_key.startswith("AIza"):
-        print("❌ Invalid Murf.ai API key. Please get your API key from your Murf.ai dashboard.")
+        log.error("Invalid Murf.ai API key. Please get your API key from your Murf.ai dashboard.")
+        return False
+    return True
+
+async def request_murf_audio_url(text_to_synthesize, murf_api_key):
+    # Ask Murf to generate the speech; returns the URL of the rendered audio file
+    if not murf_api_key_is_valid(murf_api_key):
         return None
 
-    url = "https://api.murf.ai/v1/speech/generate"
+    url = f"{MURF_API_BASE_URL}/v1/speech/generate"
     headers = {
         "Content-Type": "application/json",
         "api-key": murf_api_key
     }
 
-    payload = {
-        "text": text_to_synthesize,
-        "voiceId": "en-US-natalie",
-        "format": "WAV",
-        "sampleRate": 44100,
-        "modelVersion": "GEN2"
-    }
+    payload = {"text": text_to_synthesize, **MURF_VOICE_SETTINGS}
 
-    print("Synthesizing speech with Murf.ai...")
+    log.debug("Synthesizing speech with Murf.ai", extra=fields(chars=len(text_to_synthesize)))
 
     try:
-        response = requests.post(url, headers=headers, json=payload)
+        with metrics.span("murf_generate"):
+            response = await upstream_clients.post("murf", url, headers=headers, json=payload)
         response.raise_for_status()
         response_data = response.json()
         audio_file_url = response_data.get("audioFile")
 
         if audio_file_url:
-            print(f"✅ Audio file URL: {audio_file_url}")
-            print("Downloading audio...")
-
-            audio_response = requests.get(audio_file_url, stream=True)
-            audio_response.raise_for_status()
-
-            with open(AUDIO_FILE_PATH, "wb") as f:
-                for chunk in audio_response.iter_content(chunk_size=8192):
-                    f.write(chunk)
-
-            print(f"✅ Audio saved to {AUDIO_FILE_PATH}")
-            return AUDIO_FILE_PATH
+            log.debug("Murf audio file URL: %s", audio_file_url)
+            return audio_file_url
         else:
-            print("❌ No audio URL in Murf.ai response.")
-            print(f"Response data: {response_data}")
+            log.error("No audio URL in Murf.ai response", extra=fields(response=json.dumps(response_data)))
             return None
 
-    except requests.exceptions.RequestException as e:
-        print(f"❌ Error calling Murf.ai: {e}")
-        if hasattr(e, 'response') and e.response is not None:
-            print(f"Murf.ai error response: {e.response.text}")
+    except httpx.HTTPStatusError as e:
+        log.error("Murf.ai returned HTTP %s", e.response.status_code, extra=fields(body=e.response.text))
+        return None
+    except httpx.HTTPError as e:
+        log.error("Error calling Murf.ai: %s", e)
         return None
     except json.JSONDecodeError:
-        print("❌ Failed to decode Murf.ai JSON response.")
-        if 'response' in locals():
-            print(f"Raw response: {response.text}")
+        log.error("Failed to decode Murf.ai JSON response", extra=fields(body=response.text))
         return None
 
-# --- Mock Interview Data ---
-mock_interviews = [
-    {
-        "_id": '1',
-        "interview_title": 'Frontend Developer Interview',
-        "interview_type": 'Technical',
-        "job_role": 'Junior Frontend Developer',
-        "difficulty": 'Medium',
-        "key_skills": ['React', 'JavaScript', 'HTML', 'CSS'],
-        "duration": '45 mins',
-        "description": 'Assess basic React concepts and fundamental web technologies.',
-    },
-    {
-        "_id": '2',
-        "interview_title": 'Backend Engineer Interview',
-        "interview_type": 'Technical',
-        "job_role": 'Senior Backend Engineer',
-        "difficulty": 'Hard',
-        "key_skills": ['Python', 'Django', 'APIs', 'Databases'],
-        "duration": '60 mins',
-        "description": 'Deep dive into scalable backend architectures and system design.',
-    },
-    {
-        "_id": '3',
-        "interview_title": 'Product Manager Interview',
-        "interview_type": 'Behavioral',
-        "job_role": 'Product Manager',
-        "difficulty": 'Medium',
-        "key_skills": ['Strategy', 'Communication', 'Roadmapping'],
-        "duration": '30 mins',
-        "description": 'Focus on product sense and leadership qualities.',
-    },
-      {
-        "_id": '4',
-        "interview_title": 'Data Scientist Interview',
-        "interview_type": 'Technical',
-        "job_role": 'Data Scientist',
-        "difficulty": 'Hard',
-        "key_skills": ['Python', 'Machine Learning', 'Statistics', 'SQL'],
-        "duration": '60 mins',
-        "description": 'Evaluate knowledge of data analysis, modeling, and interpretation.',
-    },
-    {
-        "_id": '5',
-        "interview_title": 'UX Designer Interview',
-        "interview_type": 'Portfolio Review',
-        "job_role": 'UX Designer',
-        "difficulty": 'Medium',
-        "key_skills": ['Figma', 'User Research', 'Prototyping', 'Usability Testing'],
-        "duration": '40 mins',
-        "description": 'Review portfolio and discuss design process and user-centered design principles.',
-    },
-]
+async def iter_murf_audio(audio_file_url):
+    # Yields the rendered audio as it arrives from Murf's file URL
+    with metrics.span("murf_download"):
+        async with upstream_clients.stream("murf_audio", "GET", audio_file_url) as audio_response:
+            audio_response.raise_for_status()
+            async for chunk in audio_response.aiter_bytes(chunk_size=TTS_STREAM_CHUNK_SIZE):
+                yield chunk
 
+async def synthesize_merf_ai(text_to_synthesize, murf_api_key):
+    # Buffered mode: download the whole file and return its bytes
+    audio_file_url = await request_murf_audio_url(text_to_synthesize, murf_api_key)
+    if not audio_file_url:
+        return None
+    try:
+        audio_bytes = b"".join([chunk async for chunk in iter_murf_audio(audio_file_url)])
+    except httpx.HTTPError as e:
+        log.error("Error downloading Murf.ai audio: %s", e)
+        return None
+    log.debug("Downloaded Murf audio", extra=fields(bytes=len(audio_bytes)))
+    return audio_bytes
+
+async def prepare_tts_audio(text_to_synthesize, prefetch=False):
+    # Returns the /audio URL for a reply, or None if synthesis cannot happen
+    audio_id = await prepare_tts_audio_id(text_to_synthesize, prefetch)
+    return f"/audio/{audio_id}" if audio_id else None
+
+async def prepare_tts_audio_id(text_to_synthesize, prefetch=False):
+    # Returns the audio ring id for a reply, or None if synthesis cannot happen.
+    # Cache hits never touch Murf. On a miss, streaming mode only reserves an id
+    # and the browser's GET pipes Murf's bytes through; prefetch additionally
+    # starts synthesis right away so the audio is ready by the time it's played.
+    cached_audio = await tts_cache.get(tts_cache_key(text_to_synthesize, MURF_VOICE_SETTINGS))
+    metrics.cache_requests.inc(cache="tts", result="hit" if cached_audio else "miss")
+    if cached_audio:
+        log.debug("TTS cache hit")
+        audio_id = audio_ring.put(cached_audio)
+    elif TTS_STREAMING or prefetch:
+        if not murf_api_key_is_valid(MERF_AI_API_KEY):
+            return None
+        audio_id = audio_ring.reserve(text_to_synthesize)
+        if prefetch:
+            app.add_background_task(synthesize_into_ring, audio_id)
+    else:
+        audio_bytes = await synthesize_merf_ai(text_to_synthesize, MERF_AI_API_KEY)
+        if not audio_bytes:
+            return None
+        tts_cache.put(tts_cache_key(text_to_synthesize, MURF_VOICE_SETTINGS), audio_bytes)
+        audio_id = audio_ring.put(audio_bytes)
+    return audio_id
+
+async def synthesize_into_ring(audio_id):
+    # Background synthesis of a reserved entry; a GET arriving meanwhile waits for it
+    entry = audio_ring.claim(audio_id)
+    if entry is None:
+        return
+    try:
+        audio_bytes = await synthesize_merf_ai(entry.text, MERF_AI_API_KEY)
+    except BaseException:
+        # Cancelled (e.g. at shutdown): release the waiters instead of leaving the entry claimed
+        audio_ring.fail(entry)
+        raise
+    if not audio_bytes:
+        audio_ring.fail(entry)
+        return
+    audio_ring.complete(audio_id, entry, audio_bytes)
+    tts_cache.put(tts_cache_key(entry.text, MURF_VOICE_SETTINGS), audio_bytes)
+
+async def stream_tts_audio(audio_id, entry):
+    # Pipe Murf's audio to the client chunk by chunk, keeping a copy for replays
+    try:
+        audio_file_url = await request_murf_audio_url(entry.text, MERF_AI_API_KEY)
+    except BaseException:
+        # The client went away (or the request was cancelled) before streaming began
+        audio_ring.fail(entry)
+        raise
+    if not audio_file_url:
+        audio_ring.fail(entry)
+        return None
 
-# --- Flask Routes ---
+    async def generate():
+        chunks = []
+        completed = False
+        try:
+            async for chunk in iter_murf_audio(audio_file_url):
+                chunks.append(chunk)
+                yield chunk
+            completed = True
+        except httpx.HTTPError as e:
+            log.error("Error streaming Murf.ai audio: %s", e)
+        finally:
+            # Also runs when the client disconnects mid-stream
+            if completed:
+                audio_bytes = b"".join(chunks)
+                audio_ring.complete(audio_id, entry, audio_bytes)
+                tts_cache.put(tts_cache_key(entry.text, MURF_VOICE_SETTINGS), audio_bytes)
+                log.debug("Streamed Murf audio", extra=fields(audio_id=audio_id, bytes=len(audio_bytes)))
+            else:
+                audio_ring.fail(entry)
+
+    return Response(generate(), mimetype=entry.mimetype, headers={"Cache-Control": "no-store"})
+
+# --- Interview assessment jobs ---
+async def gemini_generate_json(prompt, schema):
+    # Structured JSON call for the assessment engine; HTTP errors propagate so the job is retried
+    payload = {
+        "contents": [{"role": "user", "parts": [{"text": prompt}]}],
+        "generationConfig": {
+            "responseMimeType": "application/json",
+            "responseSchema": schema
+        }
+    }
+    response = await upstream_clients.post("gemini", gemini_url("generateContent", GEMINI_API_KEY), json=payload)
+    response.raise_for_status()
+    text = extract_gemini_text(response.json())
+    if not text:
+        raise ValueError("AI assessment response structure is unexpected or content is missing")
+    return json.loads(text) # json.JSONDecodeError is a ValueError
+
+async def run_interview_assessment(job):
+    # Job worker: Gemini scores the transcript; returns (assessment, payload for the Node.js backend).
+    # Raising makes the worker retry the job.
+    interview_context = job["context"]
+    user_id = job["user_id"]
+    full_transcript_text = assessment.format_transcript(job["transcript"])
+    metrics.start_trace("assessment_job")
+    set_priority(BACKGROUND)
+
+    # --- Step 1: Ask Gemini to generate score, feedback, and recommendation ---
+    # Long transcripts are scored chunk by chunk in parallel and then merged
+    log.info("Assessing interview transcript", extra=fields(entries=len(job["transcript"]), chars=len(full_transcript_text)))
+    with metrics.span("assessment"):
+        ai_assessment = await assessment.assess_transcript(
+            interview_context,
+            job["transcript"],
+            gemini_generate_json,
+            chunk_chars=ASSESSMENT_CHUNK_CHARS,
+            max_parallel=ASSESSMENT_MAX_PARALLEL,
+        )
+    log.info("AI assessment received", extra=fields(score=ai_assessment.get("score"), recommendation=ai_assessment.get("recommendation")))
+    log.debug("AI assessment feedback", extra=fields(feedback=ai_assessment.get("feedback")))
+
+    # --- Step 2: Prepare data for Node.js backend ---
+    result_payload = {
+        "userId": user_id,
+        "aiGeneratedContent": full_transcript_text, # Send the full transcript
+        "aiModelUsed": GEMINI_MODEL,
+        "sourceDataReference": f"Interview ID: {interview_context.get('interview_id', 'N/A')}",
+        "status": "Generated", # Initial status, can be 'Reviewed' later
+        "score": ai_assessment.get("score"),
+        "feedback": ai_assessment.get("feedback"),
+        "recommendation": ai_assessment.get("recommendation"),
+        "originalInterviewDate": job["interview_date"],
+        "originalCandidateIdentifier": "User-" + user_id, # Placeholder, replace with actual candidate info
+    }
+    return ai_assessment, result_payload
+
+async def deliver_interview_result(result_payload):
+    # Outbox dispatcher: raising schedules a retry with backoff
+    if not NODE_BACKEND_URL:
+        raise RuntimeError("NODE_BACKEND_URL is not set")
+    metrics.start_trace("result_delivery")
+    set_priority(BACKGROUND)
+    # The payload carries the whole transcript; only its size is logged
+    log.info("Sending interview result to the Node.js backend", extra=fields(url=NODE_BACKEND_URL, user=result_payload.get("userId"), transcript_chars=len(result_payload.get("aiGeneratedContent") or "")))
+    with metrics.span("node_post"):
+        node_response = await upstream_clients.post("node", NODE_BACKEND_URL, json=result_payload)
+    if node_response.status_code >= 400:
+        log.error("Node.js backend returned HTTP %s", node_response.status_code, extra=fields(body=node_response.text))
+    node_response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
+    log.info("Sent interview result to the Node.js backend")
+    log.debug("Node.js backend response", extra=fields(body=node_response.text))
+    try:
+        return node_response.json()
+    except json.JSONDecodeError:
+        return node_response.text
 
-# This route serves the interview selection page
-@app.route('/')
-def index():
-   # Get userId from query parameter
-    user_id = request.args.get('userId')  # Get userId from query parameter
-    
-    if not user_id:
-        print("No userId provided in URL. Please access this page with a valid userId parameter.")
-        return "Error: No userId provided. Please access this page from the React application.", 400
-    
-    print(f"Rendering interview selection page for userId: {user_id}")
-    
-    interview_cards_html = ""
-    for interview in mock_interviews:
-        key_skills_json = json.dumps(interview['key_skills']) # Ensure JSON string for hidden input
-        
-        skills_html = ""
-        if interview.get('key_skills') and isinstance(interview['key_skills'], list) and interview['key_skills']:
-            skills_html = f"<p><strong>Key Skills:</strong> {', '.join(interview['key_skills'])}</p>"
-
-        # Conditionally add userId hidden input if it exists
-        user_id_input = f'<input type="hidden" name="userId" value="{user_id}">' if user_id else ''
-
-        interview_cards_html += f"""
-        <form class="interview-card" action="/select_interview" method="post">
-            {user_id_input}
-            <input type="hidden" name="interview_id" value="{interview.get('_id', '')}">
-            <input type="hidden" name="interview_title" value="{interview.get('interview_title', 'Untitled Interview')}">
-            <input type="hidden" name="interview_type" value="{interview.get('interview_type', 'General')}">
-            <input type="hidden" name="job_role" value="{interview.get('job_role', 'N/A')}">
-            <input type="hidden" name="difficulty" value="{interview.get('difficulty', 'N/A')}">
-            <input type="hidden" name="key_skills" value='{key_skills_json}'>
-            <input type="hidden" name="duration" value="{interview.get('duration', 'N/A')}">
-            <input type="hidden" name="description" value="{interview.get('description', 'No description provided')}">
-
-            <div class="card-header">
-                <span class="card-type">{interview.get('interview_type', 'Interview')}</span>
-                <span class="card-publish-setting">Public</span> 
-            </div>
-            <h3>{interview.get('interview_title', 'Untitled Interview')}</h3>
-            <p><strong>Role:</strong> {interview.get('job_role', 'N/A')}</p>
-            <p><strong>Difficulty:</strong> {interview.get('difficulty', 'N/A')}</p>
-            <p><strong>Duration:</strong> {interview.get('duration', 'N/A')}</p>
-            {skills_html}
-            {interview.get('description') and f'<p><strong>Description:</strong> {interview["description"]}</p>'}
-            <button type="submit" class="select-interview-button">Start Interview</button>
-        </form>
-        """
 
-    return render_template_string(f"""
+# --- Interview selection page ---
+# The page is identical for every user: each catalog page (per filter and page
+# number) is rendered once per catalog version and served from precompressed
+# bytes with ETag/Last-Modified. The userId is copied from the query string
+# into the forms and links client-side.
+INDEX_PAGE_TEMPLATE = """
     <!DOCTYPE html>
     <html lang="en">
     <head>
@@ -322,7 +744,7 @@ def index():
         <style>
             @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
 
-            :root {{
+            :root {
                 --bg-dark: #1A1A2E;
                 --card-bg: #22253D;
                 --text-light: #E0E0E0;
@@ -333,9 +755,9 @@ def index():
                 --red-button-hover: #DC2626;
                 --border-color: #3B3E5B;
                 --input-bg: #2C2F48;
-            }}
+            }
 
-            body {{
+            body {
                 font-family: 'Inter', sans-serif;
                 margin: 0;
                 padding: 0;
@@ -347,9 +769,9 @@ def index():
                 min-height: 100vh;
                 padding: 20px;
                 box-sizing: border-box;
-            }}
+            }
 
-            .header-top {{
+            .header-top {
                 width: 90%;
                 max-width: 1200px;
                 display: flex;
@@ -358,32 +780,32 @@ def index():
                 padding-bottom: 20px;
                 border-bottom: 1px solid var(--border-color);
                 margin-bottom: 30px;
-            }}
+            }
 
-            .logo {{
+            .logo {
                 font-size: 28px;
                 font-weight: 700;
                 color: var(--text-light);
-            }}
+            }
 
-            h2 {{
+            h2 {
                 color: var(--accent-purple);
                 font-size: 2em;
                 margin-bottom: 30px;
                 text-align: center;
                 width: 100%;
-            }}
+            }
 
-            .interview-grid {{
+            .interview-grid {
                 display: grid;
                 grid-template-columns: repeat(auto-fit, minmax(280px, 1fr));
                 gap: 25px;
                 width: 90%;
                 max-width: 1200px;
                 justify-content: center;
-            }}
+            }
 
-            .interview-card {{
+            .interview-card {
                 background-color: var(--card-bg);
                 border: 1px solid var(--border-color);
                 border-radius: 12px;
@@ -393,58 +815,58 @@ def index():
                 gap: 10px;
                 box-shadow: 0 5px 15px rgba(0, 0, 0, 0.3);
                 transition: transform 0.2s ease, box-shadow 0.2s ease;
-            }}
+            }
 
-            .interview-card:hover {{
+            .interview-card:hover {
                 transform: translateY(-8px);
                 box-shadow: 0 10px 20px rgba(0, 0, 0, 0.4);
-            }}
+            }
             
-            .card-header {{
+            .card-header {
                 display: flex;
                 justify-content: space-between;
                 align-items: center;
                 margin-bottom: 10px;
-            }}
+            }
 
-            .card-type {{
+            .card-type {
                 background-color: #4a4a6a;
                 color: #e0e0e0;
                 font-size: 0.75em;
                 font-weight: 600;
                 padding: 4px 10px;
                 border-radius: 15px;
-            }}
+            }
 
-            .card-publish-setting {{
+            .card-publish-setting {
                 background-color: #4CAF50; /* Green for Public */
                 color: white;
                 font-size: 0.75em;
                 font-weight: 600;
                 padding: 4px 10px;
                 border-radius: 15px;
-            }}
+            }
 
 
-            .interview-card h3 {{
+            .interview-card h3 {
                 color: var(--accent-blue);
                 margin-top: 0;
                 margin-bottom: 10px;
                 font-size: 1.5em;
-            }}
+            }
 
-            .interview-card p {{
+            .interview-card p {
                 font-size: 0.95em;
                 line-height: 1.4;
                 color: var(--text-medium);
                 margin: 0;
-            }}
+            }
 
-            .interview-card strong {{
+            .interview-card strong {
                 color: var(--text-light);
-            }}
+            }
 
-            .select-interview-button {{
+            .select-interview-button {
                 background-color: var(--accent-purple);
                 color: white;
                 padding: 10px 15px;
@@ -456,24 +878,56 @@ def index():
                 margin-top: 15px;
                 transition: background-color 0.3s ease;
                 align-self: flex-start; /* Align button to start within card */
-            }}
+            }
 
-            .select-interview-button:hover {{
+            .select-interview-button:hover {
                 background-color: #7B4FE0;
-            }}
+            }
 
-            @media (max-width: 768px) {{
-                .header-top {{
+            .catalog-filters {
+                display: flex;
+                flex-wrap: wrap;
+                gap: 12px;
+                width: 90%;
+                max-width: 1200px;
+                margin-bottom: 25px;
+            }
+
+            .catalog-filters select, .catalog-filters button {
+                background-color: var(--input-bg);
+                color: var(--text-light);
+                border: 1px solid var(--border-color);
+                border-radius: 8px;
+                padding: 8px 12px;
+                font-size: 0.95em;
+            }
+
+            .pagination {
+                display: flex;
+                gap: 20px;
+                align-items: center;
+                margin-top: 30px;
+                color: var(--text-medium);
+            }
+
+            .pagination a {
+                color: var(--accent-blue);
+                text-decoration: none;
+                font-weight: 600;
+            }
+
+            @media (max-width: 768px) {
+                .header-top {
                     flex-direction: column;
                     gap: 15px;
-                }}
-                h2 {{
+                }
+                h2 {
                     font-size: 1.5em;
-                }}
-                .interview-grid {{
+                }
+                .interview-grid {
                     grid-template-columns: 1fr; /* Stack cards on small screens */
-                }}
-            }}
+                }
+            }
         </style>
     </head>
     <body>
@@ -481,910 +935,801 @@ def index():
             <div class="logo">PrepWise</div>
             </div>
         <h2>Select an Interview to Begin</h2>
+        <form class="catalog-filters" method="get">
+            <input type="hidden" name="userId" value="">
+            <select name="role">
+                <option value="">Any role</option>
+                {% for value in roles %}<option{% if value == filters.role %} selected{% endif %}>{{ value }}</option>{% endfor %}
+            </select>
+            <select name="difficulty">
+                <option value="">Any difficulty</option>
+                {% for value in difficulties %}<option{% if value == filters.difficulty %} selected{% endif %}>{{ value }}</option>{% endfor %}
+            </select>
+            <select name="skill">
+                <option value="">Any skill</option>
+                {% for value in skills %}<option{% if value in filters.skills %} selected{% endif %}>{{ value }}</option>{% endfor %}
+            </select>
+            <button type="submit">Filter</button>
+        </form>
         <div class="interview-grid">
-            {interview_cards_html}
+            {% for interview in interviews %}
+            <form class="interview-card" action="/select_interview" method="post">
+                <input type="hidden" name="userId" value="">
+                <input type="hidden" name="interview_id" value="{{ interview._id }}">
+
+                <div class="card-header">
+                    <span class="card-type">{{ interview.interview_type or 'Interview' }}</span>
+                    <span class="card-publish-setting">Public</span>
+                </div>
+                <h3>{{ interview.interview_title or 'Untitled Interview' }}</h3>
+                <p><strong>Role:</strong> {{ interview.job_role or 'N/A' }}</p>
+                <p><strong>Difficulty:</strong> {{ interview.difficulty or 'N/A' }}</p>
+                <p><strong>Duration:</strong> {{ interview.duration or 'N/A' }}</p>
+                {% if interview.key_skills %}<p><strong>Key Skills:</strong> {{ interview.key_skills|join(', ') }}</p>{% endif %}
+                {% if interview.description %}<p><strong>Description:</strong> {{ interview.description }}</p>{% endif %}
+                <button type="submit" class="select-interview-button">Start Interview</button>
+            </form>
+            {% else %}
+            <p>No interviews match these filters.</p>
+            {% endfor %}
+        </div>
+        {% if page.pages > 1 %}
+        <div class="pagination">
+            {% if prev_url %}<a class="page-link" href="{{ prev_url }}">&larr; Previous</a>{% endif %}
+            <span>Page {{ page.page }} of {{ page.pages }}</span>
+            {% if next_url %}<a class="page-link" href="{{ next_url }}">Next &rarr;</a>{% endif %}
         </div>
+        {% endif %}
+        <script>
+            // The page is shared by every user; only the userId is filled in per visit
+            const userId = new URLSearchParams(window.location.search).get('userId') || '';
+            document.querySelectorAll('input[name="userId"]').forEach(input => { input.value = userId; });
+            document.querySelectorAll('.page-link').forEach(link => {
+                const url = new URL(link.href);
+                url.searchParams.set('userId', userId);
+                link.href = url.toString();
+            });
+            // The server looks the interview up in its catalog; only the id is sent
+            document.querySelectorAll('.interview-card').forEach(form => {
+                form.addEventListener('submit', async (event) => {
+                    event.preventDefault();
+                    const response = await fetch('/select_interview', {
+                        method: 'POST',
+                        headers: { 'Content-Type': 'application/json' },
+                        body: JSON.stringify({ userId, interview_id: form.elements.interview_id.value })
+                    });
+                    const data = await response.json().catch(() => ({}));
+                    if (response.ok && data.redirect_url) {
+                        window.location.href = data.redirect_url;
+                    } else {
+                        console.error('Error selecting interview:', data.error || 'Unknown error');
+                        alert('Error starting interview. Please try again.');
+                    }
+                });
+            });
+        </script>
     </body>
     </html>
-    """,FRONTEND_URL)
+"""
+
+index_pages = OrderedDict() # (catalog version, filters, page) -> PrecompressedAsset, least recently used first
+
+def catalog_filters(args):
+    return {
+        "role": args.get('role') or None,
+        "difficulty": args.get('difficulty') or None,
+        "skills": tuple(skill for skill in args.getlist('skill') if skill),
+    }
+
+async def render_index_page(snapshot, filters, page_number):
+    key = (snapshot.version, filters["role"], filters["difficulty"], filters["skills"], page_number)
+    page_asset = index_pages.get(key)
+    if page_asset is not None:
+        index_pages.move_to_end(key)
+        return page_asset
+
+    page = snapshot.query(filters["role"], filters["difficulty"], filters["skills"], page_number, CATALOG_PAGE_SIZE)
+    query = {"role": filters["role"], "difficulty": filters["difficulty"], "skill": list(filters["skills"])}
+    html = await render_template_string(
+        INDEX_PAGE_TEMPLATE,
+        interviews=page.items,
+        page=page,
+        filters=filters,
+        roles=snapshot.facet("role"),
+        difficulties=snapshot.facet("difficulty"),
+        skills=snapshot.facet("skill"),
+        prev_url=url_for('index', page=page.page - 1, **query) if page.page > 1 else None,
+        next_url=url_for('index', page=page.page + 1, **query) if page.page < page.pages else None,
+    )
+    page_asset = index_pages[key] = PrecompressedAsset(html, "text/html; charset=utf-8")
+    while len(index_pages) > INDEX_PAGE_CACHE_MAX:
+        index_pages.popitem(last=False)
+    log.debug("Index page rendered", extra=fields(catalog=snapshot.version, page=page.page, interviews=len(page.items), total=page.total))
+    return page_asset
+
+@app.route('/')
+async def index():
+   # Get userId from query parameter
+    user_id = request.args.get('userId')  # Get userId from query parameter
+    
+    if not user_id:
+        log.warning("No userId provided in URL. Please access this page with a valid userId parameter.")
+        return "Error: No userId provided. Please access this page from the React application.", 400
+    
+    log.debug("Serving interview selection page", extra=fields(user=user_id))
+
+    page_asset = await render_index_page(interview_catalog.current(), catalog_filters(request.args), request.args.get('page', 1, type=int))
+    status, body, headers = page_asset.respond(request.headers, cache_control="no-cache")
+    return Response(body, status=status, headers=headers)
+
+# Filtered, paginated catalog for other frontends:
+#   GET /interviews?role=...&difficulty=...&skill=React&skill=SQL&page=2&per_page=20
+@app.route('/interviews')
+async def list_interviews():
+    filters = catalog_filters(request.args)
+    per_page = min(max(request.args.get('per_page', CATALOG_PAGE_SIZE, type=int), 1), 100)
+    page = interview_catalog.current().query(filters["role"], filters["difficulty"], filters["skills"], request.args.get('page', 1, type=int), per_page)
+    return jsonify(page.to_dict())
+
+@app.route('/interviews/<interview_id>')
+async def get_interview(interview_id):
+    interview = interview_catalog.current().get(interview_id)
+    if interview is None:
+        return jsonify({"error": "interview_not_found"}), 404
+    return jsonify(interview)
 
 # This route receives the interview details when a card is selected
 @app.route('/select_interview', methods=['POST'])
-def select_interview_and_redirect():
-    global current_interview_context
-    global interview_transcript # Reset transcript for new interview
-    interview_transcript = []
+async def select_interview_and_redirect():
     try:
-        # The frontend form sends standard form data, so we use request.form
-        # If this were a JSON fetch request, you'd use request.get_json()
-        interview_data = request.get_json() 
-        
-        raw_skills = interview_data.get('key_skills', '[]') # Default to '[]' if not present
-        if isinstance(raw_skills, str):
-            try:
-                key_skills = json.loads(raw_skills)
-            except json.JSONDecodeError:
-                key_skills = [s.strip() for s in raw_skills.split(',') if s.strip()]
-        elif isinstance(raw_skills, list):
-            key_skills = raw_skills
+        interview_data = await request.get_json()
+
+        # Catalog interviews are resolved by id; the posted details only describe interviews
+        # the catalog doesn't know, e.g. a private one picked in the React app
+        interview = interview_catalog.current().get(interview_data.get("interview_id"))
+        if interview is not None:
+            interview_context = {"interview_id": interview["_id"], **{key: value for key, value in interview.items() if key != "_id"}}
         else:
-            key_skills = []
-
-        current_interview_context = {
-            "interview_id": interview_data.get("interview_id"),
-            "interview_title": interview_data.get("interview_title"),
-            "interview_type": interview_data.get("interview_type"),
-            "job_role": interview_data.get("job_role"),
-            "difficulty": interview_data.get("difficulty"),
-            "key_skills": key_skills,
-            "duration": interview_data.get("duration"),
-            "description": interview_data.get("description"),
-        }
-        print(f"Selected interview context set: {current_interview_context}")
+            raw_skills = interview_data.get('key_skills', '[]') # Default to '[]' if not present
+            if isinstance(raw_skills, str):
+                try:
+                    key_skills = json.loads(raw_skills)
+                except json.JSONDecodeError:
+                    key_skills = [s.strip() for s in raw_skills.split(',') if s.strip()]
+            elif isinstance(raw_skills, list):
+                key_skills = raw_skills
+            else:
+                key_skills = []
+
+            interview_context = {
+                "interview_id": interview_data.get("interview_id"),
+                "interview_title": interview_data.get("interview_title"),
+                "interview_type": interview_data.get("interview_type"),
+                "job_role": interview_data.get("job_role"),
+                "difficulty": interview_data.get("difficulty"),
+                "key_skills": key_skills,
+                "duration": interview_data.get("duration"),
+                "description": interview_data.get("description"),
+            }
 
         # Get userId from the incoming data
         user_id = interview_data.get("userId")
 
-        # Redirect to the actual AI interview page within the same Flask app, passing userId
-        return jsonify({"redirect_url": url_for('interview_agent_page', userId=user_id)}), 200 # Send JSON response for redirection
+        # Every selection starts a fresh session with an empty transcript
+        system_prompt = build_interview_system_prompt(interview_context)
+        session_id = await session_store.create(interview_context, user_id, system_prompt=system_prompt)
+        log.info("Interview selected", extra=fields(session=session_id, interview_id=interview_context["interview_id"], title=interview_context["interview_title"]))
+
+        if GEMINI_CONTEXT_CACHING and conversation.estimate_tokens(system_prompt) >= GEMINI_CONTEXT_CACHE_MIN_TOKENS:
+            app.add_background_task(register_context_cache, session_id, system_prompt)
+        # Only the streaming paths can attach to it; the plain HTTP greeting asks Gemini itself
+        if GREETING_PREFETCH and (TURN_STREAMING or SESSION_SOCKETS):
+            reply_prefetches.start(session_id, GREETING_PROMPT, prefetched_reply_events(session_id, GREETING_PROMPT))
+
+        # The selection page navigates to the interview page at redirect_url (userId and sessionId in the query)
+        return jsonify({
+            "redirect_url": url_for('interview_agent_page', userId=user_id, sessionId=session_id),
+            "session_id": session_id,
+        }), 200 # Send JSON response for redirection
 
     except Exception as e:
-        print(f"Error selecting interview: {e}")
+        log.exception("Error selecting interview")
         return jsonify({"error": str(e), "message": "Could not start interview. Please go back and try again."}), 500
 
 
 # This is the main route for the AI agent once an interview is selected
 @app.route('/interview_agent')
-def interview_agent_page():
-    display_title = current_interview_context.get("interview_title", "General AI Interview")
+async def interview_agent_page():
+    session_id = await get_request_session_id()
+    session = await session_store.get(session_id)
+    if session is None:
+        return "Error: Unknown or expired interview session. Please select an interview again.", 404
+    display_title = session["context"].get("interview_title") or "General AI Interview"
     user_id = request.args.get('userId') # Get userId from query parameter
 
-    return render_template_string(f"""
-    <!DOCTYPE html>
-    <html lang="en">
-    <head>
-        <meta charset="UTF-8">
-        <meta name="viewport" content="width=device-width, initial-scale=1.0">
-        <title>PrepWise AI Interview</title>
-        <link rel="stylesheet" href="https://cdnjs.cloudflare.com/ajax/libs/font-awesome/6.0.0-beta3/css/all.min.css">
-        <style>
-            @import url('https://fonts.googleapis.com/css2?family=Inter:wght@300;400;500;600;700&display=swap');
-
-            :root {{
-                --bg-dark: #1A1A2E;
-                --card-bg: #22253D;
-                --text-light: #E0E0E0;
-                --text-medium: #B0B0B0;
-                --accent-purple: #8B5CF6;
-                --accent-blue: #6366F1;
-                --red-button: #EF4444;
-                --red-button-hover: #DC2626;
-                --border-color: #3B3E5B;
-                --input-bg: #2C2F48;
-            }}
-
-            body {{
-                font-family: 'Inter', sans-serif;
-                margin: 0;
-                padding: 0;
-                background-color: var(--bg-dark);
-                color: var(--text-light);
-                display: flex;
-                flex-direction: column;
-                justify-content: space-between;
-                align-items: center;
-                min-height: 100vh;
-                overflow: hidden;
-            }}
-
-            .main-container {{
-                width: 90%;
-                max-width: 1200px;
-                display: flex;
-                flex-direction: column;
-                gap: 20px;
-                padding: 20px;
-                box-sizing: border-box;
-            }}
-
-            header {{
-                display: flex;
-                justify-content: space-between;
-                align-items: center;
-                width: 100%;
-                padding: 15px 0;
-                border-bottom: 1px solid var(--border-color);
-            }}
-
-            .header-left {{
-                display: flex;
-                align-items: center;
-                gap: 20px;
-            }}
-
-            .logo {{
-                font-size: 24px;
-                font-weight: 700;
-                color: var(--text-light);
-            }}
-
-            .interview-title {{
-                font-size: 18px;
-                font-weight: 500;
-                color: var(--accent-purple);
-            }}
-
-            .header-right {{
-                display: flex;
-                align-items: center;
-                gap: 15px;
-            }}
-
-            .status-icon {{
-                width: 12px;
-                height: 12px;
-                border-radius: 50%;
-                background-color: #4CAF50;
-                border: 2px solid var(--card-bg);
-            }}
-
-            .status-icon.red {{
-                background-color: #F44336;
-            }}
-
-            .technical-button {{
-                background-color: var(--card-bg);
-                color: var(--text-light);
-                border: 1px solid var(--border-color);
-                padding: 10px 20px;
-                border-radius: 8px;
-                cursor: pointer;
-                font-size: 14px;
-                font-weight: 500;
-                transition: background-color 0.3s ease, border-color 0.3s ease;
-            }}
-
-            .technical-button:hover {{
-                background-color: #33365A;
-                border-color: var(--accent-blue);
-            }}
-
-            .content-area {{
-                flex-grow: 1;
-                display: flex;
-                justify-content: center;
-                align-items: center;
-                gap: 40px;
-                width: 100%;
-                padding: 40px 0;
-            }}
-
-            .card {{
-                background-color: var(--card-bg);
-                border-radius: 12px;
-                padding: 30px;
-                display: flex;
-                flex-direction: column;
-                align-items: center;
-                gap: 20px;
-                width: 300px;
-                height: 350px;
-                justify-content: center;
-                box-shadow: 0 8px 16px rgba(0, 0, 0, 0.2);
-                border: 1px solid var(--border-color);
-            }}
-
-            .avatar-container {{
-                width: 150px;
-                height: 150px;
-                border-radius: 50%;
-                background-color: var(--bg-dark);
-                display: flex;
-                justify-content: center;
-                align-items: center;
-                box-shadow: inset 0 0 10px rgba(0, 0, 0, 0.5);
-                overflow: hidden;
-            }}
-
-            .avatar-container img {{
-                width: 100%;
-                height: 100%;
-                object-fit: cover;
-                border-radius: 50%;
-            }}
-
-            .avatar-container .icon-circle {{
-                width: 100px;
-                height: 100px;
-                border-radius: 50%;
-                background-color: var(--bg-dark);
-                display: flex;
-                justify-content: center;
-                align-items: center;
-                color: var(--text-light);
-                font-size: 40px;
-            }}
-            .avatar-container .icon-circle i {{
-                color: var(--text-light);
-            }}
-
-            .card-name {{
-                font-size: 20px;
-                font-weight: 600;
-                color: var(--text-light);
-            }}
-
-            .status-text {{
-                font-size: 1em;
-                color: var(--text-medium);
-                margin-top: 10px;
-            }}
-            
-            audio {{
-                display: none; /* Hide the default audio player */
-            }}
-
-            footer {{
-                width: 100%;
-                padding: 20px 0;
-                border-top: 1px solid var(--border-color);
-                display: flex;
-                flex-direction: column;
-                align-items: center;
-                gap: 20px;
-            }}
-
-            .input-group {{
-                width: 70%;
-                max-width: 600px;
-                display: flex;
-                align-items: center;
-                background-color: var(--input-bg);
-                border-radius: 10px;
-                padding: 10px 20px;
-                border: 1px solid var(--border-color);
-            }}
-
-            .input-group input {{
-                flex-grow: 1;
-                background: none;
-                border: none;
-                outline: none;
-                color: var(--text-light);
-                font-size: 16px;
-                padding: 5px 0;
-            }}
-
-            .input-group input::placeholder {{
-                color: var(--text-medium);
-            }}
-
-            .action-buttons {{
-                display: flex;
-                gap: 15px;
-            }}
-
-            .action-button {{
-                background-color: var(--card-bg);
-                color: var(--text-light);
-                border: 1px solid var(--border-color);
-                padding: 12px 25px;
-                border-radius: 8px;
-                cursor: pointer;
-                font-size: 16px;
-                display: flex;
-                align-items: center;
-                gap: 8px;
-                transition: background-color 0.3s ease, border-color 0.3s ease;
-            }}
-
-            .action-button i {{
-                font-size: 18px;
-            }}
-
-            .action-button.start-recording {{
-                background-color: var(--accent-purple);
-                border-color: var(--accent-purple);
-            }}
-
-            .action-button.start-recording:hover {{
-                background-color: #7B4FE0;
-                border-color: #7B4FE0;
-            }}
-            
-            .action-button.stop-recording {{
-                background-color: #d9534f; /* A reddish color for stop */
-                border-color: #d9534f;
-                display: none; /* Hidden by default */
-            }}
-
-            .action-button.stop-recording:hover {{
-                background-color: #c9302c;
-                border-color: #c9302c;
-            }}
-
-            .action-button:disabled {{
-                background-color: #5a5a5a;
-                cursor: not-allowed;
-                border-color: #5a5a5a;
-            }}
-
-            .action-button.leave {{
-                background-color: var(--red-button);
-                border-color: var(--red-button);
-            }}
-
-            .action-button.leave:hover {{
-                background-color: var(--red-button-hover);
-                border-color: var(--red-button-hover);
-            }}
-
-            @media (max-width: 768px) {{
-                header {{
-                    flex-direction: column;
-                    align-items: center;
-                    gap: 15px;
-                }}
-                .header-left, .header-right {{
-                    flex-direction: column;
-                    align-items: center;
-                    gap: 10px;
-                }}
-                .content-area {{
-                    flex-direction: column;
-                }}
-                .card {{
-                    width: 90%;
-                    max-width: 350px;
-                }}
-                .input-group {{
-                    width: 90%;
-                }}
-                .action-buttons {{
-                    flex-direction: column;
-                    width: 90%;
-                }}
-                .action-button {{
-                    width: 100%;
-                    justify-content: center;
-                }}
-            }}
-        </style>
-    </head>
-    <body>
-        <div class="main-container">
-            <header>
-                <div class="header-left">
-                    <div class="logo">PrepWise</div>
-                    <div class="interview-title">{display_title}</div>
-                </div>
-                <div class="header-right">
-                    <div class="status-icon"></div>
-                    <div class="status-icon red"></div>
-                    <button class="technical-button">Technical Interview</button>
-                </div>
-            </header>
-
-            <div class="content-area">
-                <div class="card interviewer-card">
-                    <div class="avatar-container">
-                        <div class="icon-circle">
-                            <i class="fas fa-comment-dots"></i>
-                        </div>
-                    </div>
-                    <div class="card-name">AI Interviewer</div>
-                </div>
-
-                <div class="card interviewee-card">
-                    <div class="avatar-container">
-                        <img src="https://via.placeholder.com/150/8B5CF6/FFFFFF?text=YOU" alt="Adrian's Avatar">
-                    </div>
-                    <div class="card-name">Adrian (You)</div>
-                    <p id="status" class="status-text">Click "Start Replying" to begin.</p>
-                </div>
-            </div>
-
-            <footer>
-                <div class="input-group">
-                    <input type="text" id="userInput" placeholder="What job experience level are you targeting?" disabled>
-                </div>
-                <div class="action-buttons">
-                    <button class="action-button start-recording" id="startRecordingButton">
-                        <i class="fas fa-microphone"></i> Start Replying
-                    </button>
-                    <button class="action-button stop-recording" id="stopRecordingButton">
-                        <i class="fas fa-stop-circle"></i> Stop Replying
-                    </button>
-                    <button class="action-button leave" id="leaveInterviewButton">
-                        <i class="fas fa-power-off"></i> Leave Interview
-                    </button>
-                </div>
-            </footer>
-        </div>
-
-        <audio id="audioPlayer"></audio>
-
-        <script>
-            let mediaRecorder;
-            let audioChunks = [];
-            let audioPlayer = document.getElementById('audioPlayer');
-            let statusDiv = document.getElementById('status');
-            let startRecordingButton = document.getElementById('startRecordingButton');
-            let stopRecordingButton = document.getElementById('stopRecordingButton');
-            let leaveInterviewButton = document.getElementById('leaveInterviewButton');
-            let userInputField = document.getElementById('userInput');
-
-            // Get userId from the URL query parameters
-            const urlParams = new URLSearchParams(window.location.search);
-            const dynamicUserId = urlParams.get('userId');
-            console.log("Dynamic User ID from URL:", dynamicUserId);
-
-
-            // Event Listeners for the new buttons
-            startRecordingButton.addEventListener('click', startRecording);
-            stopRecordingButton.addEventListener('click', stopRecording);
-            leaveInterviewButton.addEventListener('click', exitAgent); // Modified to call exitAgent
-
-            function updateStatus(message, color = 'var(--text-medium)') {{
-                statusDiv.textContent = message;
-                statusDiv.style.color = color;
-            }}
-
-            async function startRecording() {{
-                try {{
-                    // Set mimeType to 'audio/webm' for broader browser compatibility
-                    // Most browsers record efficiently to webm by default.
-                    const stream = await navigator.mediaDevices.getUserMedia({{ audio: true }});
-                    mediaRecorder = new MediaRecorder(stream, {{ mimeType: 'audio/webm' }}); 
-                    audioChunks = [];
-
-                    mediaRecorder.ondataavailable = (event) => {{
-                        audioChunks.push(event.data);
-                    }};
-
-                    mediaRecorder.onstop = async () => {{
-                        const audioBlob = new Blob(audioChunks, {{ type: 'audio/webm' }}); // Match Blob type to mimeType
-                        sendAudioToBackend(audioBlob);
-                        stream.getTracks().forEach(track => track.stop()); // Stop microphone access
-                    }}
-                    ;
-
-                    mediaRecorder.start();
-                    updateStatus("Recording... Click 'Stop Replying' when done.");
-                    startRecordingButton.style.display = 'none';
-                    stopRecordingButton.style.display = 'inline-flex';
-                    leaveInterviewButton.disabled = false;
-                    userInputField.disabled = true;
-                }} catch (error) {{
-                    console.error('Error accessing microphone:', error);
-                    updateStatus('Error accessing microphone. Please allow microphone access.', 'var(--red-button)');
-                    startRecordingButton.disabled = false; // Re-enable if error
-                    stopRecordingButton.style.display = 'none';
-                }}
-            }}
-
-            function stopRecording() {{
-                if (mediaRecorder && mediaRecorder.state === 'recording') {{
-                    mediaRecorder.stop();
-                    updateStatus("Processing your response...");
-                    startRecordingButton.style.display = 'inline-flex';
-                    stopRecordingButton.style.display = 'none';
-                    startRecordingButton.disabled = true; // Disable until AI responds
-                }}
-            }}
-
-            async function sendAudioToBackend(audioBlob) {{
-                const formData = new FormData();
-                // Ensure the filename extension matches the actual Blob type (e.g., .webm)
-                formData.append('audio_file', audioBlob, 'user_input.webm'); 
-
-                try {{
-                    const response = await fetch('/upload_audio', {{
-                        method: 'POST',
-                        body: formData
-                    }});
-                    const data = await response.json();
-
-                    if (data.user_text) {{
-                        updateStatus("You said: " + data.user_text);
-                        // Add user text to transcript
-                        await fetch('/add_to_transcript', {{
-                            method: 'POST',
-                            headers: {{ 'Content-Type': 'application/json' }},
-                            body: JSON.stringify({{ role: 'user', text: data.user_text }})
-                        }});
-
-                        // Directly ask AI for response after user speech is processed
-                        updateStatus("Getting response from AI...");
-                        const aiResponse = await fetch('/get_ai_response', {{
-                            method: 'POST',
-                            headers: {{ 'Content-Type': 'application/json' }},
-                            body: JSON.stringify({{ prompt: data.user_text }})
-                        }});
-                        const aiData = await aiResponse.json();
-
-                        if (aiData.ai_response_text) {{
-                            // Add AI text to transcript
-                            await fetch('/add_to_transcript', {{
-                                method: 'POST',
-                                headers: {{ 'Content-Type': 'application/json' }},
-                                body: JSON.stringify({{ role: 'ai', text: aiData.ai_response_text }})
-                            }});
-
-                            updateStatus("Synthesizing speech...");
-
-                            const audioPlayResponse = await fetch('/play_audio', {{
-                                method: 'POST',
-                                headers: {{ 'Content-Type': 'application/json' }},
-                                body: JSON.stringify({{ text: aiData.ai_response_text }})
-                            }});
-                            const audioPlayData = await audioPlayResponse.json();
-
-                            if (audioPlayData.audio_url) {{
-                                audioPlayer.src = audioPlayData.audio_url + '?cache=' + new Date().getTime();
-                                audioPlayer.load();
-                                audioPlayer.play().catch(e => {{
-                                    console.error("Error playing audio:", e);
-                                    updateStatus("Error playing audio. Check console.", "red");
-                                }});
-                                updateStatus("Playing AI response...", "var(--accent-blue)");
-                                await new Promise(resolve => {{
-                                    audioPlayer.onended = resolve;
-                                    audioPlayer.onerror = () => {{
-                                        console.error("Audio playback error.");
-                                        updateStatus("Audio error. Please try again.", "red");
-                                        resolve();
-                                    }};
-                                }});
-                                updateStatus("Ready for your next response. Click 'Start Replying'.");
-                            }} else {{
-                                updateStatus("Could not synthesize audio response.", "var(--red-button)");
-                            }}
-                        }} else {{
-                            updateStatus("No AI response received.", "var(--red-button)");
-                        }}
-                    }} else {{
-                        updateStatus("I didn't catch that. Please try speaking again. Click 'Start Replying'.", "var(--text-medium)");
-                    }}
-                }} catch (error) {{
-                    console.error("Error in AI Agent:", error);
-                    updateStatus("An error occurred: " + error.message, "var(--red-button)");
-                }} finally {{
-                    startRecordingButton.disabled = false;
-                    userInputField.disabled = false;
-                }}
-            }}
-
-            async function exitAgent() {{
-                if (mediaRecorder && mediaRecorder.state === 'recording') {{
-                    mediaRecorder.stop();
-                }}
-                audioPlayer.pause();
-                audioPlayer.src = '';
-                updateStatus("Ending interview and generating results...", "var(--accent-purple)");
-                startRecordingButton.style.display = 'inline-flex';
-                stopRecordingButton.style.display = 'none';
-                startRecordingButton.disabled = true; // Disable until results are processed
-                leaveInterviewButton.disabled = true;
-                userInputField.disabled = true;
-
-                try {{
-                    const response = await fetch('/end_interview', {{
-                        method: 'POST',
-                        headers: {{ 'Content-Type': 'application/json' }},
-                        body: JSON.stringify({{ userId: dynamicUserId }}) // Pass the dynamic user ID
-                    }});
-                    const data = await response.json();
-
-                    if (response.ok) {{
-                        updateStatus("Interview ended. Results saved!", "green");
-                        console.log("Interview Result Saved:", data);
-                        // Optionally redirect to a results page or home
-                        window.location.href = "http://localhost:5173/";
-                    }} else {{
-                        updateStatus("Failed to save interview results: " + (data.message || "Unknown error"), "red");
-                        console.error("Error saving interview results:", data);
-                    }}
-                }} catch (error) {{
-                    console.error("Network error while ending interview:", error);
-                    updateStatus("Network error during result saving. Check console.", "red");
-                }} finally {{
-                    startRecordingButton.disabled = false;
-                    leaveInterviewButton.disabled = false;
-                    userInputField.disabled = false;
-                }}
-            }}
-
-            // Add a submit event listener to the form on the index page
-            document.querySelectorAll('.interview-card').forEach(form => {{
-                form.addEventListener('submit', async (event) => {{
-                    event.preventDefault();
-                    const formData = new FormData(form);
-                    const jsonData = Object.fromEntries(formData.entries());
-
-                    // Manually parse key_skills if it's a string, then re-stringify for the JSON body
-                    let keySkillsValue = jsonData['key_skills'];
-                    try {{
-                        jsonData['key_skills'] = JSON.parse(keySkillsValue);
-                    }} catch (e) {{
-                        // If it's not valid JSON, treat it as a comma-separated string
-                        jsonData['key_skills'] = keySkillsValue.split(',').map(s => s.trim()).filter(s => s);
-                    }}
-
-                    const response = await fetch('/select_interview', {{
-                        method: 'POST',
-                        headers: {{
-                            'Content-Type': 'application/json'
-                        }},
-                        body: JSON.stringify(jsonData)
-                    }});
-                    const data = await response.json();
-                    if (response.ok && data.redirect_url) {{
-                        window.location.href = data.redirect_url;
-                    }} else {{
-                        console.error('Error selecting interview:', data.error || 'Unknown error');
-                        alert('Error starting interview. Please try again.');
-                    }}
-                }});
-            }});
-
-            window.onload = async () => {{
-                updateStatus("Click 'Start Replying' to begin your response.");
-                stopRecordingButton.style.display = 'none'; // Ensure stop button is hidden initially
-                leaveInterviewButton.disabled = false; // Enable Leave Interview button by default
-                userInputField.disabled = true;
-
-                // Make the initial greeting from AI
-                await sendInitialGreeting();
-            }};
-
-            async function sendInitialGreeting() {{
-                updateStatus("AI is preparing the first question...");
-                try {{
-                    const initialPrompt = "Start the interview with a greeting and your first question based on the selected interview context.";
-                    const aiResponse = await fetch('/get_ai_response', {{
-                        method: 'POST',
-                        headers: {{ 'Content-Type': 'application/json' }},
-                        body: JSON.stringify({{ prompt: initialPrompt }})
-                    }});
-                    const aiData = await aiResponse.json();
-
-                    if (aiData.ai_response_text) {{
-                        // Add AI greeting to transcript
-                        await fetch('/add_to_transcript', {{
-                            method: 'POST',
-                            headers: {{ 'Content-Type': 'application/json' }},
-                            body: JSON.stringify({{ role: 'ai', text: aiData.ai_response_text }})
-                        }});
-
-                        updateStatus("Synthesizing AI greeting...");
-                        const audioPlayResponse = await fetch('/play_audio', {{
-                            method: 'POST',
-                            headers: {{ 'Content-Type': 'application/json' }},
-                            body: JSON.stringify({{ text: aiData.ai_response_text }})
-                        }});
-                        const audioPlayData = await audioPlayResponse.json();
-
-                        if (audioPlayData.audio_url) {{
-                            audioPlayer.src = audioPlayData.audio_url + '?cache=' + new Date().getTime();
-                            audioPlayer.load();
-                            audioPlayer.play().catch(e => {{
-                                console.error("Error playing AI greeting audio:", e);
-                                updateStatus("Error playing AI greeting. Check console.", "red");
-                            }});
-                            updateStatus("Playing AI response...", "var(--accent-blue)");
-                            await new Promise(resolve => {{
-                                audioPlayer.onended = resolve;
-                                audioPlayer.onerror = () => {{
-                                    console.error("AI greeting audio playback error.");
-                                    updateStatus("AI greeting audio error. Please try again.", "red");
-                                    resolve();
-                                }};
-                            }});
-                            updateStatus("AI has spoken. Click 'Start Replying' to respond.");
-                        }} else {{
-                            updateStatus("Could not synthesize AI greeting audio.", "var(--red-button)");
-                        }}
-                    }} else {{
-                        updateStatus("No AI greeting received.", "var(--red-button)");
-                    }}
-                }} catch (error) {{
-                    console.error("Error fetching initial AI greeting:", error);
-                    updateStatus("Error getting initial AI greeting: " + error.message, "var(--red-button)");
-                }}
-            }}
-        </script>
-    </body>
-    </html>
-    """)
+    # Only this small shell is rendered per visit; CSS and JS are immutable assets
+    html = await render_template(
+        "interview_agent.html",
+        display_title=display_title,
+        css_url=page_assets.url("interview_agent.css"),
+        js_url=page_assets.url("interview_agent.js"),
+        bootstrap={
+            "userId": user_id,
+            "sessionId": session_id,
+            "streamingTurns": TURN_STREAMING,
+            "streamingUploads": STREAM_UPLOADS,
+            "uploadTimesliceMs": STREAM_UPLOAD_TIMESLICE_MS,
+            "sessionSocket": SESSION_SOCKETS,
+            "greetingPrompt": GREETING_PROMPT,
+        },
+    )
+    return Response(html, mimetype="text/html", headers={"Cache-Control": "no-store"})
+
+@app.route('/assets/<path:filename>')
+async def serve_asset(filename):
+    asset = page_assets.get(filename)
+    if asset is None:
+        return "Not found", 404
+    status, body, headers = asset.respond(request.headers, cache_control="public, max-age=31536000, immutable")
+    return Response(body, status=status, headers=headers)
 
 # New route to add conversation turns to the transcript
 @app.route('/add_to_transcript', methods=['POST'])
-def add_to_transcript():
-    global interview_transcript
-    data = request.json
+async def add_to_transcript():
+    data = await request.get_json()
     role = data.get('role')
     text = data.get('text')
     if role and text:
-        interview_transcript.append({"role": role, "text": text, "timestamp": time.time()})
-        print(f"Added to transcript: {role}: {text[:50]}...") # Print first 50 chars
+        if not await session_store.append_transcript(await get_request_session_id(), role, text):
+            return session_not_found_response()
+        log.debug("Added to transcript", extra=fields(role=role, chars=len(text)))
         return jsonify({"status": "success"}), 200
     return jsonify({"status": "error", "message": "Missing role or text"}), 400
 
 # New route to end the interview and send results to Node.js backend
 @app.route('/end_interview', methods=['POST'])
 async def end_interview():
-    global interview_transcript
-    global current_interview_context
+    # Queues the assessment and returns straight away; poll /interview_status/<job_id> for the outcome
     try:
-        data = request.json
+        data = await request.get_json()
         user_id = data.get('userId') # Get userId from the frontend
+        session_id = await get_request_session_id()
 
         if not user_id:
-            print("[ERROR] No userId provided in /end_interview request.")
+            log.warning("No userId provided in /end_interview request")
             return jsonify({"message": "User ID is required to save interview results."}), 400
 
-        if not interview_transcript:
-            print("[ERROR] No interview transcript to process in /end_interview.")
-            return jsonify({"message": "No interview transcript to process."}), 400
+        session = await session_store.get(session_id)
+        if session is None:
+            log.warning("Unknown or expired session in /end_interview request")
+            return jsonify({"message": "Unknown or expired interview session."}), 404
 
-        full_transcript_text = "\n".join([f"{entry['role'].upper()}: {entry['text']}" for entry in interview_transcript])
-        
-        # --- Step 1: Ask Gemini to generate score, feedback, and recommendation ---
-        assessment_prompt = (
-            f"Based on the following interview transcript for a '{current_interview_context.get('job_role', 'general')}' position "
-            f"with difficulty '{current_interview_context.get('difficulty', 'medium')}', "
-            f"and focusing on skills like {', '.join(current_interview_context.get('key_skills', ['general skills']))}, "
-            f"please provide a comprehensive assessment. "
-            f"Your response should be a JSON object with the following structure:\n"
-            f'{{"score": <integer 0-100>, "feedback": "<string>", "recommendation": "<string: Hire|Do Not Hire|Further Interview|Strong Hire|Weak Hire|N/A>"}}\n'
-            f"Here is the transcript:\n\n{full_transcript_text}"
-        )
-
-        print("[INFO] Sending transcript to Gemini for final assessment...")
-        print(f"[DEBUG] Assessment Prompt: {assessment_prompt}")
-
-        # Configure Gemini for structured JSON response
-        chat_history = [{"role": "user", "parts": [{"text": assessment_prompt}]}]
-        payload = {
-            "contents": chat_history,
-            "generationConfig": {
-                "responseMimeType": "application/json",
-                "responseSchema": {
-                    "type": "OBJECT",
-                    "properties": {
-                        "score": {"type": "INTEGER"},
-                        "feedback": {"type": "STRING"},
-                        "recommendation": {"type": "STRING", "enum": ["Hire", "Do Not Hire", "Further Interview", "Strong Hire", "Weak Hire", "N/A"]}
-                    },
-                    "propertyOrdering": ["score", "feedback", "recommendation"]
-                }
-            }
-        }
-        apiKey = GEMINI_API_KEY
-        apiUrl = f"https://generativelanguage.googleapis.com/v1beta/models/gemini-2.0-flash:generateContent?key={apiKey}"
-
-        try:
-            assessment_response = await asyncio.to_thread(
-                requests.post,
-                apiUrl,
-                headers={'Content-Type': 'application/json'},
-                data=json.dumps(payload)
-            )
-            assessment_response.raise_for_status()
-            assessment_result = assessment_response.json()
-        except Exception as e:
-            print(f"[ERROR] Failed to get assessment from Gemini: {e}")
-            return jsonify({"message": f"Failed to get assessment from Gemini: {e}"}), 500
-
-        ai_assessment = {}
-        if assessment_result.get("candidates") and assessment_result["candidates"][0].get("content") and \
-           assessment_result["candidates"][0]["content"].get("parts") and \
-           assessment_result["candidates"][0]["content"]["parts"][0].get("text"):
-            try:
-                ai_assessment = json.loads(assessment_result["candidates"][0]["content"]["parts"][0]["text"])
-                print(f"[INFO] AI Assessment received: {ai_assessment}")
-            except json.JSONDecodeError:
-                print("[ERROR] Error decoding AI assessment JSON.")
-                ai_assessment = {"score": None, "feedback": "AI assessment could not be parsed.", "recommendation": "N/A"}
-        else:
-            print("[ERROR] AI assessment response structure is unexpected or content is missing.")
-            ai_assessment = {"score": None, "feedback": "AI assessment not generated.", "recommendation": "N/A"}
-
-        # --- Step 2: Prepare data for Node.js backend ---
-        result_payload = {
-            "userId": user_id,
-            "aiGeneratedContent": full_transcript_text, # Send the full transcript
-            "aiModelUsed": "gemini-2.0-flash", # Or dynamically get from config
-            "sourceDataReference": f"Interview ID: {current_interview_context.get('interview_id', 'N/A')}",
-            "status": "Generated", # Initial status, can be 'Reviewed' later
-            "score": ai_assessment.get("score"),
-            "feedback": ai_assessment.get("feedback"),
-            "recommendation": ai_assessment.get("recommendation"),
-            "originalInterviewDate": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()), # Current time
-            "originalCandidateIdentifier": "User-" + user_id, # Placeholder, replace with actual candidate info
-        }
+        if not session["transcript"]:
+            log.warning("No interview transcript to process in /end_interview")
+            return jsonify({"message": "No interview transcript to process."}), 400
 
-        # --- Step 3: Send data to Node.js backend ---
-        print(f"[INFO] Sending data to Node.js backend: {NODE_BACKEND_URL}")
-        print(f"[DEBUG] Payload: {json.dumps(result_payload, indent=2)}")
-        try:
-            node_response = requests.post(NODE_BACKEND_URL, json=result_payload)
-            node_response.raise_for_status() # Raise an exception for HTTP errors (4xx or 5xx)
-            print(f"[INFO] Successfully sent interview result to Node.js backend. Response: {node_response.text}")
-        except requests.exceptions.RequestException as e:
-            print(f"[ERROR] Error communicating with Node.js backend: {e}")
-            if hasattr(e, 'response') and e.response is not None:
-                print(f"[ERROR] Node.js backend error response: {e.response.text}")
-                return jsonify({"message": f"Failed to save interview result to backend: {e.response.text}"}), 500
-            return jsonify({"message": f"Failed to save interview result to backend: {e}"}), 500
-        except Exception as e:
-            print(f"[ERROR] Unexpected error sending to Node.js backend: {e}")
-            return jsonify({"message": f"Unexpected error sending to Node.js backend: {e}"}), 500
-
-        # Clear transcript and context after saving
-        interview_transcript = []
-        current_interview_context = {}
-
-        return jsonify({"message": "Interview result saved successfully!", "node_response": node_response.json()}), 200
+        # The job row keeps its own copy of the transcript, so the session can go now
+        job_id = await assessment_workers.enqueue({
+            "user_id": user_id,
+            "context": session["context"],
+            "transcript": session["transcript"],
+            "interview_date": time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        })
+        log.info("Queued assessment job %s", job_id)
+
+        await session_store.delete(session_id)
+        reply_prefetches.discard(session_id)
+        if session.get("cached_content"):
+            app.add_background_task(delete_context_cache, session["cached_content"])
+
+        return jsonify({
+            "message": "Interview ended. Results are being generated.",
+            "job_id": job_id,
+            "status_url": url_for('interview_status', job_id=job_id),
+        }), 202
 
     except Exception as e:
-        print(f"[ERROR] An unexpected error occurred during end_interview: {e}")
+        log.exception("An unexpected error occurred during end_interview")
         return jsonify({"message": f"An internal error occurred: {e}"}), 500
 
+@app.route('/interview_status/<job_id>')
+async def interview_status(job_id):
+    job = await assessment_workers.get(job_id)
+    if job is None:
+        return jsonify({"message": "Unknown assessment job."}), 404
+    return jsonify({
+        "job_id": job_id,
+        "status": job["status"], # queued | assessing | delivering | completed | failed | delivery_failed
+        "result": job["result"],
+        "error": job["error"],
+    })
+
+def buffer_uploaded_audio(audio_file):
+    # Buffer the upload in memory; only recordings above the threshold spill to disk.
+    # Returns the bytes, or the path of the spilled temp file.
+    audio_buffer = io.BytesIO()
+    while True:
+        chunk = audio_file.stream.read(64 * 1024)
+        if not chunk:
+            break
+        audio_buffer.write(chunk)
+        if audio_buffer.tell() > AUDIO_SPILL_THRESHOLD_BYTES:
+            return spill_upload(audio_buffer, audio_file.stream)
+    return audio_buffer.getvalue()
+
+def spill_upload(audio_buffer, remaining_stream):
+    # Per-request unique path so concurrent large uploads never overwrite each other
+    spill_file = tempfile.NamedTemporaryFile(prefix="upload_", suffix=".audio", delete=False)
+    try:
+        with spill_file:
+            spill_file.write(audio_buffer.getbuffer())
+            shutil.copyfileobj(remaining_stream, spill_file)
+    except BaseException:
+        os.remove(spill_file.name)
+        raise
+    log.info("Upload exceeded %d bytes, spilled to %s", AUDIO_SPILL_THRESHOLD_BYTES, spill_file.name)
+    return spill_file.name
+
+async def transcribe_uploaded_audio(audio_file):
+    audio_source = await run_audio_task(buffer_uploaded_audio, audio_file)
+    try:
+        return await speech_to_text.transcribe(audio_source)
+    finally:
+        if isinstance(audio_source, str) and os.path.exists(audio_source):
+            os.remove(audio_source)
+
 @app.route('/upload_audio', methods=['POST'])
 async def upload_audio():
-    if 'audio_file' not in request.files:
+    files = await request.files
+    if 'audio_file' not in files:
         return jsonify({"user_text": None, "error": "No audio file provided"}), 400
     
-    audio_file = request.files['audio_file']
+    audio_file = files['audio_file']
     if audio_file.filename == '':
         return jsonify({"user_text": None, "error": "No selected file"}), 400
 
     if audio_file:
-        # Save the incoming raw audio file
-        audio_file.save(USER_AUDIO_FILE_PATH_RAW)
-        user_text = transcribe_audio_file(USER_AUDIO_FILE_PATH_RAW)
-        
-        # Clean up both temporary files
-        if os.path.exists(USER_AUDIO_FILE_PATH_RAW):
-            os.remove(USER_AUDIO_FILE_PATH_RAW)
-        if os.path.exists(USER_AUDIO_FILE_PATH_WAV):
-            os.remove(USER_AUDIO_FILE_PATH_WAV) # Remove the converted WAV too
-
+        user_text = await transcribe_uploaded_audio(audio_file)
         if user_text:
             return jsonify({"user_text": user_text})
     return jsonify({"user_text": None, "error": "Failed to process audio"}), 500
 
+# --- Streaming uploads ---
+# The page posts recorder chunks to /audio_chunk while the candidate speaks and
+# finishes the turn with {"stream_id": ...} instead of uploading the recording.
+async def recognize_partial(stream, on_partial_text=None):
+    async with stream.lock:
+        text, consumed = await speech_to_text.transcribe_segment(stream.pending_pcm(), final=False)
+        if consumed:
+            stream.committed += consumed
+            if text:
+                stream.texts.append(text)
+                if on_partial_text is not None:
+                    await on_partial_text(stream.partial_text)
+
+def schedule_partial_recognition(stream, on_partial_text=None):
+    # Every few chunks, recognize what has been said so far unless a pass is still running
+    if stream.chunks_since_partial >= STREAM_PARTIAL_EVERY_CHUNKS and (stream.partial_task is None or stream.partial_task.done()):
+        stream.chunks_since_partial = 0
+        stream.partial_task = asyncio.create_task(recognize_partial(stream, on_partial_text))
+
+async def finish_upload_stream(session_id, stream_id):
+    stream = upload_streams.pop(session_id, stream_id)
+    if stream is None:
+        log.warning("Upload stream %s is unknown to this worker", stream_id)
+        return None
+    # Closing in finally reaps the ffmpeg decoder even if the turn is cancelled or transcription raises
+    try:
+        if stream.partial_task is not None:
+            await asyncio.wait([stream.partial_task])
+        if await stream.decoder.finish():
+            async with stream.lock:
+                text, _ = await speech_to_text.transcribe_segment(stream.pending_pcm(), final=True)
+            if text:
+                stream.texts.append(text)
+        else:
+            log.error("Could not decode streamed answer: %s", stream.decoder.error)
+    finally:
+        stream.close()
+    log.info("Streamed answer transcribed", extra=fields(bytes=stream.bytes_received, chunks=stream.next_seq, segments=len(stream.texts), chars=len(stream.partial_text)))
+    log.debug("Candidate said", extra=fields(text=stream.partial_text))
+    return stream.partial_text or None
+
+@app.route('/audio_chunk', methods=['POST'])
+async def audio_chunk():
+    session_id = await get_request_session_id()
+    if await session_store.get(session_id) is None:
+        return session_not_found_response()
+    stream_id = request.args.get('stream')
+    seq = request.args.get('seq', type=int)
+    if not stream_id or seq is None:
+        return jsonify({"error": "stream and seq are required"}), 400
+
+    try:
+        stream = await upload_streams.append(session_id, stream_id, seq, await request.get_data())
+    except UploadStreamError as e:
+        return jsonify({"error": str(e)}), e.status
+
+    schedule_partial_recognition(stream)
+    return jsonify({"received": seq, "partial_text": stream.partial_text})
+
+async def transcribe_turn_audio(session_id):
+    # The answer is one multipart upload, or JSON {"stream_id": ...} closing a streamed upload.
+    # Returns (user_text, None) or (None, error response).
+    if request.is_json:
+        stream_id = ((await request.get_json()) or {}).get('stream_id')
+        if not stream_id:
+            return None, (jsonify({"user_text": None, "error": "No audio file provided"}), 400)
+        user_text = await finish_upload_stream(session_id, stream_id)
+    else:
+        audio_file = (await request.files).get('audio_file')
+        if audio_file is None or audio_file.filename == '':
+            return None, (jsonify({"user_text": None, "error": "No audio file provided"}), 400)
+        user_text = await transcribe_uploaded_audio(audio_file)
+    if not user_text:
+        return None, (jsonify({"user_text": None, "error": "Failed to process audio"}), 500)
+    return user_text, None
+
+# Fused conversational turn: transcription, both transcript writes, Gemini and TTS
+# in a single request instead of the page chaining five calls plus an audio GET.
+@app.route('/turn', methods=['POST'])
+async def turn():
+    session_id = await get_request_session_id()
+    session = await session_store.get(session_id)
+    if session is None:
+        return session_not_found_response()
+
+    user_text, error_response = await transcribe_turn_audio(session_id)
+    if error_response:
+        return error_response
+    await session_store.append_transcript(session_id, 'user', user_text)
+
+    ai_response_text = await get_interview_reply(session_id, session, user_text)
+    await session_store.append_transcript(session_id, 'ai', ai_response_text)
+
+    audio_url = await prepare_tts_audio(ai_response_text)
+
+    return jsonify({"user_text": user_text, "ai_response_text": ai_response_text, "audio_url": audio_url})
+
+async def interview_reply_events(session_id, prompt_text, reply_plan, record_transcript=True):
+    # The reply as it is generated: {"type": "token", "text": ...} per Gemini chunk,
+    # {"type": "sentence", "index": n, "text": ..., "audio_id": ...} once a sentence is
+    # complete (its TTS already started), then a "done" or "error" event.
+    sentences = SentenceBuffer()
+    reply_parts = []
+    index = 0
+    try:
+        async for text in stream_gemini_response(prompt_text, *reply_plan):
+            reply_parts.append(text)
+            yield {"type": "token", "text": text}
+            for sentence in sentences.feed(text):
+                yield {"type": "sentence", "index": index, "text": sentence, "audio_id": await prepare_tts_audio_id(sentence, prefetch=True)}
+                index += 1
+        for sentence in sentences.flush():
+            yield {"type": "sentence", "index": index, "text": sentence, "audio_id": await prepare_tts_audio_id(sentence, prefetch=True)}
+            index += 1
+        if not reply_parts:
+            yield {"type": "error", "message": "No AI response received."}
+        else:
+            yield {"type": "done", "ai_response_text": "".join(reply_parts)}
+    except httpx.HTTPError as e:
+        log.error("Error streaming from Gemini API: %s", e)
+        yield {"type": "error", "message": "I'm sorry, I'm having trouble connecting to the AI."}
+    finally:
+        # Record whatever was said, even if the client went away mid-reply
+        if reply_parts and record_transcript:
+            await session_store.append_transcript(session_id, 'ai', "".join(reply_parts))
+
+# --- Greeting prefetch ---
+# /select_interview already knows everything the opening question depends on,
+# so it starts generating the greeting (and synthesizing its sentences) right
+# away; see reply_prefetch.py. Instruction turns for the same prompt attach to
+# that reply, finished or still in flight, instead of calling Gemini again.
+async def prefetched_reply_events(session_id, prompt_text):
+    trace = metrics.start_trace("greeting_prefetch", session_id)
+    session = await session_store.get(session_id)
+    if session is None:
+        return
+    # The reply is recorded in the transcript when it is claimed, not here
+    async for reply_event in interview_reply_events(session_id, prompt_text, plan_interview_reply(session_id, session, prompt_text), record_transcript=False):
+        yield reply_event
+    log.info("Stage timings", extra=fields(stages=trace.summary()))
+
+async def instruction_reply_events(session_id, session, prompt_text):
+    # Events for an instruction turn (e.g. the greeting), from the prefetch if there is one
+    requested = time.perf_counter()
+    prefetched = reply_prefetches.claim(session_id, prompt_text)
+    if prefetched is not None:
+        log.info("Greeting attached to prefetched reply", extra=fields(ready=prefetched.finished))
+        reply_events = prefetched.replay()
+    else:
+        reply_events = interview_reply_events(session_id, prompt_text, plan_interview_reply(session_id, session, prompt_text))
+    first_audio_id = None
+    async for reply_event in reply_events:
+        if first_audio_id is None and reply_event["type"] == "sentence" and reply_event["audio_id"]:
+            first_audio_id = reply_event["audio_id"]
+            if prompt_text == GREETING_PROMPT:
+                app.add_background_task(observe_greeting_first_audio, first_audio_id, requested, "hit" if prefetched else "miss")
+        yield reply_event
+
+async def observe_greeting_first_audio(audio_id, requested, prefetch):
+    # Time to first audio as the server sees it: the first sentence's bytes are ready to send
+    entry = audio_ring.get(audio_id)
+    if entry is None:
+        return
+    try:
+        await asyncio.wait_for(entry.wait(), TTS_STREAM_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        return
+    if entry.data:
+        metrics.greeting_first_audio_seconds.observe(time.perf_counter() - requested, prefetch=prefetch)
+
+# Streaming turn: the reply is generated with streamGenerateContent, cut into
+# sentences as tokens arrive and each sentence is sent to TTS immediately.
+# The response is NDJSON, one event per line:
+#   {"type": "user_text", "text": ...}
+#   {"type": "sentence", "index": n, "text": ..., "audio_url": ...}
+#   {"type": "done", "ai_response_text": ...}   or   {"type": "error", "message": ...}
+# Accepts the recorded audio (multipart) or a JSON {"prompt": ...} instruction,
+# e.g. the opening greeting, which is not recorded as a user turn.
+@app.route('/turn_stream', methods=['POST'])
+async def turn_stream():
+    session_id = await get_request_session_id()
+    session = await session_store.get(session_id)
+    if session is None:
+        return session_not_found_response()
+
+    prompt_text = ((await request.get_json()) or {}).get('prompt') if request.is_json else None
+    if prompt_text:
+        user_text = None
+    else:
+        user_text, error_response = await transcribe_turn_audio(session_id)
+        if error_response:
+            return error_response
+        await session_store.append_transcript(session_id, 'user', user_text)
+        prompt_text = user_text
+
+    reply_events = interview_reply_events(session_id, prompt_text, plan_interview_reply(session_id, session, prompt_text)) if user_text \
+        else instruction_reply_events(session_id, session, prompt_text)
+
+    async def events():
+        def event(payload):
+            return json.dumps(payload) + "\n"
+
+        if user_text:
+            yield event({"type": "user_text", "text": user_text})
+        async for reply_event in reply_events:
+            if reply_event["type"] == "token":
+                continue
+            if reply_event["type"] == "sentence":
+                audio_id = reply_event.pop("audio_id")
+                reply_event["audio_url"] = f"/audio/{audio_id}" if audio_id else None
+            yield event(reply_event)
+
+    return Response(events(), mimetype="application/x-ndjson", headers={"Cache-Control": "no-store"})
+
+# --- Session socket ---
+# The interview page keeps one WebSocket open at /ws?sessionId=... for the whole
+# interview (see session_channel.py for the framing). Client messages:
+#   {"type": "prompt", "text": ...}    instruction turn, e.g. the opening greeting
+#   {"type": "start_answer"}           followed by the recorder's chunks as binary frames
+#   {"type": "end_answer"}             recording stopped; transcribe and reply
+# Server events: status, partial_text, user_text, token, sentence, the audio
+# frames of each sentence, then done or error. Any other failure makes the
+# page fall back to the HTTP endpoints.
+class SocketAnswer:
+    def __init__(self):
+        self.stream_id = secrets.token_urlsafe(8)
+        self.seq = 0
+        self.rejected = False
+
+async def send_sentence_audio(channel, audio_queue):
+    # Sentences are synthesized in parallel but sent in order
+    while True:
+        item = await audio_queue.get()
+        if item is None:
+            return
+        index, audio_id = item
+        entry = audio_ring.get(audio_id) if audio_id else None
+        if entry is not None:
+            try:
+                await asyncio.wait_for(entry.wait(), TTS_STREAM_WAIT_SECONDS)
+            except asyncio.TimeoutError:
+                pass
+        if entry is None or not entry.data:
+            await channel.event({"type": "audio_error", "index": index})
+            continue
+        await channel.audio(index, entry.data, entry.mimetype)
+
+async def run_socket_turn(channel, session_id, prompt_text=None, stream_id=None):
+    trace = metrics.start_trace("/ws", session_id) # One trace per turn, not per socket
+    session = await session_store.get(session_id)
+    if session is None:
+        await channel.event({"type": "error", "code": "session_not_found", "message": "Unknown or expired interview session."})
+        return
+    user_text = None
+    if prompt_text is None:
+        await channel.event({"type": "status", "state": "transcribing"})
+        user_text = await finish_upload_stream(session_id, stream_id) if stream_id else None
+        if not user_text:
+            await channel.event({"type": "error", "code": "no_speech", "message": "Failed to process audio"})
+            return
+        await session_store.append_transcript(session_id, 'user', user_text)
+        await channel.event({"type": "user_text", "text": user_text})
+        prompt_text = user_text
+
+    await channel.event({"type": "status", "state": "thinking"})
+    audio_queue = asyncio.Queue()
+    sender = asyncio.create_task(send_sentence_audio(channel, audio_queue))
+    final_event = {"type": "error", "message": "No AI response received."}
+    try:
+        reply_events = interview_reply_events(session_id, prompt_text, plan_interview_reply(session_id, session, prompt_text)) if user_text \
+            else instruction_reply_events(session_id, session, prompt_text)
+        async for reply_event in reply_events:
+            if reply_event["type"] == "sentence":
+                await channel.event({"type": "sentence", "index": reply_event["index"], "text": reply_event["text"]})
+                await audio_queue.put((reply_event["index"], reply_event["audio_id"]))
+            elif reply_event["type"] in ("done", "error"):
+                final_event = reply_event
+            else:
+                await channel.event(reply_event)
+        await audio_queue.put(None)
+        await sender
+    except BaseException:
+        sender.cancel()
+        raise
+    # Sent after the last audio frame, so the page knows the turn is complete
+    await channel.event(final_event)
+    log.info("Stage timings", extra=fields(stages=trace.summary()))
+
+@app.websocket('/ws')
+async def session_socket():
+    session_id = websocket.args.get('sessionId')
+    await websocket.accept()
+    if await session_store.get(session_id) is None:
+        await websocket.send(json.dumps({"type": "error", "code": "session_not_found", "message": "Unknown or expired interview session."}))
+        await websocket.close(4404)
+        return
+
+    channel = SessionChannel(websocket.send, frame_size=TTS_STREAM_CHUNK_SIZE)
+    channel.start()
+    answer = None
+    turn_task = None
+
+    async def push_partial_text(text):
+        await channel.event({"type": "partial_text", "text": text})
+
+    def start_turn(**kwargs):
+        nonlocal turn_task
+        turn_task = asyncio.create_task(run_socket_turn(channel, session_id, **kwargs))
+
+    try:
+        while True:
+            message = await websocket.receive()
+            if isinstance(message, bytes):
+                if answer is None or answer.rejected:
+                    continue
+                try:
+                    stream = await upload_streams.append(session_id, answer.stream_id, answer.seq, message)
+                except UploadStreamError as e:
+                    answer.rejected = True
+                    await channel.event({"type": "error", "code": "upload_rejected", "message": str(e)})
+                    continue
+                answer.seq += 1
+                schedule_partial_recognition(stream, push_partial_text)
+                continue
+
+            try:
+                command = json.loads(message)
+            except json.JSONDecodeError:
+                await channel.event({"type": "error", "code": "bad_message", "message": "Messages must be JSON"})
+                continue
+            kind = command.get("type")
+            if kind == "start_answer":
+                answer = SocketAnswer()
+            elif kind in ("end_answer", "prompt"):
+                if turn_task is not None and not turn_task.done():
+                    await channel.event({"type": "error", "code": "busy", "message": "A turn is already in progress"})
+                elif kind == "prompt":
+                    if command.get("text"):
+                        start_turn(prompt_text=command["text"])
+                    else:
+                        await channel.event({"type": "error", "code": "bad_message", "message": "prompt needs text"})
+                else:
+                    start_turn(stream_id=answer.stream_id if answer and not answer.rejected else None)
+                    answer = None
+            else:
+                await channel.event({"type": "error", "code": "bad_message", "message": f"Unknown message type {kind!r}"})
+    finally:
+        # Client disconnected
+        if turn_task is not None:
+            turn_task.cancel()
+        if answer is not None:
+            upload_streams.discard(session_id, answer.stream_id)
+        channel.abort()
+
 @app.route('/get_ai_response', methods=['POST'])
 async def get_ai_response_route():
-    data = request.json
+    data = await request.get_json()
     prompt_text = data.get('prompt')
     if prompt_text:
-        ai_response_text = await get_gemini_response(prompt_text)
+        session_id = await get_request_session_id()
+        session = await session_store.get(session_id)
+        if session is None:
+            return session_not_found_response()
+        ai_response_text = await get_interview_reply(session_id, session, prompt_text)
         return jsonify({"ai_response_text": ai_response_text})
     return jsonify({"ai_response_text": None}), 400
 
 @app.route('/play_audio', methods=['POST'])
-def play_audio_route():
-    data = request.json
+async def play_audio_route():
+    data = await request.get_json()
     text_to_synthesize = data.get('text')
     if text_to_synthesize:
-        audio_file = synthesize_merf_ai(text_to_synthesize, MERF_AI_API_KEY)
-        if audio_file:
-            return jsonify({"audio_url": f"/audio/{os.path.basename(audio_file)}"})
+        audio_url = await prepare_tts_audio(text_to_synthesize)
+        if audio_url:
+            return jsonify({"audio_url": audio_url})
     return jsonify({"audio_url": None}), 400
 
-@app.route('/audio/<filename>')
-def serve_audio(filename):
-    if filename == os.path.basename(AUDIO_FILE_PATH):
-        return send_file(AUDIO_FILE_PATH, mimetype="audio/wav")
-    return "File not found", 404
+@app.route('/audio/<audio_id>')
+async def serve_audio(audio_id):
+    entry = audio_ring.get(audio_id)
+    if entry is None:
+        return "File not found", 404
 
-def run_flask_app():
+    if not entry.done.is_set() and audio_ring.claim(audio_id):
+        streamed_response = await stream_tts_audio(audio_id, entry)
+        if streamed_response is None:
+            return "Failed to synthesize audio", 502
+        return streamed_response
+
+    # Already buffered, or another request is streaming it right now
+    try:
+        await asyncio.wait_for(entry.wait(), TTS_STREAM_WAIT_SECONDS)
+    except asyncio.TimeoutError:
+        return "Audio not ready", 504
+    if entry.data:
+        return Response(entry.data, mimetype=entry.mimetype, headers={"Cache-Control": "no-store"})
+    return "Failed to synthesize audio", 502
+
+@app.route('/metrics')
+async def metrics_endpoint():
+    # Collectors run synchronously, so the session count (a query on SQLite) is awaited here instead
+    sessions = metrics.snapshot_lines("interview_sessions", "gauge", "Interview sessions currently stored.", await session_store.count())
+    return Response(metrics.render() + "\n".join(sessions) + "\n", mimetype="text/plain; version=0.0.4", headers={"Cache-Control": "no-store"})
+
+def collect_component_metrics():
+    stt = speech_to_text.stats()
+    tts = tts_cache.stats()
+    return (
+        metrics.snapshot_lines("interview_stt_transcriptions", "gauge", "Transcriptions waiting for or holding an STT slot.", {(("state", "queued"),): stt["queued"], (("state", "active"),): stt["active"]})
+        + metrics.snapshot_lines("interview_stt_audio_seconds_total", "counter", "Seconds of recorded audio decoded, and of silence trimmed from it.", {(("kind", "recorded"),): stt["audio_seconds"], (("kind", "trimmed"),): stt["trimmed_seconds"]})
+        + metrics.snapshot_lines("interview_tts_cache_bytes", "gauge", "Bytes held by the TTS cache, by tier.", {(("tier", "memory"),): tts["memory_bytes"], (("tier", "disk"),): tts["disk_bytes"]})
+        + metrics.snapshot_lines("interview_upload_streams", "gauge", "Answers being uploaded while recorded (this process).", len(upload_streams))
+        + metrics.snapshot_lines("interview_catalog_interviews", "gauge", "Interviews in the current catalog snapshot.", len(interview_catalog.snapshot))
+        + metrics.snapshot_lines("interview_reply_prefetches", "gauge", "Prefetched greetings waiting to be claimed (this process).", len(reply_prefetches))
+    )
+
+metrics.add_collector(collect_component_metrics)
+metrics.add_collector(upstream_admission.collect_metrics)
+
+@app.route('/stt_stats')
+async def stt_stats():
+    return jsonify(speech_to_text.stats())
+
+@app.route('/tts_cache_stats')
+async def tts_cache_stats():
+    return jsonify(tts_cache.stats())
+
+def run_app():
+    # Development server. In production serve the ASGI app with e.g.
+    #   uvicorn main:app --host 0.0.0.0 --port 5004
+    # in a single worker process, or behind sticky routing per interview: audio ids,
+    # streamed uploads, greeting prefetches and compactions are per process.
     app.run(host=HOST, port=PORT, debug=False, use_reloader=False)
 
 if __name__ == "__main__":
-    print(f"Opening browser at {FRONTEND_URL}")
+    create_services()
+    log.info("Frontend is at %s", FRONTEND_URL)
     import webbrowser
-    run_flask_app()
+    run_app()
@@ -0,0 +1,180 @@
+import contextvars
+import re
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+
+
+# --- Stage Timing and Prometheus Metrics ---
+# A turn passes through STT (queue, ffmpeg decode, recognition), Gemini, Murf
+# (generation, audio download) and, at the end, the Node.js POST. span(stage)
+# times one of those stages; the duration goes into the stage histogram,
+# labelled with the route that caused it, and onto the current request's trace
+# so it can be returned as a Server-Timing header next to X-Trace-Id.
+# Counters cover upstream errors, retries and cache hits; render() produces the
+# Prometheus text format for /metrics. Metrics are per process: with several
+# uvicorn workers, scrape each one or run a single worker per port.
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60)
+TRACE_ID_PATTERN = re.compile(r"^[A-Za-z0-9_.-]{1,64}$")
+
+
+class Trace:
+    def __init__(self, route, session_id=None, trace_id=None):
+        self.trace_id = trace_id if trace_id and TRACE_ID_PATTERN.match(trace_id) else secrets.token_hex(8)
+        self.route = route
+        self.session_id = session_id
+        self.started = time.perf_counter()
+        self.spans = [] # (stage, seconds), in completion order
+
+    def server_timing(self):
+        # Server-Timing: stt_decode;dur=120.5, gemini;dur=830.1
+        return ", ".join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in self.spans)
+
+    def summary(self):
+        # stt_decode=120.5ms gemini=830.1ms; the log record carries the trace id and session
+        return " ".join(f"{stage}={seconds * 1000:.1f}ms" for stage, seconds in self.spans)
+
+
+_current_trace = contextvars.ContextVar("trace", default=None)
+
+
+def start_trace(route, session_id=None, trace_id=None):
+    # Background tasks started afterwards inherit the trace through their context
+    trace = Trace(route, session_id, trace_id)
+    _current_trace.set(trace)
+    return trace
+
+
+def current_trace():
+    return _current_trace.get()
+
+
+def _label_key(labels):
+    return tuple(sorted(labels.items()))
+
+
+def _format_labels(key, extra=()):
+    pairs = list(key) + list(extra)
+    if not pairs:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for _, value in pairs)
+    return "{" + ",".join(f'{name}="{value}"' for (name, _), value in zip(pairs, escaped)) + "}"
+
+
+def _format_value(value):
+    return repr(float(value)) if value != int(value) else str(int(value))
+
+
+class Counter:
+    def __init__(self, name, help_text):
+        self.name = name
+        self.help = help_text
+        self._values = {}
+
+    def inc(self, amount=1, **labels):
+        key = _label_key(labels)
+        with _lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        lines += [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in sorted(self._values.items())]
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help_text, buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = buckets
+        self._series = {} # label key -> [bucket counts..., count, sum]
+
+    def observe(self, value, **labels):
+        key = _label_key(labels)
+        with _lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            for n, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[n] += 1
+            series[-2] += 1
+            series[-1] += value
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        for key, series in sorted(self._series.items()):
+            for bound, count in zip(self.buckets, series):
+                lines.append(f"{self.name}_bucket{_format_labels(key, [('le', bound)])} {count}")
+            lines.append(f"{self.name}_bucket{_format_labels(key, [('le', '+Inf')])} {series[-2]}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {series[-2]}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {series[-1]:.6f}")
+        return lines
+
+
+_lock = threading.Lock()
+_metrics = []
+_collectors = [] # callables returning extra exposition lines at scrape time
+
+
+def counter(name, help_text):
+    metric = Counter(name, help_text)
+    _metrics.append(metric)
+    return metric
+
+
+def histogram(name, help_text, buckets=DEFAULT_BUCKETS):
+    metric = Histogram(name, help_text, buckets)
+    _metrics.append(metric)
+    return metric
+
+
+def add_collector(collect):
+    _collectors.append(collect)
+
+
+def snapshot_lines(name, metric_type, help_text, values):
+    # For collectors: values is {label tuple: number} or a single number
+    lines = [f"# HELP {name} {help_text}", f"# TYPE {name} {metric_type}"]
+    if not isinstance(values, dict):
+        values = {(): values}
+    lines += [f"{name}{_format_labels(key)} {_format_value(value)}" for key, value in sorted(values.items()) if value is not None]
+    return lines
+
+
+def render():
+    with _lock:
+        lines = [line for metric in _metrics for line in metric.render()]
+    for collect in _collectors:
+        lines += collect()
+    return "\n".join(lines) + "\n"
+
+
+stage_seconds = histogram("interview_stage_seconds", "Duration of one processing stage of a request.")
+http_request_seconds = histogram("interview_http_request_seconds", "Time until the response headers were ready.")
+upstream_request_seconds = histogram("interview_upstream_request_seconds", "Upstream HTTP calls, until the response headers arrived.")
+upstream_errors = counter("interview_upstream_errors_total", "Upstream calls that failed, by upstream and kind (transport or HTTP status class).")
+upstream_queue_seconds = histogram("interview_upstream_queue_seconds", "Time upstream calls waited for admission, by upstream and priority.")
+upstream_shed = counter("interview_upstream_shed_total", "Upstream calls rejected by admission control, by upstream, priority and reason.")
+retries = counter("interview_retries_total", "Operations retried, by operation.")
+cache_requests = counter("interview_cache_requests_total", "Cache lookups, by cache and result (hit or miss).")
+prefetches = counter("interview_reply_prefetches_total", "Speculatively generated replies, by outcome (claimed, expired, replaced or discarded).")
+greeting_first_audio_seconds = histogram("interview_greeting_first_audio_seconds", "Greeting requested until the audio of its first sentence was ready, by prefetch (hit or miss).")
+
+
+def record_stage(stage, seconds):
+    trace = _current_trace.get()
+    stage_seconds.observe(seconds, stage=stage, route=trace.route if trace else "background")
+    if trace is not None:
+        trace.spans.append((stage, seconds))
+
+
+@contextmanager
+def span(stage):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        record_stage(stage, time.perf_counter() - started)
@@ -0,0 +1,118 @@
+import gzip
+import hashlib
+import os
+import time
+from email.utils import formatdate, parsedate_to_datetime
+
+try:
+    import brotli # Optional: only gzip variants are built without it
+except ImportError:
+    brotli = None
+
+
+# --- Precompressed Static Bodies ---
+# Pages and assets that are identical for every visitor are rendered once and
+# kept as ready-to-send bytes in every encoding the client may accept, with a
+# strong ETag per encoding and a Last-Modified date. A request then costs a
+# header lookup: either 304 Not Modified or a copy-free write of cached bytes.
+
+ENCODING_PREFERENCE = ("br", "gzip") # Tried in this order, identity is the fallback
+
+
+def _accepted_encodings(accept_encoding):
+    accepted = set()
+    for item in (accept_encoding or "").split(","):
+        token, _, params = item.strip().partition(";")
+        params = params.replace(" ", "")
+        if token and params not in ("q=0", "q=0.0", "q=0.00", "q=0.000"):
+            accepted.add(token.lower())
+    return accepted
+
+
+class PrecompressedAsset:
+    def __init__(self, body, content_type, last_modified=None):
+        if isinstance(body, str):
+            body = body.encode("utf-8")
+        self.content_type = content_type
+        self.variants = {"identity": body, "gzip": gzip.compress(body, compresslevel=9, mtime=0)}
+        if brotli is not None:
+            self.variants["br"] = brotli.compress(body, quality=11)
+        self.digest = hashlib.sha256(body).hexdigest()[:32]
+        self.etags = {
+            encoding: f'"{self.digest}"' if encoding == "identity" else f'"{self.digest}-{encoding}"'
+            for encoding in self.variants
+        }
+        self.modified_at = int(last_modified or time.time())
+        self.last_modified = formatdate(self.modified_at, usegmt=True)
+
+    def choose_encoding(self, accept_encoding):
+        accepted = _accepted_encodings(accept_encoding)
+        for encoding in ENCODING_PREFERENCE:
+            if encoding in self.variants and (encoding in accepted or "*" in accepted):
+                return encoding
+        return "identity"
+
+    def not_modified(self, if_none_match, if_modified_since):
+        # If-None-Match wins over If-Modified-Since when both are sent
+        if if_none_match:
+            tags = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+            return "*" in tags or bool(tags & set(self.etags.values()))
+        if if_modified_since:
+            try:
+                return parsedate_to_datetime(if_modified_since).timestamp() >= self.modified_at
+            except (TypeError, ValueError):
+                return False
+        return False
+
+    def respond(self, request_headers, cache_control):
+        """Return (status, body, headers) for a GET/HEAD of this asset."""
+        encoding = self.choose_encoding(request_headers.get("Accept-Encoding"))
+        headers = {
+            "Content-Type": self.content_type,
+            "Cache-Control": cache_control,
+            "ETag": self.etags[encoding],
+            "Last-Modified": self.last_modified,
+            "Vary": "Accept-Encoding",
+        }
+        if self.not_modified(request_headers.get("If-None-Match"), request_headers.get("If-Modified-Since")):
+            return 304, b"", headers
+        if encoding != "identity":
+            headers["Content-Encoding"] = encoding
+        return 200, self.variants[encoding], headers
+
+
+class VersionedAssets:
+    """Files of a directory served under content-hashed names, e.g. app.js -> app.3f2a9c1b0d4e.js.
+
+    A changed file gets a new name, so responses can be cached as immutable.
+    """
+
+    CONTENT_TYPES = {
+        ".css": "text/css; charset=utf-8",
+        ".js": "text/javascript; charset=utf-8",
+    }
+
+    def __init__(self, directory, url_prefix):
+        self.directory = directory
+        self.url_prefix = url_prefix.rstrip("/")
+        self._assets = {} # versioned name -> PrecompressedAsset
+        self._names = {} # file name -> versioned name
+        self.load()
+
+    def load(self):
+        for name in sorted(os.listdir(self.directory)):
+            stem, ext = os.path.splitext(name)
+            if ext not in self.CONTENT_TYPES:
+                continue
+            path = os.path.join(self.directory, name)
+            with open(path, "rb") as f:
+                asset = PrecompressedAsset(f.read(), self.CONTENT_TYPES[ext], os.path.getmtime(path))
+            versioned = f"{stem}.{asset.digest[:12]}{ext}"
+            self._assets[versioned] = asset
+            self._names[name] = versioned
+
+    def url(self, name):
+        return f"{self.url_prefix}/{self._names[name]}"
+
+    def get(self, versioned_name):
+        return self._assets.get(versioned_name)
@@ -0,0 +1,116 @@
+import asyncio
+import logging
+import time
+
+import metrics
+
+log = logging.getLogger(__name__)
+
+
+# --- Speculative Reply Prefetch ---
+# The opening question does not depend on anything the candidate says, so it
+# can be generated (and its sentences synthesized) while the browser is still
+# loading the interview page. start() runs the reply's event stream in a
+# background task and buffers the events; when the page then asks for the same
+# prompt, claim() hands over the entry and replay() yields the buffered events
+# followed by the live ones, exactly as if the turn had started just now.
+# The reply only enters the transcript once it has been claimed, so a page
+# that never asks (or falls back to another path) leaves no trace of it.
+# Entries live in the memory of the worker process that received
+# /select_interview; a request landing on another worker generates normally.
+
+class PrefetchedReply:
+    def __init__(self, session_id, prompt_text):
+        self.session_id = session_id
+        self.prompt_text = prompt_text
+        self.created_at = time.time()
+        self.events = []
+        self.reply_text = None
+        self.finished = False
+        self.claimed = False
+        self.task = None
+        self._changed = asyncio.Event()
+
+    def add(self, event):
+        self.events.append(event)
+        if event["type"] == "done":
+            self.reply_text = event["ai_response_text"]
+        self._changed.set()
+
+    def finish(self):
+        self.finished = True
+        self._changed.set()
+
+    async def replay(self):
+        # Single consumer: whoever claimed the entry
+        sent = 0
+        while True:
+            self._changed.clear()
+            while sent < len(self.events):
+                yield self.events[sent]
+                sent += 1
+            if self.finished:
+                return
+            await self._changed.wait()
+
+
+class ReplyPrefetches:
+    def __init__(self, ttl_seconds, record_reply):
+        self.ttl_seconds = ttl_seconds
+        self.record_reply = record_reply # (session_id, text), called once a claimed reply is complete
+        self._entries = {} # session id -> PrefetchedReply
+
+    def _expire(self, now):
+        for session_id, entry in list(self._entries.items()):
+            if now - entry.created_at > self.ttl_seconds:
+                self._discard(session_id, "expired")
+
+    def _discard(self, session_id, result):
+        entry = self._entries.pop(session_id, None)
+        if entry is not None:
+            entry.task.cancel()
+            metrics.prefetches.inc(result=result)
+
+    def start(self, session_id, prompt_text, events):
+        """Consume the async generator `events` in the background for a later claim()."""
+        self._expire(time.time())
+        self._discard(session_id, "replaced")
+        entry = PrefetchedReply(session_id, prompt_text)
+        entry.task = asyncio.create_task(self._fill(entry, events))
+        self._entries[session_id] = entry
+
+    async def _fill(self, entry, events):
+        try:
+            async for event in events:
+                entry.add(event)
+        except Exception:
+            log.exception("Reply prefetch failed")
+            entry.add({"type": "error", "message": "I'm sorry, I'm having trouble connecting to the AI."})
+        finally:
+            await events.aclose()
+            entry.finish()
+            if entry.claimed:
+                self._record(entry)
+
+    def _record(self, entry):
+        if entry.reply_text:
+            self.record_reply(entry.session_id, entry.reply_text)
+
+    def claim(self, session_id, prompt_text):
+        """Take the prefetched reply for this prompt, or None if there is none to attach to."""
+        self._expire(time.time())
+        entry = self._entries.get(session_id)
+        if entry is None or entry.prompt_text != prompt_text:
+            return None
+        del self._entries[session_id]
+        entry.claimed = True
+        metrics.prefetches.inc(result="claimed")
+        if entry.finished:
+            self._record(entry)
+        return entry
+
+    def discard(self, session_id):
+        self._discard(session_id, "discarded")
+
+    def __len__(self):
+        return len(self._entries)
@@ -0,0 +1,60 @@
+import asyncio
+import json
+import logging
+
+log = logging.getLogger(__name__)
+
+
+# --- Duplex Session Channel ---
+# One WebSocket per interview page carries the whole conversation. Upstream:
+# JSON control messages and binary audio chunks of the answer being recorded.
+# Downstream: JSON events (status, partial transcript, AI text tokens, ...) and
+# synthesized audio as binary frames, bracketed per sentence:
+#   {"type": "audio_start", "index": n, "mimetype": ...}, <binary>..., {"type": "audio_end", "index": n}
+# Binary frames always belong to the most recent audio_start. Several tasks
+# produce events for one socket, so everything goes through a single writer
+# and a sentence's frames are never interleaved with another sentence's.
+
+class SessionChannel:
+    def __init__(self, send, frame_size=8192, max_queued=256):
+        self._send = send
+        self.frame_size = frame_size
+        self._outbox = asyncio.Queue(maxsize=max_queued) # Bounded, so a slow client slows its producers down
+        self._audio_lock = asyncio.Lock()
+        self._writer = None
+        self.closed = False
+
+    def start(self):
+        self._writer = asyncio.create_task(self._write_loop())
+
+    async def _write_loop(self):
+        try:
+            while True:
+                await self._send(await self._outbox.get())
+        except Exception as e:
+            # The peer went away; producers notice through `closed`
+            log.warning("Session channel write failed: %s", e)
+        finally:
+            self.closed = True
+            while not self._outbox.empty(): # Release producers blocked on a full outbox
+                self._outbox.get_nowait()
+
+    async def _put(self, message):
+        if not self.closed:
+            await self._outbox.put(message)
+
+    async def event(self, payload):
+        await self._put(json.dumps(payload))
+
+    async def audio(self, index, data, mimetype):
+        async with self._audio_lock:
+            await self.event({"type": "audio_start", "index": index, "mimetype": mimetype})
+            for start in range(0, len(data), self.frame_size):
+                await self._put(bytes(data[start:start + self.frame_size]))
+            await self.event({"type": "audio_end", "index": index})
+
+    def abort(self):
+        # The socket is gone; queued messages are dropped
+        self.closed = True
+        if self._writer is not None:
+            self._writer.cancel()
@@ -0,0 +1,242 @@
+import asyncio
+import json
+import logging
+import secrets
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from functools import partial
+
+log = logging.getLogger(__name__)
+
+
+# --- Session State Store ---
+# Every interview gets its own state blob keyed by a session id that is issued
+# at /select_interview. The blob is plain JSON-serialisable data:
+#   {"user_id": ..., "context": {...}, "transcript": [...], "created_at": ..., "last_access": ...}
+# Backends only store and evict blobs; SessionStore owns id issuing and the
+# read-modify-write cycle so routes never mutate shared state without a lock.
+# Backends that may block (SQLite waits for the write lock of other workers)
+# are driven from SessionStore's own threads, never from the event loop.
+
+def new_session_state(context, user_id=None):
+    now = time.time()
+    return {
+        "user_id": user_id,
+        "context": context,
+        "transcript": [],
+        "summary": "", # Running summary of turns that no longer fit the Gemini history window
+        "summarized_upto": 0,
+        "created_at": now,
+        "last_access": now,
+    }
+
+
+class InMemorySessionBackend:
+    """Per-process backend: an OrderedDict kept in LRU order behind one lock."""
+    blocking = False
+
+    def __init__(self, ttl_seconds, max_sessions):
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()
+        self._lock = threading.RLock()
+
+    def _expired(self, state, now):
+        return now - state["last_access"] > self.ttl_seconds
+
+    def _evict(self, now):
+        # Oldest entries sit at the front, so expired ones are always found first
+        while self._sessions:
+            session_id, state = next(iter(self._sessions.items()))
+            if self._expired(state, now) or len(self._sessions) > self.max_sessions:
+                del self._sessions[session_id]
+            else:
+                break
+
+    def insert(self, session_id, state):
+        with self._lock:
+            self._sessions[session_id] = state
+            self._evict(time.time())
+
+    @contextmanager
+    def transaction(self, session_id):
+        with self._lock:
+            now = time.time()
+            state = self._sessions.get(session_id)
+            if state is not None and self._expired(state, now):
+                del self._sessions[session_id]
+                state = None
+            if state is None:
+                yield None
+                return
+            self._sessions.move_to_end(session_id)
+            state["last_access"] = now
+            yield state
+
+    def delete(self, session_id):
+        with self._lock:
+            self._sessions.pop(session_id, None)
+
+    def __len__(self):
+        with self._lock:
+            return len(self._sessions)
+
+
+class SQLiteSessionBackend:
+    """File-backed backend so several worker processes can share sessions.
+
+    Each transaction runs under BEGIN IMMEDIATE, which takes SQLite's write lock
+    up front, so concurrent read-modify-write cycles from different workers
+    serialise instead of losing updates. Waiting for that lock blocks the
+    calling thread for up to the busy timeout, hence `blocking`.
+    """
+    blocking = True
+
+    def __init__(self, db_path, ttl_seconds, max_sessions):
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_sessions = max_sessions
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS sessions ("
+                " id TEXT PRIMARY KEY,"
+                " data TEXT NOT NULL,"
+                " last_access REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_sessions_last_access ON sessions(last_access)")
+
+    def _connect(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            # isolation_level=None: we issue BEGIN/COMMIT ourselves
+            conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            self._local.conn = conn
+        return conn
+
+    def _evict(self, conn, now):
+        conn.execute("DELETE FROM sessions WHERE last_access < ?", (now - self.ttl_seconds,))
+        conn.execute(
+            "DELETE FROM sessions WHERE id IN ("
+            " SELECT id FROM sessions ORDER BY last_access DESC LIMIT -1 OFFSET ?)",
+            (self.max_sessions,),
+        )
+
+    def insert(self, session_id, state):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO sessions (id, data, last_access) VALUES (?, ?, ?)",
+                (session_id, json.dumps(state), state["last_access"]),
+            )
+            self._evict(conn, time.time())
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    @contextmanager
+    def transaction(self, session_id):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            now = time.time()
+            row = conn.execute(
+                "SELECT data, last_access FROM sessions WHERE id = ?", (session_id,)
+            ).fetchone()
+            if row is not None and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+                row = None
+            if row is None:
+                yield None
+                conn.execute("COMMIT")
+                return
+            state = json.loads(row[0])
+            state["last_access"] = now
+            yield state
+            conn.execute(
+                "UPDATE sessions SET data = ?, last_access = ? WHERE id = ?",
+                (json.dumps(state), now, session_id),
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+
+    def delete(self, session_id):
+        conn = self._connect()
+        conn.execute("DELETE FROM sessions WHERE id = ?", (session_id,))
+
+    def __len__(self):
+        return self._connect().execute("SELECT COUNT(*) FROM sessions").fetchone()[0]
+
+
+class SessionStore:
+    WORKERS = 4 # Threads for blocking backends; SQLite serialises writers anyway
+
+    def __init__(self, backend):
+        self.backend = backend
+        self._executor = ThreadPoolExecutor(max_workers=self.WORKERS, thread_name_prefix="sessions") if backend.blocking else None
+
+    async def _run(self, fn, *args):
+        if self._executor is None:
+            return fn(*args)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, partial(fn, *args))
+
+    def _create(self, context, user_id, fields):
+        session_id = secrets.token_urlsafe(16)
+        state = new_session_state(context, user_id)
+        state.update(fields)
+        self.backend.insert(session_id, state)
+        return session_id
+
+    async def create(self, context, user_id=None, **fields):
+        return await self._run(self._create, context, user_id, fields)
+
+    def _update(self, session_id, change):
+        with self.backend.transaction(session_id) as state:
+            return change(state)
+
+    async def update(self, session_id, change):
+        """Atomic read-modify-write: call change(state) on the live state (None if missing) and return its result.
+
+        change runs while the backend lock is held, possibly on another thread:
+        keep it short and free of I/O.
+        """
+        if not session_id:
+            return change(None)
+        return await self._run(self._update, session_id, change)
+
+    async def get(self, session_id):
+        """Return a snapshot of the session state, or None if unknown/expired."""
+        return await self.update(session_id, lambda state: json.loads(json.dumps(state)) if state is not None else None)
+
+    async def append_transcript(self, session_id, role, text):
+        def append(state):
+            if state is None:
+                return False
+            state["transcript"].append({"role": role, "text": text, "timestamp": time.time()})
+            return True
+        return await self.update(session_id, append)
+
+    async def delete(self, session_id):
+        if session_id:
+            await self._run(self.backend.delete, session_id)
+
+    async def count(self):
+        # SQLite counts with a query, so this goes through _run like every other backend call
+        return await self._run(len, self.backend)
+
+
+def create_session_store(backend_name, ttl_seconds, max_sessions, db_path=None):
+    if backend_name == "sqlite":
+        return SessionStore(SQLiteSessionBackend(db_path or "sessions.db", ttl_seconds, max_sessions))
+    if backend_name != "memory":
+        log.warning("Unknown SESSION_BACKEND '%s', falling back to in-memory sessions", backend_name)
+    return SessionStore(InMemorySessionBackend(ttl_seconds, max_sessions))
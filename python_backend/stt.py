@@ -0,0 +1,253 @@
+import asyncio
+import io
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import speech_recognition as sr
+
+import metrics as metrics_module
+from log_setup import fields
+from audio_decode import TARGET_SAMPLE_RATE, TARGET_SAMPLE_WIDTH, SilenceTrimmer, decode_for_recognition
+
+try:
+    import vosk # Optional: offline recognition
+except ImportError:
+    vosk = None
+
+log = logging.getLogger(__name__)
+
+
+# --- Speech-to-Text Engines ---
+# Decoding (ffmpeg, resampling) is CPU work and runs in a pool of worker
+# processes, so uploads scale across cores instead of contending for the GIL.
+# Engines plug in behind one small interface:
+#   * name / offline   - offline engines recognize inside the worker process
+#   * load()           - called once per worker process, e.g. to load a model
+#   * recognize(audio) - 16 kHz mono sr.AudioData -> text, or None for no speech
+# The Google web recognizer is network-bound, so it runs on the caller's thread
+# pool after decoding; Vosk keeps its model resident in every warm worker.
+# Between decoding and recognition an optional SilenceTrimmer drops leading,
+# trailing and overlong silence; the seconds it removes are logged per turn.
+# Recordings that are still being uploaded are decoded as they arrive (see
+# StreamDecoder) and recognized segment by segment (transcribe_segment), cut
+# at pauses, so only the tail is left at the end.
+# Queue wait, decode and recognition times are recorded as metrics stages;
+# decoding is timed inside the worker so pool overhead isn't counted as ffmpeg.
+
+class GoogleWebEngine:
+    name = "google"
+    offline = False
+
+    def load(self):
+        pass
+
+    def recognize(self, audio):
+        try:
+            return sr.Recognizer().recognize_google(audio)
+        except sr.UnknownValueError:
+            return None
+
+
+class VoskEngine:
+    name = "vosk"
+    offline = True
+
+    def __init__(self, model_path):
+        self.model_path = model_path
+        self._model = None
+
+    def load(self):
+        self._model = vosk.Model(self.model_path)
+
+    def recognize(self, audio):
+        recognizer = vosk.KaldiRecognizer(self._model, audio.sample_rate)
+        recognizer.AcceptWaveform(audio.frame_data)
+        return json.loads(recognizer.FinalResult()).get("text") or None
+
+
+# --- worker process side ---
+_worker_engine = None
+_worker_trimmer = None
+
+
+def _init_worker(engine, trimmer):
+    global _worker_engine, _worker_trimmer
+    if engine is not None:
+        engine.load()
+    _worker_engine = engine
+    _worker_trimmer = trimmer
+
+
+def _worker_ready():
+    return os.getpid()
+
+
+def _trim(audio):
+    # Returns (audio, recorded seconds, seconds of silence trimmed)
+    duration = len(audio.frame_data) / (audio.sample_rate * audio.sample_width)
+    trimmed = 0.0
+    if _worker_trimmer is not None:
+        audio, trimmed = _worker_trimmer.trim(audio)
+    return audio, duration, trimmed
+
+
+def _decode(audio_source):
+    # Uploads arrive as bytes (buffered) or a path (spilled to disk)
+    started = time.perf_counter()
+    if isinstance(audio_source, (bytes, bytearray)):
+        audio_source = io.BytesIO(audio_source)
+    audio, audio_format = decode_for_recognition(audio_source)
+    audio, duration, trimmed = _trim(audio)
+    return audio, {"duration": duration, "trimmed": trimmed, "decode_seconds": time.perf_counter() - started, "format": audio_format or "unknown"}
+
+
+def _cut_segment(pcm, final):
+    # Streaming uploads: `pcm` is the already decoded audio that has not been
+    # recognized yet. A partial pass cuts it at the last finished pause; the
+    # final pass takes all of it. Nothing is decoded here, hence no decode time.
+    if not final:
+        end = (_worker_trimmer or SilenceTrimmer()).segment_end(sr.AudioData(pcm, TARGET_SAMPLE_RATE, TARGET_SAMPLE_WIDTH))
+        if end is None:
+            return None, {"duration": 0.0, "trimmed": 0.0, "consumed": 0, "decode_seconds": None, "format": "partial stream"}
+        pcm = pcm[:end]
+    segment, duration, trimmed = _trim(sr.AudioData(pcm, TARGET_SAMPLE_RATE, TARGET_SAMPLE_WIDTH))
+    return segment, {"duration": duration, "trimmed": trimmed, "consumed": len(pcm), "decode_seconds": None, "format": f"{'final' if final else 'partial'} stream"}
+
+
+def _recognize_in_worker(decode, *args):
+    audio, info = decode(*args)
+    started = time.perf_counter()
+    text = _worker_engine.recognize(audio) if audio is not None else None
+    info["recognize_seconds"] = time.perf_counter() - started if audio is not None else None
+    return text, info
+
+
+class SpeechToText:
+    """Bounded, instrumented transcription on top of a warm process pool."""
+
+    def __init__(self, engine, process_workers, max_concurrency, thread_executor, trimmer=None):
+        self.engine = engine
+        self.trimmer = trimmer
+        self.process_workers = process_workers
+        self.max_concurrency = max_concurrency
+        self.thread_executor = thread_executor # Runs the online engines' network calls
+        self._slots = asyncio.Semaphore(max_concurrency)
+        self._pool = None
+        self._metrics = {
+            "queued": 0, "active": 0, "max_queued": 0,
+            "completed": 0, "no_speech": 0, "failed": 0,
+            "queue_wait_seconds": 0.0, "processing_seconds": 0.0,
+            "audio_seconds": 0.0, "trimmed_seconds": 0.0,
+        }
+
+    def start(self):
+        if self._pool is None:
+            # spawn: workers never inherit the server's threads, sockets or event loop
+            self._pool = ProcessPoolExecutor(
+                max_workers=self.process_workers,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+                initargs=(self.engine if self.engine.offline else None, self.trimmer),
+            )
+        return self._pool
+
+    async def warm_up(self):
+        # Start every worker (and load models) now rather than on the first uploads
+        loop = asyncio.get_running_loop()
+        pool = self.start()
+        pids = await asyncio.gather(*(loop.run_in_executor(pool, _worker_ready) for _ in range(self.process_workers)))
+        log.info("STT engine '%s' ready in %d worker processes", self.engine.name, len(set(pids)))
+
+    def shutdown(self):
+        if self._pool is not None:
+            self._pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = None
+
+    async def _run(self, decode, *args):
+        loop = asyncio.get_running_loop()
+        metrics = self._metrics
+        queued_at = time.perf_counter()
+        metrics["queued"] += 1
+        metrics["max_queued"] = max(metrics["max_queued"], metrics["queued"])
+        async with self._slots:
+            metrics["queued"] -= 1
+            metrics["active"] += 1
+            started = time.perf_counter()
+            metrics["queue_wait_seconds"] += started - queued_at
+            metrics_module.record_stage("stt_queue", started - queued_at)
+            try:
+                if self.engine.offline:
+                    text, info = await loop.run_in_executor(self.start(), _recognize_in_worker, decode, *args)
+                else:
+                    audio, info = await loop.run_in_executor(self.start(), decode, *args)
+                    info["recognize_seconds"] = None
+                    if audio is not None:
+                        recognize_started = time.perf_counter()
+                        text = await loop.run_in_executor(self.thread_executor, self.engine.recognize, audio)
+                        info["recognize_seconds"] = time.perf_counter() - recognize_started
+                    else:
+                        text = None
+            except Exception as e:
+                metrics["failed"] += 1
+                log.error("Transcription with '%s' failed: %s", self.engine.name, e)
+                return None, None
+            finally:
+                metrics["active"] -= 1
+                metrics["processing_seconds"] += time.perf_counter() - started
+        # Decode details come back with the result and are logged here, not in the worker
+        log.debug("Decoded %s audio: %.2fs, %.2fs of silence trimmed", info["format"], info["duration"], info["trimmed"])
+        if info["decode_seconds"] is not None:
+            metrics_module.record_stage("stt_decode", info["decode_seconds"])
+        if info["recognize_seconds"] is not None:
+            metrics_module.record_stage("stt_recognize", info["recognize_seconds"])
+        if info["duration"]: # A streaming pass without a finished segment recognizes nothing
+            metrics["completed" if text else "no_speech"] += 1
+        metrics["audio_seconds"] += info["duration"]
+        metrics["trimmed_seconds"] += info["trimmed"]
+        return text, info
+
+    async def transcribe(self, audio_source):
+        text, _ = await self._run(_decode, audio_source)
+        if text:
+            log.debug("Candidate said", extra=fields(text=text))
+        return text
+
+    async def transcribe_segment(self, pcm, final):
+        """Recognize the next finished segment of a growing recording's unrecognized PCM.
+
+        Returns (text, bytes of `pcm` consumed); nothing is consumed when no
+        segment is finished yet, recognition failed or there is no new audio.
+        """
+        if not pcm:
+            return None, 0
+        text, info = await self._run(_cut_segment, pcm, final)
+        return text, (info["consumed"] if info else 0)
+
+    def stats(self):
+        metrics = dict(self._metrics)
+        finished = metrics["completed"] + metrics["no_speech"] + metrics["failed"]
+        metrics.update({
+            "engine": self.engine.name,
+            "process_workers": self.process_workers,
+            "max_concurrency": self.max_concurrency,
+            "avg_processing_seconds": metrics["processing_seconds"] / finished if finished else None,
+        })
+        return metrics
+
+
+def create_speech_to_text(engine_name, process_workers, max_concurrency, thread_executor, vosk_model_path=None, trimmer=None):
+    engine = GoogleWebEngine()
+    if engine_name == "vosk":
+        if vosk is None:
+            log.warning("STT_ENGINE=vosk but the vosk package is not installed, using Google")
+        elif not vosk_model_path or not os.path.isdir(vosk_model_path):
+            log.warning("VOSK_MODEL_PATH '%s' is not a model directory, using Google", vosk_model_path)
+        else:
+            engine = VoskEngine(vosk_model_path)
+    elif engine_name != "google":
+        log.warning("Unknown STT_ENGINE '%s', using Google", engine_name)
+    return SpeechToText(engine, process_workers, max_concurrency, thread_executor, trimmer)
@@ -0,0 +1,183 @@
+import asyncio
+import hashlib
+import json
+import logging
+import os
+import tempfile
+import threading
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+log = logging.getLogger(__name__)
+
+
+# --- Content-addressed TTS Audio Cache ---
+# Synthesized audio is keyed by a hash of the text plus every Murf setting that
+# changes the output, so greetings, closings and retries are only paid for once.
+# Two tiers, each evicting least-recently-used entries by total byte size:
+#   memory - an OrderedDict of key -> bytes
+#   disk   - one file per key under cache_dir, survives restarts
+# A disk hit is promoted into the memory tier. The memory tier is consulted on
+# the event loop; disk reads and writes run on the cache's own threads, so a
+# slow disk delays only the lookups that miss memory.
+
+def tts_cache_key(text, voice_settings):
+    material = json.dumps({"text": text, **voice_settings}, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+
+class _MemoryTier:
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        data = self._entries.get(key)
+        if data is not None:
+            self._entries.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        old = self._entries.pop(key, None)
+        if old is not None:
+            self.total_bytes -= len(old)
+        self._entries[key] = data
+        self.total_bytes += len(data)
+        while self.total_bytes > self.max_bytes:
+            _, evicted = self._entries.popitem(last=False)
+            self.total_bytes -= len(evicted)
+
+    def __len__(self):
+        return len(self._entries)
+
+
+class _DiskTier:
+    def __init__(self, cache_dir, max_bytes):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.total_bytes = 0
+        self._sizes = OrderedDict() # key -> file size, in LRU order
+        os.makedirs(cache_dir, exist_ok=True)
+        # Rebuild the LRU order from file access times left by a previous run
+        existing = []
+        for name in os.listdir(cache_dir):
+            if name.endswith(".audio"):
+                stat = os.stat(os.path.join(cache_dir, name))
+                existing.append((stat.st_mtime, name[:-len(".audio")], stat.st_size))
+        for _, key, size in sorted(existing):
+            self._sizes[key] = size
+            self.total_bytes += size
+        self._evict()
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, f"{key}.audio")
+
+    def _evict(self):
+        while self.total_bytes > self.max_bytes and self._sizes:
+            key, size = self._sizes.popitem(last=False)
+            self.total_bytes -= size
+            try:
+                os.remove(self._path(key))
+            except FileNotFoundError:
+                pass
+
+    def get(self, key):
+        if key not in self._sizes:
+            return None
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                data = f.read()
+            os.utime(path) # Keep the on-disk LRU order across restarts
+        except FileNotFoundError:
+            self.total_bytes -= self._sizes.pop(key)
+            return None
+        self._sizes.move_to_end(key)
+        return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes or key in self._sizes:
+            return
+        # Write to a temp file first so readers never see a partial entry
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        os.replace(tmp_path, self._path(key))
+        self._sizes[key] = len(data)
+        self.total_bytes += len(data)
+        self._evict()
+
+    def __len__(self):
+        return len(self._sizes)
+
+
+class TTSAudioCache:
+    DISK_WORKERS = 2
+
+    def __init__(self, memory_max_bytes, cache_dir=None, disk_max_bytes=0):
+        self._memory = _MemoryTier(memory_max_bytes)
+        self._disk = _DiskTier(cache_dir, disk_max_bytes) if cache_dir and disk_max_bytes > 0 else None
+        self._disk_executor = ThreadPoolExecutor(max_workers=self.DISK_WORKERS, thread_name_prefix="tts-cache") if self._disk is not None else None
+        self._lock = threading.Lock() # Memory tier and counters
+        self._disk_lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.memory_hits = 0
+        self.disk_hits = 0
+
+    def _disk_get(self, key):
+        with self._disk_lock:
+            return self._disk.get(key)
+
+    def _disk_put(self, key, data):
+        try:
+            with self._disk_lock:
+                self._disk.put(key, data)
+        except OSError as e:
+            log.warning("Could not write TTS cache entry to disk: %s", e)
+
+    async def get(self, key):
+        with self._lock:
+            data = self._memory.get(key)
+            if data is not None:
+                self.hits += 1
+                self.memory_hits += 1
+                return data
+        if self._disk is not None:
+            data = await asyncio.get_running_loop().run_in_executor(self._disk_executor, self._disk_get, key)
+            if data is not None:
+                with self._lock:
+                    self._memory.put(key, data)
+                    self.hits += 1
+                    self.disk_hits += 1
+                return data
+        with self._lock:
+            self.misses += 1
+        return None
+
+    def put(self, key, data):
+        # The disk write happens in the background; the entry is served from memory meanwhile
+        if not data:
+            return
+        with self._lock:
+            self._memory.put(key, data)
+        if self._disk is not None:
+            self._disk_executor.submit(self._disk_put, key, data)
+
+    def stats(self):
+        with self._lock:
+            stats = {
+                "hits": self.hits,
+                "misses": self.misses,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "memory_entries": len(self._memory),
+                "memory_bytes": self._memory.total_bytes,
+            }
+        # Read without the disk lock, so a slow disk write never holds up a metrics scrape
+        stats["disk_entries"] = len(self._disk) if self._disk is not None else 0
+        stats["disk_bytes"] = self._disk.total_bytes if self._disk is not None else 0
+        return stats
@@ -0,0 +1,106 @@
+import asyncio
+import time
+
+from audio_decode import SNIFF_BYTES, TARGET_SAMPLE_WIDTH, StreamDecoder, sniff_audio_format
+
+
+# --- Streaming Audio Uploads ---
+# While the candidate speaks, the page posts MediaRecorder timeslice chunks in
+# order. Each session has at most one open stream: a StreamDecoder that turns
+# the chunks into PCM as they arrive, the PCM offset up to which speech has
+# already been recognized, and the text of those finished segments. Partial
+# recognition runs in the background every few chunks, so when recording stops
+# only the unrecognized tail is left.
+# Streams live in the memory of the worker process that received them; a
+# client that hits another worker is told so (409) and uploads the whole blob.
+
+class UploadStream:
+    def __init__(self, stream_id):
+        self.stream_id = stream_id
+        self.decoder = StreamDecoder()
+        self.bytes_received = 0
+        self.next_seq = 0
+        self.committed = 0 # Bytes of decoded 16 kHz PCM already recognized
+        self.texts = []
+        self.lock = asyncio.Lock() # One recognition pass at a time
+        self.partial_task = None
+        self.chunks_since_partial = 0
+        self.updated_at = time.time()
+
+    @property
+    def partial_text(self):
+        return " ".join(self.texts)
+
+    def pending_pcm(self):
+        # Decoded audio not recognized yet, in whole samples
+        pcm = self.decoder.pcm
+        return bytes(pcm[self.committed:len(pcm) - len(pcm) % TARGET_SAMPLE_WIDTH])
+
+    def close(self):
+        if self.partial_task is not None:
+            self.partial_task.cancel()
+        self.decoder.close()
+
+
+class UploadStreamError(Exception):
+    def __init__(self, message, status):
+        super().__init__(message)
+        self.status = status
+
+
+class UploadStreams:
+    def __init__(self, max_bytes, idle_seconds):
+        self.max_bytes = max_bytes
+        self.idle_seconds = idle_seconds
+        self._streams = {} # session id -> UploadStream
+
+    def _expire(self, now):
+        for session_id, stream in list(self._streams.items()):
+            if now - stream.updated_at > self.idle_seconds:
+                self._discard(session_id)
+
+    def _discard(self, session_id):
+        stream = self._streams.pop(session_id, None)
+        if stream is not None:
+            stream.close()
+
+    async def append(self, session_id, stream_id, seq, chunk):
+        now = time.time()
+        self._expire(now)
+        stream = self._streams.get(session_id)
+        if seq == 0:
+            # A new recording replaces whatever the session was streaming before
+            self._discard(session_id)
+            stream = self._streams[session_id] = UploadStream(stream_id)
+        elif stream is None or stream.stream_id != stream_id:
+            raise UploadStreamError("Unknown upload stream", 409)
+        if seq != stream.next_seq:
+            raise UploadStreamError(f"Expected chunk {stream.next_seq}, got {seq}", 409)
+        if stream.bytes_received + len(chunk) > self.max_bytes:
+            self._discard(session_id)
+            raise UploadStreamError("Recording is too large to stream", 413)
+        stream.bytes_received += len(chunk)
+        stream.next_seq += 1
+        stream.chunks_since_partial += 1
+        stream.updated_at = now
+        # Written before any await, so chunks reach the decoder in sequence order
+        stream.decoder.write(chunk)
+        if seq == 0:
+            await stream.decoder.start(sniff_audio_format(chunk[:SNIFF_BYTES]))
+        await stream.decoder.drain()
+        return stream
+
+    def pop(self, session_id, stream_id):
+        stream = self._streams.get(session_id)
+        if stream is None or stream.stream_id != stream_id:
+            return None
+        return self._streams.pop(session_id)
+
+    def discard(self, session_id, stream_id):
+        # An answer that will never be finished, e.g. its client disconnected
+        stream = self.pop(session_id, stream_id)
+        if stream is not None:
+            stream.close()
+
+    def __len__(self):
+        return len(self._streams)